@@ -1,60 +1,26 @@
-import os
-from typing import Any
-from dotenv import load_dotenv
+from typing import TYPE_CHECKING, Any
 
-from flask import Flask, request, abort, jsonify, Response
-from flask_admin.contrib.sqla import ModelView
-from flask_admin import Admin
-from flask_migrate import Migrate
+if TYPE_CHECKING:
+    from flask import Flask
 
-from app.extensions import db
-from app.models import BeerDonation
-from app.utils import insert_donate, get_sum
+    from app.web import create_app
 
-admin_ext = Admin(template_mode="bootstrap3")
-migrate_ext = Migrate()
-_ = load_dotenv()
+    app: Flask
 
+__all__ = ["app", "create_app"]
 
-def create_app(testing: bool = False) -> Flask:
-    new_app: Flask = Flask(__name__)
-    if testing:
-        new_app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
-    else:
-        new_app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///mydatabase.db"
-    new_app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "TypeMeIn")
-    db.init_app(new_app)
-    migrate_ext.init_app(new_app, db)
-    admin_ext.init_app(new_app)
 
-    @new_app.route("/donate", methods=["POST"])
-    def payment_page() -> Response:
-        data: dict[str, Any] = request.json or {}
-        if not data:
-            return abort(400)
-        try:
-            insert_donate(data, db.session)  # pyright: ignore[reportArgumentType]
+def __getattr__(name: str) -> Any:
+    # The web stack is only imported on first use, so the consumer can import
+    # app.settings without loading Flask or building the application.
+    # gunicorn's "app:app" and the flask CLI resolve app through here.
+    if name == "create_app":
+        from app.web import create_app
 
-        except Exception:
-            return abort(500)
-        return jsonify({"message": "Success"})
+        return create_app
+    if name == "app":
+        from app.web import create_app
 
-    @new_app.route("/balance")
-    def get_balance() -> Response:
-        # Cast db.session to Session type to satisfy type checker
-        total = get_sum(db.session)  # pyright: ignore[reportArgumentType]
-
-        return jsonify({"Total": total})
-
-    return new_app
-
-
-app = create_app()
-
-
-class MyModelView(ModelView):
-    column_display_all_relations = True
-    column_hide_backrefs = False
-
-
-admin_ext.add_view(MyModelView(BeerDonation, db.session))
+        globals()["app"] = instance = create_app()
+        return instance
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
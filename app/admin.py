@@ -0,0 +1,112 @@
+import typing
+from datetime import datetime
+from typing import Any
+
+from flask import g, request
+from flask_admin.contrib.sqla import ModelView
+from sqlalchemy import literal, tuple_
+
+from app.aggregates import read_balance
+from app.models import BeerDonation
+
+KEYSET_COLUMNS = ("id", "date")
+CURSOR_ARGS = ("after_id", "after_date")
+
+
+class MyModelView(ModelView):
+    column_display_all_relations = True
+    column_hide_backrefs = False
+    list_template = "admin/donation_list.html"
+    column_list = ("id", "date", "name", "value")
+    # Only indexed columns, newest first
+    column_sortable_list = KEYSET_COLUMNS
+    column_default_sort = ("id", True)
+    # Never run COUNT(*), the list shows the running total count instead
+    simple_list_pager = True
+
+    @typing.override
+    def _get_list_extra_args(self) -> Any:
+        # Sort, search and filter links start over from the first page
+        view_args = super()._get_list_extra_args()
+        for name in CURSOR_ARGS:
+            _ = view_args.extra_args.pop(name, None)
+        return view_args
+
+    @typing.override
+    def get_list(
+        self,
+        page: int | None,
+        sort_column: str | None,
+        sort_desc: bool | None,
+        search: str | None,
+        filters: Any,
+        execute: bool = True,
+        page_size: int | None = None,
+    ) -> tuple[int | None, Any]:
+        balance = read_balance(self.session)
+        g.donation_estimate = balance[1] if balance is not None else 0
+
+        if sort_column is None:
+            sort_column, sort_desc = "id", True
+        if search or filters or sort_column not in KEYSET_COLUMNS:
+            return super().get_list(
+                page, sort_column, sort_desc, search, filters, execute, page_size
+            )
+        return None, self._get_keyset_page(
+            sort_column, bool(sort_desc), page_size or self.page_size, execute
+        )
+
+    def _get_keyset_page(
+        self, sort_column: str, sort_desc: bool, page_size: int, execute: bool
+    ) -> Any:
+        # Seek past the last row of the previous page instead of OFFSET, so
+        # every page costs the same no matter how deep it is
+        if sort_column == "date":
+            key = tuple_(BeerDonation.date, BeerDonation.id)
+            order = (BeerDonation.date, BeerDonation.id)
+        else:
+            key = BeerDonation.id
+            order = (BeerDonation.id,)
+
+        query = self.get_query()
+        cursor = self._read_cursor(sort_column)
+        if cursor is not None:
+            query = query.filter(key < cursor if sort_desc else key > cursor)
+        query = query.order_by(
+            *(column.desc() if sort_desc else column.asc() for column in order)
+        ).limit(page_size)
+        if not execute:
+            return query
+
+        data = query.all()
+        g.donation_keyset = {
+            "first_url": self._cursor_url(None),
+            "next_url": self._cursor_url(data[-1]) if len(data) == page_size else None,
+            "is_first": cursor is None,
+        }
+        return data
+
+    def _read_cursor(self, sort_column: str) -> Any:
+        after_id = request.args.get("after_id", type=int)
+        if after_id is None:
+            return None
+        if sort_column == "id":
+            return after_id
+        try:
+            after_date = datetime.fromisoformat(request.args.get("after_date", ""))
+        except ValueError:
+            return None
+        return tuple_(
+            literal(after_date, BeerDonation.date.type),
+            literal(after_id, BeerDonation.id.type),
+        )
+
+    def _cursor_url(self, row: BeerDonation | None) -> str:
+        args = request.args.to_dict()
+        for name in ("page", *CURSOR_ARGS):
+            _ = args.pop(name, None)
+        if row is not None:
+            args["after_id"] = str(row.id)
+            if row.date is not None:
+                args["after_date"] = row.date.isoformat()
+        return self.get_url(".index_view", **args)
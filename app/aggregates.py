@@ -0,0 +1,387 @@
+from collections import defaultdict
+from collections.abc import Callable, Sequence
+from datetime import datetime
+
+from sqlalchemy import Subquery, delete, func, literal, select, union_all
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.models import (
+    BalanceTotal,
+    BeerDonation,
+    DonationArchive,
+    DonationRollup,
+    DonorTotal,
+)
+from app.money import to_major
+
+BALANCE_ID = 1
+
+# Bucket start in Python and the matching SQLite strftime format, which renders
+# the same text SQLAlchemy stores for a DateTime
+BUCKETS: dict[str, tuple[Callable[[datetime], datetime], str]] = {
+    "hour": (
+        lambda date: date.replace(minute=0, second=0, microsecond=0),
+        "%Y-%m-%d %H:00:00.000000",
+    ),
+    "day": (
+        lambda date: date.replace(hour=0, minute=0, second=0, microsecond=0),
+        "%Y-%m-%d 00:00:00.000000",
+    ),
+    "month": (
+        lambda date: date.replace(day=1, hour=0, minute=0, second=0, microsecond=0),
+        "%Y-%m-01 00:00:00.000000",
+    ),
+}
+
+
+def donation_facts() -> Subquery:
+    # Live donations and archived hourly sums as one relation, so everything
+    # summed from it covers the whole history
+    live = select(
+        BeerDonation.date.label("date"),
+        BeerDonation.name.label("name"),
+        BeerDonation.value_minor.label("total_minor"),
+        literal(1).label("count"),
+        BeerDonation.id.label("last_id"),
+    )
+    archived = select(
+        DonationArchive.start,
+        DonationArchive.name,
+        DonationArchive.total_minor,
+        DonationArchive.count,
+        DonationArchive.last_id,
+    )
+    return union_all(live, archived).subquery("donation_facts")
+
+
+def apply_donations(
+    session: Session, rows: Sequence[dict[str, object]], ids: Sequence[int]
+) -> None:
+    # Runs in the same transaction as the INSERT so the totals never drift
+    if not rows:
+        return
+    total = sum(_minor(row) for row in rows)
+    stmt = insert(BalanceTotal).values(
+        id=BALANCE_ID, total_minor=total, count=len(rows), last_id=max(ids)
+    )
+    _ = session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[BalanceTotal.id],
+            set_={
+                "total_minor": BalanceTotal.total_minor + stmt.excluded.total_minor,
+                "count": BalanceTotal.count + stmt.excluded.count,
+                "last_id": func.max(BalanceTotal.last_id, stmt.excluded.last_id),
+            },
+        )
+    )
+    _apply_rollups(session, rows)
+    _apply_donors(session, rows)
+
+
+def _minor(row: dict[str, object]) -> int:
+    value = row["value_minor"]
+    assert isinstance(value, int)
+    return value
+
+
+def _apply_rollups(session: Session, rows: Sequence[dict[str, object]]) -> None:
+    buckets: defaultdict[tuple[str, datetime], list[int]] = defaultdict(lambda: [0, 0])
+    for row in rows:
+        date = row["date"]
+        assert isinstance(date, datetime)
+        for bucket, (truncate, _) in BUCKETS.items():
+            totals = buckets[bucket, truncate(date)]
+            totals[0] += _minor(row)
+            totals[1] += 1
+
+    for (bucket, start), (total, count) in buckets.items():
+        stmt = insert(DonationRollup).values(
+            bucket=bucket, start=start, total_minor=total, count=count
+        )
+        _ = session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[DonationRollup.bucket, DonationRollup.start],
+                set_={
+                    "total_minor": DonationRollup.total_minor
+                    + stmt.excluded.total_minor,
+                    "count": DonationRollup.count + stmt.excluded.count,
+                },
+            )
+        )
+
+
+def _apply_donors(session: Session, rows: Sequence[dict[str, object]]) -> None:
+    donors: dict[str, tuple[int, int, datetime]] = {}
+    for row in rows:
+        name = str(row["name"])
+        date = row["date"]
+        assert isinstance(date, datetime)
+        total, count, last_date = donors.get(name, (0, 0, date))
+        donors[name] = (total + _minor(row), count + 1, max(last_date, date))
+
+    for name, (total, count, last_date) in donors.items():
+        stmt = insert(DonorTotal).values(
+            name=name, total_minor=total, count=count, last_date=last_date
+        )
+        _ = session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[DonorTotal.name],
+                set_={
+                    "total_minor": DonorTotal.total_minor + stmt.excluded.total_minor,
+                    "count": DonorTotal.count + stmt.excluded.count,
+                    "last_date": func.max(
+                        func.coalesce(DonorTotal.last_date, stmt.excluded.last_date),
+                        stmt.excluded.last_date,
+                    ),
+                },
+            )
+        )
+
+
+def read_rollups(
+    session: Session,
+    bucket: str,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+) -> list[tuple[datetime, float, int]]:
+    # Served from the (bucket, start) primary key, only the requested range is read
+    query = select(
+        DonationRollup.start, DonationRollup.total_minor, DonationRollup.count
+    ).where(DonationRollup.bucket == bucket)
+    if date_from is not None:
+        query = query.where(DonationRollup.start >= BUCKETS[bucket][0](date_from))
+    if date_to is not None:
+        query = query.where(DonationRollup.start < date_to)
+    rows = session.execute(query.order_by(DonationRollup.start)).all()
+    return [(start, to_major(total), int(count)) for start, total, count in rows]
+
+
+def _read_stored(session: Session) -> tuple[int, int, int] | None:
+    row = session.execute(
+        select(
+            BalanceTotal.total_minor, BalanceTotal.count, BalanceTotal.last_id
+        ).where(BalanceTotal.id == BALANCE_ID)
+    ).first()
+    if row is None:
+        return None
+    total, count, last_id = row
+    return int(total), int(count), int(last_id)
+
+
+def read_balance(session: Session) -> tuple[float, int] | None:
+    stored = _read_stored(session)
+    if stored is None or not stored[1]:
+        return None
+    return to_major(stored[0]), stored[1]
+
+
+def read_balance_update(
+    session: Session,
+) -> tuple[float | None, tuple[int, str | None, float, datetime | None] | None]:
+    # Balance and the donation that last changed it in one statement, so
+    # both come from the same snapshot even while another process commits
+    row = session.execute(
+        select(
+            BalanceTotal.total_minor,
+            BalanceTotal.count,
+            BeerDonation.id,
+            BeerDonation.name,
+            BeerDonation.value_minor,
+            BeerDonation.date,
+        )
+        .outerjoin(BeerDonation, BeerDonation.id == BalanceTotal.last_id)
+        .where(BalanceTotal.id == BALANCE_ID)
+    ).first()
+    if row is None or not row.count:
+        return None, None
+    total, _, donation_id, name, value, date = row
+    if donation_id is None:
+        return to_major(total), None
+    return to_major(total), (int(donation_id), name, to_major(value), date)
+
+
+class InexactWindow(ValueError):
+    pass
+
+
+def read_leaderboard(
+    session: Session, limit: int, since: datetime | None = None
+) -> list[tuple[str, float, int]]:
+    if since is None:
+        # Walks ix_donor_totals_total backwards and stops after `limit` rows
+        query = (
+            select(DonorTotal.name, DonorTotal.total_minor, DonorTotal.count)
+            .order_by(DonorTotal.total_minor.desc())
+            .limit(limit)
+        )
+    else:
+        # Per-donor totals are all-time, a window needs the raw rows in range.
+        # Archived hours count when they start at or after `since`, an hour
+        # that `since` cuts into can not be split and is refused.
+        hour = BUCKETS["hour"][0](since)
+        if since != hour and session.scalar(
+            select(DonationArchive.id)
+            .where(DonationArchive.start >= hour, DonationArchive.start < since)
+            .limit(1)
+        ):
+            raise InexactWindow(
+                f"{hour.isoformat()} is archived, since must be on the hour"
+            )
+        facts = donation_facts()
+        total = func.sum(facts.c.total_minor)
+        query = (
+            select(facts.c.name, total, func.sum(facts.c.count))
+            .where(facts.c.date >= since, facts.c.name.is_not(None))
+            .group_by(facts.c.name)
+            .order_by(total.desc())
+            .limit(limit)
+        )
+    rows = session.execute(query).all()
+    return [(name, to_major(total), int(count)) for name, total, count in rows]
+
+
+def _scan_balance(session: Session) -> tuple[int, int, int]:
+    facts = donation_facts()
+    total, count, last_id = session.execute(
+        select(
+            func.coalesce(func.sum(facts.c.total_minor), 0),
+            func.coalesce(func.sum(facts.c.count), 0),
+            func.coalesce(func.max(facts.c.last_id), 0),
+        )
+    ).one()
+    return int(total), int(count), int(last_id)
+
+
+def _scan_rollups(session: Session) -> dict[tuple[str, str], tuple[int, int]]:
+    scanned: dict[tuple[str, str], tuple[int, int]] = {}
+    facts = donation_facts()
+    for bucket, (_, sql_format) in BUCKETS.items():
+        start = func.strftime(sql_format, facts.c.date)
+        rows = session.execute(
+            select(start, func.sum(facts.c.total_minor), func.sum(facts.c.count))
+            .where(facts.c.date.is_not(None))
+            .group_by(start)
+        ).all()
+        for row_start, total, count in rows:
+            scanned[bucket, row_start] = (int(total), int(count))
+    return scanned
+
+
+def _read_stored_rollups(
+    session: Session,
+) -> dict[tuple[str, str], tuple[int, int]]:
+    rows = session.execute(
+        select(
+            DonationRollup.bucket,
+            func.strftime("%Y-%m-%d %H:%M:%S.000000", DonationRollup.start),
+            DonationRollup.total_minor,
+            DonationRollup.count,
+        )
+    ).all()
+    return {
+        (bucket, start): (int(total), int(count))
+        for bucket, start, total, count in rows
+    }
+
+
+def _scan_donors(session: Session) -> dict[str, tuple[int, int]]:
+    facts = donation_facts()
+    rows = session.execute(
+        select(facts.c.name, func.sum(facts.c.total_minor), func.sum(facts.c.count))
+        .where(facts.c.name.is_not(None))
+        .group_by(facts.c.name)
+    ).all()
+    return {name: (int(total), int(count)) for name, total, count in rows}
+
+
+def _read_stored_donors(session: Session) -> dict[str, tuple[int, int]]:
+    rows = session.execute(
+        select(DonorTotal.name, DonorTotal.total_minor, DonorTotal.count)
+    ).all()
+    return {name: (int(total), int(count)) for name, total, count in rows}
+
+
+def _compare[K](
+    label: str,
+    expected: dict[K, tuple[int, int]],
+    actual: dict[K, tuple[int, int]],
+) -> list[str]:
+    problems: list[str] = []
+    for key in expected.keys() | actual.keys():
+        want = expected.get(key, (0, 0))
+        got = actual.get(key, (0, 0))
+        if got != want:
+            problems.append(f"{label} {key} {got} != {want}")
+    return sorted(problems)
+
+
+def check_aggregates(session: Session) -> list[str]:
+    total, count, last_id = _scan_balance(session)
+    stored = _read_stored(session) or (0, 0, 0)
+
+    problems: list[str] = []
+    if stored[0] != total:
+        problems.append(f"balance total {stored[0]} != {total}")
+    if stored[1] != count:
+        problems.append(f"balance count {stored[1]} != {count}")
+    if stored[2] != last_id:
+        problems.append(f"balance last_id {stored[2]} != {last_id}")
+
+    problems += _compare(
+        "rollup", _scan_rollups(session), _read_stored_rollups(session)
+    )
+    problems += _compare("donor", _scan_donors(session), _read_stored_donors(session))
+    return problems
+
+
+def rebuild_aggregates(session: Session) -> None:
+    # The DELETE comes first: it takes the write lock, so every sum below is
+    # read inside the same transaction and no concurrent insert slips between
+    # reading the donations and replacing the totals
+    _ = session.execute(delete(BalanceTotal))
+    facts = donation_facts()
+    _ = session.execute(
+        insert(BalanceTotal).from_select(
+            ["id", "total_minor", "count", "last_id"],
+            select(
+                literal(BALANCE_ID),
+                func.coalesce(func.sum(facts.c.total_minor), 0),
+                func.coalesce(func.sum(facts.c.count), 0),
+                func.coalesce(func.max(facts.c.last_id), 0),
+            ),
+        )
+    )
+
+    _ = session.execute(delete(DonationRollup))
+    for bucket, (_, sql_format) in BUCKETS.items():
+        start = func.strftime(sql_format, facts.c.date)
+        _ = session.execute(
+            insert(DonationRollup).from_select(
+                ["bucket", "start", "total_minor", "count"],
+                select(
+                    literal(bucket),
+                    start,
+                    func.sum(facts.c.total_minor),
+                    func.sum(facts.c.count),
+                )
+                .where(facts.c.date.is_not(None))
+                .group_by(start),
+            )
+        )
+
+    _ = session.execute(delete(DonorTotal))
+    _ = session.execute(
+        insert(DonorTotal).from_select(
+            ["name", "total_minor", "count", "last_date"],
+            select(
+                facts.c.name,
+                func.sum(facts.c.total_minor),
+                func.sum(facts.c.count),
+                func.max(facts.c.date),
+            )
+            .where(facts.c.name.is_not(None))
+            .group_by(facts.c.name),
+        )
+    )
+    session.commit()
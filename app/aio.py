@@ -0,0 +1,343 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any, NamedTuple
+
+from aiohttp import web
+from dotenv import load_dotenv
+from sqlalchemy import URL
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import StaticPool
+
+from app.cache import AggregateCache, sqlite_data_version
+from app.idempotency import recent_keys
+from app.metrics import registry
+from app.sqlite import (
+    DEFAULT_DATABASE_URI,
+    configure_sqlite,
+    is_locked,
+    resolve_database_url,
+)
+from app.stream import BalanceBroadcaster, Update, read_update
+from app.utils import InvalidDonation, get_sum, insert_donates, parse_donate
+
+# Comment line sent to idle /balance/stream clients so proxies keep them open
+STREAM_KEEPALIVE = 15.0
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+logger = logging.getLogger(__name__)
+
+_ = load_dotenv()
+
+
+class _Pending(NamedTuple):
+    rows: list[dict[str, object]]
+    done: asyncio.Future[list[int]]
+
+
+class GroupWriter:
+    # Async counterpart of GroupCommitWriter. SQLite takes one writer at a
+    # time: requests queue their rows and whoever gets the lock commits
+    # everything queued so far in one transaction, the others find their
+    # ids ready once the lock is theirs.
+    def __init__(
+        self, sessions: async_sessionmaker[AsyncSession], max_batch: int = 1000
+    ) -> None:
+        self.sessions = sessions
+        self.max_batch = max_batch
+        self.commits = 0
+        self._pending: list[_Pending] = []
+        self._lock = asyncio.Lock()
+
+    async def submit(self, rows: list[dict[str, object]]) -> list[int]:
+        if not rows:
+            return []
+        pending = _Pending(rows, asyncio.get_running_loop().create_future())
+        self._pending.append(pending)
+        try:
+            async with self._lock:
+                while not pending.done.done():
+                    group = self._take()
+                    if not group:
+                        break
+                    await self._commit(group)
+        except asyncio.CancelledError:
+            if pending.done.done() and not pending.done.cancelled():
+                _ = pending.done.exception()  # retrieved, nobody else waits
+            raise
+        return pending.done.result()
+
+    def _take(self) -> list[_Pending]:
+        group: list[_Pending] = []
+        size = 0
+        while self._pending and (not group or size < self.max_batch):
+            group.append(self._pending.pop(0))
+            size += len(group[-1].rows)
+        return group
+
+    async def _commit(self, group: list[_Pending]) -> None:
+        rows = [row for pending in group for row in pending.rows]
+        try:
+            async with self.sessions() as session:
+                ids = await session.run_sync(
+                    lambda sync_session: insert_donates(rows, sync_session)  # pyright: ignore[reportArgumentType]
+                )
+        except BaseException as e:
+            # Cancelled mid-commit the others in the group would wait forever,
+            # whether their rows got in is unknown
+            error = (
+                e
+                if isinstance(e, Exception)
+                else RuntimeError("group commit was interrupted")
+            )
+            for pending in group:
+                if not pending.done.done():
+                    pending.done.set_exception(error)
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        self.commits += 1
+        offset = 0
+        for pending in group:
+            pending.done.set_result(ids[offset : offset + len(pending.rows)])
+            offset += len(pending.rows)
+
+
+ENGINE = web.AppKey("engine", AsyncEngine)
+SESSIONS = web.AppKey("sessions", async_sessionmaker[AsyncSession])
+CACHE = web.AppKey("aggregate_cache", AggregateCache)
+WRITER = web.AppKey("group_writer", GroupWriter)
+BROADCASTER = web.AppKey("balance_broadcaster", BalanceBroadcaster)
+
+
+def create_aio_app(
+    argv: list[str] | None = None, database_uri: str | None = None
+) -> web.Application:
+    # Async twin of create_app for the ingest and balance paths. One process
+    # keeps many connections open, SQLite work runs on aiosqlite threads and
+    # writes go through the same insert_donates as the Flask app.
+    #
+    #   python -m aiohttp.web -H 0.0.0.0 -P 8000 app.aio:create_aio_app
+    #   gunicorn 'app.aio:create_aio_app()' -k aiohttp.GunicornWebWorker
+    del argv  # passed by python -m aiohttp.web
+    url = async_database_url(
+        database_uri or os.getenv("SQLALCHEMY_DATABASE_URI", DEFAULT_DATABASE_URI)
+    )
+    engine = create_async_engine(
+        url, poolclass=StaticPool if url.database in (None, "", ":memory:") else None
+    )
+    configure_sqlite(
+        engine.sync_engine,
+        journal_mode=os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        busy_timeout=int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000")),
+        synchronous=os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    )
+    registry.configure(os.getenv("METRICS_DIR"))
+    recent_keys.maxsize = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+
+    new_app = web.Application(middlewares=[record_request])
+    new_app[ENGINE] = engine
+    new_app[SESSIONS] = async_sessionmaker(engine, expire_on_commit=False)
+    new_app[WRITER] = GroupWriter(new_app[SESSIONS])
+    data_version = sqlite_data_version(url.database)
+    new_app[CACHE] = AggregateCache(
+        ttl=float(os.getenv("AGGREGATE_CACHE_TTL", "60")),
+        maxsize=int(os.getenv("AGGREGATE_CACHE_SIZE", "256")),
+        data_version=data_version,
+    )
+
+    async def load_update() -> Update:
+        async with new_app[SESSIONS]() as session:
+            return await session.run_sync(read_update)
+
+    new_app[BROADCASTER] = BalanceBroadcaster(
+        data_version,
+        load_update,
+        interval=int(os.getenv("BALANCE_STREAM_POLL_MS", "250")) / 1000,
+    )
+    _ = new_app.router.add_post("/donate", donate)
+    _ = new_app.router.add_post("/donate/batch", donate_batch)
+    _ = new_app.router.add_get("/balance", balance)
+    _ = new_app.router.add_get("/balance/stream", balance_stream)
+    _ = new_app.router.add_get("/metrics", metrics)
+    new_app.on_shutdown.append(_close_streams)
+    new_app.on_cleanup.append(_dispose_engine)
+    return new_app
+
+
+def async_database_url(uri: str) -> URL:
+    url = resolve_database_url(uri)
+    if url.get_backend_name() != "sqlite":
+        return url
+    return url.set(drivername="sqlite+aiosqlite")
+
+
+async def _close_streams(app: web.Application) -> None:
+    await app[BROADCASTER].close()
+
+
+async def _dispose_engine(app: web.Application) -> None:
+    await app[ENGINE].dispose()
+
+
+async def ingest(app: web.Application, rows: list[dict[str, object]]) -> list[int]:
+    ids = await app[WRITER].submit(rows)
+    app[CACHE].invalidate()
+    app[BROADCASTER].wake()
+    return ids
+
+
+@web.middleware
+async def record_request(request: web.Request, handler: Handler) -> web.StreamResponse:
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        route = _route(request)
+        registry.observe(
+            "beerstat_http_request_duration_seconds",
+            time.perf_counter() - started,
+            route=route,
+            method=request.method,
+        )
+        registry.inc(
+            "beerstat_http_requests_total",
+            route=route,
+            method=request.method,
+            status=str(status),
+        )
+
+
+async def donate(request: web.Request) -> web.Response:
+    if request.content_type != "application/json":
+        raise web.HTTPUnsupportedMediaType()
+    try:
+        data = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest()
+    if not data:
+        raise web.HTTPBadRequest()
+    try:
+        row = parse_donate(data)
+    except InvalidDonation:
+        registry.inc("beerstat_errors_total", route=_route(request), kind="invalid")
+        raise web.HTTPBadRequest()
+    try:
+        _ = await ingest(request.app, [row])
+    except Exception as e:
+        return _write_failed(request, e)
+    return web.json_response({"message": "Success"})
+
+
+async def donate_batch(request: web.Request) -> web.Response:
+    items = await _read_batch(request)
+    if items is None:
+        raise web.HTTPBadRequest()
+
+    results: list[dict[str, Any]] = []
+    rows: list[dict[str, object]] = []
+    for index, item in enumerate(items):
+        try:
+            rows.append(parse_donate(item))
+            results.append({"index": index, "status": "ok"})
+        except InvalidDonation as e:
+            results.append({"index": index, "status": "error", "error": str(e)})
+
+    try:
+        ids = await ingest(request.app, rows)
+    except Exception as e:
+        return _write_failed(request, e)
+
+    accepted = (result for result in results if result["status"] == "ok")
+    for result, donation_id in zip(accepted, ids):
+        result["id"] = donation_id
+    return web.json_response({"message": "Success", "results": results})
+
+
+async def balance(request: web.Request) -> web.Response:
+    async def load() -> float | None:
+        async with request.app[SESSIONS]() as session:
+            return await session.run_sync(get_sum)
+
+    total = await request.app[CACHE].get_async("balance", load)
+    return web.json_response({"Total": total})
+
+
+async def balance_stream(request: web.Request) -> web.StreamResponse:
+    # Server-Sent Events: the current balance right away, then one event per
+    # change. Every viewer of this worker shares one watcher and one query.
+    response = web.StreamResponse(
+        headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
+    _ = await response.prepare(request)
+    async with request.app[BROADCASTER].subscribe() as updates:
+        try:
+            while True:
+                try:
+                    update = await asyncio.wait_for(updates.get(), STREAM_KEEPALIVE)
+                except TimeoutError:
+                    await response.write(b": keepalive\n\n")
+                    continue
+                if update is None:
+                    break
+                data = json.dumps(update)
+                await response.write(f"event: balance\ndata: {data}\n\n".encode())
+        except ConnectionResetError:
+            pass
+    return response
+
+
+async def metrics(_request: web.Request) -> web.Response:
+    return web.Response(
+        text=registry.render(), content_type="text/plain", charset="utf-8"
+    )
+
+
+def _route(request: web.Request) -> str:
+    resource = request.match_info.route.resource
+    return resource.canonical if resource is not None else "unmatched"
+
+
+def _write_failed(request: web.Request, error: Exception) -> web.Response:
+    if isinstance(error, OperationalError) and is_locked(error):
+        # The busy timeout ran out while another writer held the lock
+        registry.inc("beerstat_errors_total", route=_route(request), kind="busy")
+        return web.json_response(
+            {"message": "Database is busy"}, status=503, headers={"Retry-After": "1"}
+        )
+    kind = "database" if isinstance(error, OperationalError) else "unexpected"
+    registry.inc("beerstat_errors_total", route=_route(request), kind=kind)
+    logger.exception("cant store donations")
+    raise web.HTTPInternalServerError()
+
+
+async def _read_batch(request: web.Request) -> list[Any] | None:
+    try:
+        if request.content_type == "application/x-ndjson":
+            text = await request.text()
+            return [json.loads(line) for line in text.splitlines() if line.strip()]
+        data = await request.json()
+    except ValueError:
+        return None
+    return data if isinstance(data, list) else None
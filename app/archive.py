@@ -0,0 +1,97 @@
+import time
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+import sqlalchemy.orm as sa_orm
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.aggregates import BUCKETS
+from app.models import BeerDonation, DonationArchive
+
+
+class ArchiveStats(NamedTuple):
+    archived: int
+    batches: int
+    elapsed: float
+
+    @property
+    def rate(self) -> float:
+        return self.archived / self.elapsed if self.elapsed else 0.0
+
+
+def archive_cutoff(days: int, now: datetime | None = None) -> datetime:
+    # Midnight, so whole days move to the archive at once
+    day = (now or datetime.now()) - timedelta(days=days)
+    return day.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def archive_donations(
+    session: sa_orm.scoped_session[Session],
+    before: datetime,
+    batch_size: int = 1000,
+    pause: float = 0.0,
+    on_batch: Callable[[ArchiveStats], None] | None = None,
+) -> ArchiveStats:
+    # Moves donations dated before `before` into donation_archive, summed per
+    # hour and donor. Every batch is a transaction of its own, so writers wait
+    # for one batch at most and `pause` gives them room in between. Running
+    # totals and rollups already count these donations and stay untouched.
+    started = time.monotonic()
+    archived = batches = 0
+
+    def stats() -> ArchiveStats:
+        return ArchiveStats(archived, batches, time.monotonic() - started)
+
+    while True:
+        ids = list(
+            session.scalars(
+                select(BeerDonation.id)
+                .where(BeerDonation.date < before)
+                .order_by(BeerDonation.id)
+                .limit(batch_size)
+            )
+        )
+        if not ids:
+            return stats()
+        _archive_batch(session, ids)  # pyright: ignore[reportArgumentType]
+        session.commit()
+        archived += len(ids)
+        batches += 1
+        if on_batch is not None:
+            on_batch(stats())
+        if pause:
+            time.sleep(pause)
+
+
+def _archive_batch(session: Session, ids: list[int]) -> None:
+    # Summed from the rows as they are under the write lock, then deleted in
+    # the same transaction
+    start = func.strftime(BUCKETS["hour"][1], BeerDonation.date)
+    stmt = insert(DonationArchive).from_select(
+        ["start", "name", "total_minor", "count", "last_id"],
+        select(
+            start,
+            BeerDonation.name,
+            func.coalesce(func.sum(BeerDonation.value_minor), 0),
+            func.count(BeerDonation.id),
+            func.max(BeerDonation.id),
+        )
+        .where(BeerDonation.id.in_(ids))
+        .group_by(start, BeerDonation.name),
+    )
+    # Donations without a name never conflict (NULLs are distinct in a
+    # unique index) and get rows of their own, which sum up the same
+    _ = session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[DonationArchive.start, DonationArchive.name],
+            set_={
+                "total_minor": DonationArchive.total_minor + stmt.excluded.total_minor,
+                "count": DonationArchive.count + stmt.excluded.count,
+                "last_id": func.max(DonationArchive.last_id, stmt.excluded.last_id),
+            },
+        )
+    )
+    _ = session.execute(delete(BeerDonation).where(BeerDonation.id.in_(ids)))
@@ -0,0 +1,98 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import NamedTuple
+
+
+class _Entry(NamedTuple):
+    value: object
+    version: tuple[int, int]
+    expires_at: float
+
+
+def sqlite_data_version(database: str | None) -> Callable[[], int]:
+    # PRAGMA data_version changes whenever another connection commits, so one
+    # private connection per worker notices writes from every other process.
+    if not database or database == ":memory:":
+        return lambda: 0
+
+    connection: sqlite3.Connection | None = None
+    lock = threading.Lock()
+
+    def data_version() -> int:
+        nonlocal connection
+        with lock:
+            if connection is None:
+                connection = sqlite3.connect(database, check_same_thread=False)
+            return int(connection.execute("PRAGMA data_version").fetchone()[0])
+
+    return data_version
+
+
+class AggregateCache:
+    # Keys are built from parsed query arguments, so spellings of the same
+    # query share an entry. At most `maxsize` entries are kept, least recently
+    # used first out, and all of them are dropped once the data changes.
+    def __init__(
+        self, ttl: float, data_version: Callable[[], int], maxsize: int = 256
+    ) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data_version = data_version
+        self._generation = 0
+        self._version = (0, 0)
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get[T](self, key: str, load: Callable[[], T]) -> T:
+        version, now, entry = self._lookup(key)
+        if entry is not None:
+            return entry.value  # pyright: ignore[reportReturnType]
+        value = load()
+        self._store(key, _Entry(value, version, now + self.ttl))
+        return value
+
+    async def get_async[T](self, key: str, load: Callable[[], Awaitable[T]]) -> T:
+        version, now, entry = self._lookup(key)
+        if entry is not None:
+            return entry.value  # pyright: ignore[reportReturnType]
+        value = await load()
+        self._store(key, _Entry(value, version, now + self.ttl))
+        return value
+
+    def _lookup(self, key: str) -> tuple[tuple[int, int], float, _Entry | None]:
+        version = (self._generation, self._data_version())
+        now = time.monotonic()
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._entries.clear()
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return version, now, entry
+            self.misses += 1
+        return version, now, None
+
+    def _store(self, key: str, entry: _Entry) -> None:
+        with self._lock:
+            if entry.version != self._version:
+                return  # the data changed while it was loaded
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                _ = self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        # Covers writes that data_version can not see (in-memory databases)
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
@@ -0,0 +1,123 @@
+import time
+from pathlib import Path
+
+import click
+from flask.cli import AppGroup
+
+from app.aggregates import check_aggregates, rebuild_aggregates
+from app.archive import ArchiveStats, archive_cutoff, archive_donations
+from app.extensions import db
+from app.importer import IMPORT_FORMATS, ImportStats, import_donations
+
+donations_cli = AppGroup("donations", help="Donation maintenance commands.")
+
+
+@donations_cli.command("check-aggregates")
+def check_aggregates_command() -> None:
+    """Compare the running totals with the donations table."""
+    problems = check_aggregates(db.session)  # pyright: ignore[reportArgumentType]
+    for problem in problems:
+        click.echo(problem, err=True)
+    if problems:
+        raise click.exceptions.Exit(1)
+    click.echo("aggregates are consistent")
+
+
+@donations_cli.command("rebuild-aggregates")
+def rebuild_aggregates_command() -> None:
+    """Recompute the running totals from the donations table."""
+    rebuild_aggregates(db.session)  # pyright: ignore[reportArgumentType]
+    click.echo("aggregates rebuilt")
+
+
+@donations_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(IMPORT_FORMATS),
+    help="File format, guessed from the extension by default.",
+)
+@click.option("--chunk-size", default=5000, show_default=True, type=click.IntRange(1))
+@click.option("--restart", is_flag=True, help="Ignore the saved position.")
+def import_command(path: Path, fmt: str | None, chunk_size: int, restart: bool) -> None:
+    """Bulk import donations from a CSV or NDJSON file."""
+    fmt = fmt or path.suffix.lstrip(".").lower()
+    if fmt not in IMPORT_FORMATS:
+        raise click.BadParameter(
+            f"can not guess the format of {path}", param_hint="--format"
+        )
+
+    def report(stats: ImportStats) -> None:
+        click.echo(
+            f"record {stats.position}: {stats.imported} imported, "
+            f"{stats.invalid} invalid, {stats.rate:.0f} rows/s"
+        )
+
+    def warn(position: int, error: str) -> None:
+        click.echo(f"record {position}: skipped, {error}", err=True)
+
+    stats = import_donations(
+        db.session,  # pyright: ignore[reportArgumentType]
+        path,
+        fmt,
+        chunk_size,
+        restart=restart,
+        on_chunk=report,
+        on_invalid=warn,
+    )
+    click.echo(
+        f"done: {stats.imported} imported, {stats.invalid} invalid "
+        f"in {stats.elapsed:.1f}s, aggregates rebuilt"
+    )
+
+
+@donations_cli.command("archive")
+@click.option(
+    "--older-than",
+    "days",
+    default=90,
+    show_default=True,
+    type=click.IntRange(1),
+    help="Retention window in days.",
+)
+@click.option("--batch-size", default=1000, show_default=True, type=click.IntRange(1))
+@click.option(
+    "--pause-ms",
+    default=50,
+    show_default=True,
+    type=click.IntRange(0),
+    help="Sleep between batches so writers get the lock.",
+)
+@click.option(
+    "--every",
+    type=click.IntRange(1),
+    help="Keep running and archive again every N seconds.",
+)
+def archive_command(
+    days: int, batch_size: int, pause_ms: int, every: int | None
+) -> None:
+    """Move old donations into the hourly per-donor archive."""
+
+    def report(stats: ArchiveStats) -> None:
+        click.echo(
+            f"batch {stats.batches}: {stats.archived} archived, {stats.rate:.0f} rows/s"
+        )
+
+    while True:
+        before = archive_cutoff(days)
+        stats = archive_donations(
+            db.session,  # pyright: ignore[reportArgumentType]
+            before,
+            batch_size,
+            pause=pause_ms / 1000,
+            on_batch=report,
+        )
+        click.echo(
+            f"done: {stats.archived} donations before {before:%Y-%m-%d} archived "
+            f"in {stats.elapsed:.1f}s"
+        )
+        if every is None:
+            return
+        db.session.remove()
+        time.sleep(every)
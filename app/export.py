@@ -0,0 +1,72 @@
+import csv
+import io
+import json
+from collections.abc import Iterator
+from datetime import datetime
+
+from sqlalchemy import Engine, Row, select
+
+from app.models import BeerDonation
+from app.money import to_major
+
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_FIELDS = ("id", "name", "date", "value")
+
+
+def iter_donations(
+    engine: Engine,
+    since_id: int = 0,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Iterator[Row[tuple[int, str, datetime, int]]]:
+    # Keyset pagination on the primary key. Every chunk borrows a pooled
+    # connection and returns it, so no read transaction outlives a chunk and
+    # at most chunk_size rows are in memory.
+    last_id = since_id
+    while True:
+        query = select(
+            BeerDonation.id,
+            BeerDonation.name,
+            BeerDonation.date,
+            BeerDonation.value_minor,
+        ).where(BeerDonation.id > last_id)
+        if date_from is not None:
+            query = query.where(BeerDonation.date >= date_from)
+        if date_to is not None:
+            query = query.where(BeerDonation.date < date_to)
+        with engine.connect() as connection:
+            rows = connection.execute(
+                query.order_by(BeerDonation.id).limit(chunk_size)
+            ).all()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1].id
+
+
+def _export_row(row: Row[tuple[int, str, datetime, int]]) -> tuple[object, ...]:
+    donation_id, name, date, value_minor = row
+    return (
+        donation_id,
+        name,
+        date.isoformat() if date is not None else None,
+        to_major(value_minor) if value_minor is not None else None,
+    )
+
+
+def to_csv(rows: Iterator[Row[tuple[int, str, datetime, int]]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        writer.writerow(_export_row(row))
+        yield buffer.getvalue()
+        _ = buffer.seek(0)
+        _ = buffer.truncate()
+    yield buffer.getvalue()
+
+
+def to_ndjson(rows: Iterator[Row[tuple[int, str, datetime, int]]]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, _export_row(row)))) + "\n"
@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
 
+from app.storage import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
@@ -0,0 +1,39 @@
+import threading
+from collections import OrderedDict
+
+IDEMPOTENCY_KEY_LENGTH = 64
+
+
+class RecentKeys:
+    # Bounded LRU of idempotency keys that are known to be committed, mapped
+    # to their donation id. A hit answers a redelivery without a database
+    # round-trip, a miss falls back to the unique index.
+    def __init__(self, maxsize: int = 10_000) -> None:
+        self.maxsize = maxsize
+        self._keys: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> int | None:
+        with self._lock:
+            donation_id = self._keys.get(key)
+            if donation_id is not None:
+                self._keys.move_to_end(key)
+            return donation_id
+
+    def add(self, keys: dict[str, int]) -> None:
+        with self._lock:
+            for key, donation_id in keys.items():
+                self._keys[key] = donation_id
+                self._keys.move_to_end(key)
+            while len(self._keys) > self.maxsize:
+                _ = self._keys.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys.clear()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+recent_keys = RecentKeys()
@@ -0,0 +1,109 @@
+import csv
+import json
+import time
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import Any, NamedTuple
+
+import sqlalchemy.orm as sa_orm
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.aggregates import rebuild_aggregates
+from app.models import ImportProgress
+from app.utils import InvalidDonation, add_donates, parse_donate
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+
+class ImportStats(NamedTuple):
+    position: int
+    imported: int
+    invalid: int
+    elapsed: float
+
+    @property
+    def rate(self) -> float:
+        return self.imported / self.elapsed if self.elapsed else 0.0
+
+
+def read_records(path: Path, fmt: str) -> Iterator[Any]:
+    with path.open(newline="", encoding="utf-8") as source:
+        if fmt == "csv":
+            yield from csv.DictReader(source)
+            return
+        for line in source:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+
+
+def _stored_position(session: Session, source: str) -> int:
+    position = session.scalar(
+        select(ImportProgress.position).where(ImportProgress.source == source)
+    )
+    return position or 0
+
+
+def _save_position(session: Session, source: str, position: int) -> None:
+    stmt = insert(ImportProgress).values(source=source, position=position)
+    _ = session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[ImportProgress.source],
+            set_={"position": stmt.excluded.position},
+        )
+    )
+
+
+def import_donations(
+    session: sa_orm.scoped_session[Session],
+    path: Path,
+    fmt: str,
+    chunk_size: int,
+    restart: bool = False,
+    on_chunk: Callable[[ImportStats], None] | None = None,
+    on_invalid: Callable[[int, str], None] | None = None,
+) -> ImportStats:
+    # The position of the last committed record is saved in the same
+    # transaction as its chunk, so an interrupted import resumes exactly there.
+    source = str(path.resolve())
+    skip = 0 if restart else _stored_position(session, source)  # pyright: ignore[reportArgumentType]
+    started = time.monotonic()
+    position = imported = invalid = 0
+    chunk: list[dict[str, object]] = []
+
+    def stats() -> ImportStats:
+        return ImportStats(position, imported, invalid, time.monotonic() - started)
+
+    def commit_chunk() -> None:
+        nonlocal imported
+        # Aggregates are rebuilt once at the end instead of per chunk
+        _ = add_donates(chunk, session, update_aggregates=False)
+        _save_position(session, source, position)  # pyright: ignore[reportArgumentType]
+        session.commit()
+        imported += len(chunk)
+        chunk.clear()
+        if on_chunk is not None:
+            on_chunk(stats())
+
+    for record in read_records(path, fmt):
+        position += 1
+        if position <= skip:
+            continue
+        try:
+            chunk.append(parse_donate(record))
+        except InvalidDonation as e:
+            invalid += 1
+            if on_invalid is not None:
+                on_invalid(position, str(e))
+        if len(chunk) >= chunk_size:
+            commit_chunk()
+
+    if chunk or position > skip:
+        commit_chunk()
+    # Also covers rows committed by an earlier interrupted run
+    rebuild_aggregates(session)  # pyright: ignore[reportArgumentType]
+    return stats()
@@ -0,0 +1,341 @@
+import atexit
+import json
+import os
+import secrets
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+Labels = tuple[tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS: dict[str, tuple[str, str]] = {
+    "beerstat_http_requests_total": ("counter", "HTTP requests by route and status."),
+    "beerstat_http_request_duration_seconds": (
+        "histogram",
+        "HTTP request latency by route.",
+    ),
+    "beerstat_errors_total": ("counter", "Failed donation writes by route and kind."),
+    "beerstat_db_commit_duration_seconds": (
+        "histogram",
+        "Duration of donation commits.",
+    ),
+    "beerstat_db_queries_total": (
+        "counter",
+        "SQL statements issued by profiled requests by route.",
+    ),
+    "beerstat_db_request_duration_seconds": (
+        "histogram",
+        "Time profiled requests spent in SQL by route.",
+    ),
+    "beerstat_db_slow_queries_total": (
+        "counter",
+        "Statements slower than SQL_SLOW_QUERY_MS.",
+    ),
+    "beerstat_duplicates_total": (
+        "counter",
+        "Donations skipped because their idempotency key was already stored.",
+    ),
+    "beerstat_stream_subscribers": ("gauge", "Open /balance/stream connections."),
+    "beerstat_stream_updates_total": (
+        "counter",
+        "Balance changes pushed to /balance/stream subscribers.",
+    ),
+    "beerstat_consumer_messages_total": (
+        "counter",
+        "Queue messages handled by the consumer by result.",
+    ),
+    "beerstat_consumer_message_duration_seconds": (
+        "histogram",
+        "Time from taking a queue message to its delivery.",
+    ),
+    "beerstat_consumer_in_flight": ("gauge", "Messages being delivered right now."),
+    "beerstat_consumer_failures_total": (
+        "counter",
+        "Failed deliveries by sink and reason.",
+    ),
+    "beerstat_consumer_retries_total": (
+        "counter",
+        "Payloads sent again after the sink was unavailable.",
+    ),
+    "beerstat_consumer_breaker_open": (
+        "gauge",
+        "1 while the circuit breaker keeps the sink paused.",
+    ),
+    "beerstat_consumer_spool_depth": ("gauge", "Payloads waiting in the spool."),
+    "beerstat_consumer_spool_drained_total": (
+        "counter",
+        "Payloads delivered from the spool.",
+    ),
+    "beerstat_consumer_spool_drain_rate": (
+        "gauge",
+        "Payloads per second of the last drained spool batch.",
+    ),
+}
+
+
+class _Histogram:
+    def __init__(self) -> None:
+        self.buckets = [0] * len(DEFAULT_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    # Every process keeps its own numbers. With a directory configured each
+    # process also dumps them to <directory>/<pid>-<token>.json (at most once
+    # per flush_interval and at exit) and render() sums the files of all
+    # processes, subdirectories included, which is how gunicorn workers and
+    # the consumer share one /metrics. The random token keeps a process that reuses a pid from
+    # overwriting the file of the one that had it before. Gauges of processes
+    # that are gone are dropped, counters and histograms are kept so they
+    # never go backwards.
+    def __init__(self) -> None:
+        self.directory: Path | None = None
+        self.flush_interval = 1.0
+        self._counters: dict[tuple[str, Labels], float] = {}
+        self._gauges: dict[tuple[str, Labels], float] = {}
+        self._histograms: dict[tuple[str, Labels], _Histogram] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flushed_at = 0.0
+        self._atexit = False
+        self._pid = 0
+        self._token = ""
+
+    def configure(self, directory: str | None, flush_interval: float = 1.0) -> None:
+        self.flush_interval = flush_interval
+        if not directory:
+            self.directory = None
+            return
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if not self._atexit:
+            _ = atexit.register(self.flush)
+            self._atexit = True
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._maybe_flush()
+
+    def add(self, name: str, value: float, **labels: str) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + value
+        self._maybe_flush()
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self._gauges[key] = value
+        self._maybe_flush()
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(value)
+        self._maybe_flush()
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def _maybe_flush(self) -> None:
+        if (
+            self.directory is not None
+            and time.monotonic() - self._flushed_at >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        if self.directory is None:
+            return
+        with self._flush_lock:
+            self._flushed_at = time.monotonic()
+            path = self.directory / f"{self._file_stem()}.json"
+            tmp = path.with_suffix(".tmp")
+            _ = tmp.write_text(json.dumps(self._snapshot()))
+            os.replace(tmp, path)
+
+    def _file_stem(self) -> str:
+        # A fresh token in every process, forked workers included
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid, self._token = pid, secrets.token_hex(4)
+        return f"{pid}-{self._token}"
+
+    def _snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": [[n, list(ls), v] for (n, ls), v in self._counters.items()],
+                "gauges": [[n, list(ls), v] for (n, ls), v in self._gauges.items()],
+                "histograms": [
+                    [n, list(ls), [h.buckets, h.sum, h.count]]
+                    for (n, ls), h in self._histograms.items()
+                ],
+            }
+
+    def _snapshots(self) -> Iterator[tuple[bool, dict[str, Any]]]:
+        if self.directory is None:
+            yield True, self._snapshot()
+            return
+        self.flush()
+        files: list[tuple[float, int, Path]] = []
+        for path in self.directory.rglob("*.json"):
+            try:
+                pid = int(path.stem.split("-")[0])
+                files.append((path.stat().st_mtime, pid, path))
+            except (OSError, ValueError):
+                continue
+        # Of several files with the same pid only the newest can belong to a
+        # running process, the older ones were left by processes that exited
+        seen: set[int] = set()
+        for _, pid, path in sorted(files, reverse=True):
+            alive = pid not in seen and _is_alive(pid)
+            seen.add(pid)
+            try:
+                snapshot = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            yield alive, snapshot
+
+    def value(self, name: str, **labels: str) -> float:
+        # Counter or gauge summed over every process and every label set
+        # that contains `labels`
+        counters, gauges, _ = self._merge()
+        wanted = set(labels.items())
+        return sum(
+            value
+            for (n, key), value in (counters | gauges).items()
+            if n == name and wanted <= set(key)
+        )
+
+    def _merge(
+        self,
+    ) -> tuple[
+        dict[tuple[str, Labels], float],
+        dict[tuple[str, Labels], float],
+        dict[tuple[str, Labels], _Histogram],
+    ]:
+        counters: dict[tuple[str, Labels], float] = {}
+        gauges: dict[tuple[str, Labels], float] = {}
+        histograms: dict[tuple[str, Labels], _Histogram] = {}
+        for alive, snapshot in self._snapshots():
+            for name, labels, value in snapshot["counters"]:
+                key = (name, _from_json(labels))
+                counters[key] = counters.get(key, 0) + value
+            if alive:
+                for name, labels, value in snapshot["gauges"]:
+                    key = (name, _from_json(labels))
+                    gauges[key] = gauges.get(key, 0) + value
+            for name, labels, (buckets, total, count) in snapshot["histograms"]:
+                key = (name, _from_json(labels))
+                merged = histograms.setdefault(key, _Histogram())
+                merged.buckets = [a + b for a, b in zip(merged.buckets, buckets)]
+                merged.sum += total
+                merged.count += count
+        return counters, gauges, histograms
+
+    def render(self) -> str:
+        counters, gauges, histograms = self._merge()
+        lines: list[str] = []
+        for name, (kind, help_text) in METRICS.items():
+            values = {"counter": counters, "gauge": gauges}.get(kind)
+            if values is not None:
+                samples = [
+                    f"{name}{_format(labels)} {_number(value)}"
+                    for (n, labels), value in sorted(values.items())
+                    if n == name
+                ]
+            else:
+                samples = [
+                    line
+                    for (n, labels), histogram in sorted(
+                        histograms.items(), key=lambda item: item[0]
+                    )
+                    if n == name
+                    for line in _histogram_lines(name, labels, histogram)
+                ]
+            if samples:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def _from_json(labels: list[list[str]]) -> Labels:
+    return tuple((str(k), str(v)) for k, v in labels)
+
+
+def _format(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram_lines(name: str, labels: Labels, histogram: _Histogram) -> list[str]:
+    lines: list[str] = []
+    cumulative = 0
+    for bound, count in zip(DEFAULT_BUCKETS, histogram.buckets):
+        cumulative += count
+        lines.append(
+            f"{name}_bucket{_format(labels + (('le', f'{bound:g}'),))} {cumulative}"
+        )
+    lines.append(
+        f"{name}_bucket{_format(labels + (('le', '+Inf'),))} {histogram.count}"
+    )
+    lines.append(f"{name}_sum{_format(labels)} {_number(histogram.sum)}")
+    lines.append(f"{name}_count{_format(labels)} {histogram.count}")
+    return lines
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+registry = Registry()
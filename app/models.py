@@ -1,16 +1,101 @@
 import typing
-from sqlalchemy import Column, Integer, String, DateTime, Float
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from sqlalchemy.ext.hybrid import hybrid_property
 from datetime import datetime
 from app.extensions import db
+from app.money import to_major, to_minor
 
 
 class BeerDonation(db.Model):
     __tablename__ = "donations"
+    __table_args__ = (
+        # Covering indexes: range sums and per-donor sums never touch the table
+        Index("ix_donations_date_value", "date", "value_minor"),
+        Index("ix_donations_name_value", "name", "value_minor"),
+        Index("ix_donations_idempotency_key", "idempotency_key", unique=True),
+    )
     id = Column(Integer, primary_key=True)
     name = Column(String(30))
     date = Column(DateTime, default=datetime.now)
-    value = Column(Float)  # pyright: ignore[reportUnknownVariableType]
+    value_minor: Column[int] = Column(Integer)
+    # Set by the consumer so a redelivered message is stored only once
+    idempotency_key = Column(String(64))
+
+    @hybrid_property
+    def value(self) -> float | None:  # pyright: ignore[reportRedeclaration]
+        return to_major(self.value_minor) if self.value_minor is not None else None  # pyright: ignore[reportArgumentType]
+
+    @value.inplace.setter
+    def _value_setter(self, value: float | None) -> None:
+        self.value_minor = to_minor(value) if value is not None else None  # pyright: ignore[reportAttributeAccessIssue]
 
     @typing.override
     def __repr__(self) -> str:
         return f"<Donation(id={self.id}, date={self.date}, value={self.value}, name={self.name})>"
+
+
+class BalanceTotal(db.Model):
+    __tablename__ = "balance_totals"
+    id = Column(Integer, primary_key=True)
+    total_minor = Column(Integer, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+    last_id = Column(Integer, nullable=False, default=0)
+
+    @typing.override
+    def __repr__(self) -> str:
+        return f"<BalanceTotal(total_minor={self.total_minor}, count={self.count}, last_id={self.last_id})>"
+
+
+class DonationRollup(db.Model):
+    __tablename__ = "donation_rollups"
+    bucket = Column(String(5), primary_key=True)
+    start = Column(DateTime, primary_key=True)
+    total_minor = Column(Integer, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+    @typing.override
+    def __repr__(self) -> str:
+        return f"<DonationRollup(bucket={self.bucket}, start={self.start}, total_minor={self.total_minor}, count={self.count})>"
+
+
+class DonorTotal(db.Model):
+    __tablename__ = "donor_totals"
+    __table_args__ = (Index("ix_donor_totals_total", "total_minor"),)
+    name = Column(String(30), primary_key=True)
+    total_minor = Column(Integer, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+    last_date = Column(DateTime)
+
+    @typing.override
+    def __repr__(self) -> str:
+        return f"<DonorTotal(name={self.name}, total_minor={self.total_minor}, count={self.count})>"
+
+
+class DonationArchive(db.Model):
+    # Donations past the retention window, summed per hour and donor. Hourly
+    # rows keep every bucket of /stats exactly rebuildable.
+    __tablename__ = "donation_archive"
+    __table_args__ = (
+        Index("ix_donation_archive_start_name", "start", "name", unique=True),
+    )
+    id = Column(Integer, primary_key=True)
+    start = Column(DateTime, nullable=False)
+    name = Column(String(30))
+    total_minor = Column(Integer, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+    # Highest donation id folded into this row
+    last_id = Column(Integer, nullable=False, default=0)
+
+    @typing.override
+    def __repr__(self) -> str:
+        return f"<DonationArchive(start={self.start}, name={self.name}, total_minor={self.total_minor}, count={self.count})>"
+
+
+class ImportProgress(db.Model):
+    __tablename__ = "import_progress"
+    source = Column(String(255), primary_key=True)
+    position = Column(Integer, nullable=False, default=0)
+
+    @typing.override
+    def __repr__(self) -> str:
+        return f"<ImportProgress(source={self.source}, position={self.position})>"
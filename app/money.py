@@ -0,0 +1,21 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+# Amounts are stored as integer kopecks, the API speaks roubles
+MINOR_PER_MAJOR = 100
+# SQLite stores integers as signed 64 bit
+MAX_MINOR = 2**63 - 1
+
+
+def to_minor(value: object) -> int:
+    try:
+        minor = (Decimal(str(value)) * MINOR_PER_MAJOR).to_integral_value(ROUND_HALF_UP)
+        minor = int(minor)
+    except (InvalidOperation, OverflowError, ValueError) as e:
+        raise ValueError(f"invalid amount {value!r}") from e
+    if not -MAX_MINOR - 1 <= minor <= MAX_MINOR:
+        raise ValueError(f"amount out of range {value!r}")
+    return minor
+
+
+def to_major(minor: int) -> float:
+    return minor / MINOR_PER_MAJOR
@@ -0,0 +1,116 @@
+import logging
+import random
+import time
+from contextvars import ContextVar, Token
+from typing import Any
+
+from sqlalchemy import Engine, event
+
+from app.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Statements worth an EXPLAIN QUERY PLAN when they are slow
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+class QueryStats:
+    # SQL issued while one profiled request was running
+    def __init__(self) -> None:
+        self.queries = 0
+        self.duration = 0.0
+        self.slow = 0
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.duration * 1000:.2f};desc="{self.queries} queries"'
+
+
+_current: ContextVar[QueryStats | None] = ContextVar("sql_profile", default=None)
+
+
+class SQLProfiler:
+    # Opt-in timing of every statement on an engine through SQLAlchemy's
+    # cursor events. Nothing is attached until install(), so with profiling
+    # off there is no cost at all. Once installed only requests picked by
+    # sample() are measured, the others pay one context variable lookup per
+    # statement.
+    def __init__(self, sample_rate: float = 1.0, slow_query_ms: float = 100) -> None:
+        self.sample_rate = sample_rate
+        self.slow_query = slow_query_ms / 1000
+
+    def install(self, engine: Engine) -> None:
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def sample(self) -> bool:
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def start(self) -> Token[QueryStats | None]:
+        return _current.set(QueryStats())
+
+    def stop(self, token: Token[QueryStats | None], route: str) -> QueryStats | None:
+        stats = _current.get()
+        _current.reset(token)
+        if stats is not None:
+            registry.inc("beerstat_db_queries_total", stats.queries, route=route)
+            registry.observe(
+                "beerstat_db_request_duration_seconds", stats.duration, route=route
+            )
+        return stats
+
+    def _after_cursor_execute(
+        self,
+        _conn: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        stats = _current.get()
+        started = getattr(context, "_profile_started", None)
+        if stats is None or started is None:
+            return
+        elapsed = time.perf_counter() - started
+        stats.queries += 1
+        stats.duration += elapsed
+        if elapsed < self.slow_query:
+            return
+
+        registry.inc("beerstat_db_slow_queries_total")
+        stats.slow += 1
+        if executemany and parameters:
+            parameters = parameters[0]
+        logger.warning(
+            "slow query (%.1f ms): %s\n%s",
+            elapsed * 1000,
+            statement,
+            _explain(cursor, statement, parameters),
+        )
+
+
+def _before_cursor_execute(
+    _conn: Any,
+    _cursor: Any,
+    _statement: str,
+    _parameters: Any,
+    context: Any,
+    _executemany: bool,
+) -> None:
+    if _current.get() is not None:
+        context._profile_started = time.perf_counter()
+
+
+def _explain(cursor: Any, statement: str, parameters: Any) -> str:
+    # Runs on the connection that just executed the statement, so it sees the
+    # same schema and transaction. Plans are SQLite specific.
+    if not statement.lstrip().upper().startswith(_EXPLAINABLE):
+        return "(no plan)"
+    plan_cursor = cursor.connection.cursor()
+    try:
+        _ = plan_cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ())
+        return "\n".join(f"  {row[-1]}" for row in plan_cursor.fetchall())
+    except Exception as e:
+        return f"(no plan: {e})"
+    finally:
+        plan_cursor.close()
@@ -9,6 +9,38 @@ redis_url: str = os.environ.get("REDIS_URL", "redis://127.0.0.1/2")
 # Beer consumer
 BEER_URL: str = os.environ.get("BEER_URL", "http://127.0.0.1:6016/donate")
 BEER_STAT = "bs_donats"
+BEER_CONCURRENCY: int = int(os.environ.get("BEER_CONCURRENCY", "4"))
+# Batching is off with a batch size of 1
+BEER_BATCH_SIZE: int = int(os.environ.get("BEER_BATCH_SIZE", "1"))
+BEER_BATCH_INTERVAL_MS: int = int(os.environ.get("BEER_BATCH_INTERVAL_MS", "50"))
+BEER_BATCH_URL: str = os.environ.get("BEER_BATCH_URL", f"{BEER_URL}/batch")
+# "http" posts to BEER_URL, "db" writes straight into the web app's database
+BEER_SINK: str = os.environ.get("BEER_SINK", "http")
+# Same default as the web app, the db sink resolves relative SQLite paths
+# against instance/ like it does
+BEER_DATABASE_URI: str = os.environ.get(
+    "SQLALCHEMY_DATABASE_URI", "sqlite:///mydatabase.db"
+)
+SQLITE_JOURNAL_MODE: str = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS: str = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT: int = int(os.environ.get("SQLITE_BUSY_TIMEOUT", "5000"))
+# Retries with exponential backoff, a circuit breaker pauses delivery after
+# BEER_BREAKER_THRESHOLD failures in a row
+BEER_RETRY_ATTEMPTS: int = int(os.environ.get("BEER_RETRY_ATTEMPTS", "5"))
+BEER_RETRY_BASE_MS: int = int(os.environ.get("BEER_RETRY_BASE_MS", "100"))
+BEER_RETRY_MAX_MS: int = int(os.environ.get("BEER_RETRY_MAX_MS", "10000"))
+BEER_BREAKER_THRESHOLD: int = int(os.environ.get("BEER_BREAKER_THRESHOLD", "5"))
+BEER_BREAKER_RESET_MS: int = int(os.environ.get("BEER_BREAKER_RESET_MS", "5000"))
+# Unset disables the on-disk spool
+BEER_SPOOL_PATH: str | None = os.environ.get("BEER_SPOOL_PATH")
+BEER_SPOOL_MAX: int = int(os.environ.get("BEER_SPOOL_MAX", "100000"))
+BEER_SPOOL_BATCH: int = int(os.environ.get("BEER_SPOOL_BATCH", "100"))
+# Worker processes started by the supervisor, each with BEER_CONCURRENCY slots
+BEER_WORKERS: int = int(os.environ.get("BEER_WORKERS", "1"))
+# How long a stopping worker waits for in-flight messages
+BEER_SHUTDOWN_TIMEOUT_MS: int = int(os.environ.get("BEER_SHUTDOWN_TIMEOUT_MS", "30000"))
+# Directory shared with the web app's /metrics, unset disables export
+METRICS_DIR: str | None = os.environ.get("METRICS_DIR")
 
 currencies: dict[str, float] = {
     "USD": 80,
@@ -0,0 +1,51 @@
+import os
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import URL, Engine, event, make_url
+from sqlalchemy.exc import OperationalError
+
+# Same folder Flask-SQLAlchemy resolves relative SQLite paths against
+INSTANCE_PATH = Path(__file__).resolve().parents[1] / "instance"
+DEFAULT_DATABASE_URI = "sqlite:///mydatabase.db"
+
+
+def resolve_database_url(uri: str) -> URL:
+    # Relative SQLite paths point into the instance folder like they do for
+    # the Flask app, so every process opens the same file
+    url = make_url(uri)
+    if url.get_backend_name() != "sqlite":
+        return url
+    database = url.database
+    if database and database != ":memory:" and not os.path.isabs(database):
+        INSTANCE_PATH.mkdir(exist_ok=True)
+        url = url.set(database=str(INSTANCE_PATH / database))
+    return url
+
+
+def configure_sqlite(
+    engine: Engine,
+    journal_mode: str,
+    busy_timeout: int,
+    synchronous: str,
+    read_only: bool = False,
+) -> None:
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection: Any, _connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        # busy_timeout first so switching the journal mode can wait for the lock
+        _ = cursor.execute(f"PRAGMA busy_timeout = {int(busy_timeout)}")
+        if read_only:
+            # The journal mode is the writer's business
+            _ = cursor.execute("PRAGMA query_only = ON")
+        else:
+            _ = cursor.execute(f"PRAGMA journal_mode = {journal_mode}")
+            _ = cursor.execute(f"PRAGMA synchronous = {synchronous}")
+        cursor.close()
+
+
+def is_locked(error: OperationalError) -> bool:
+    return "database is locked" in str(error.orig)
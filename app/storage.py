@@ -0,0 +1,68 @@
+from contextvars import ContextVar, Token
+from pathlib import Path
+from typing import Any
+
+from flask import current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy import URL, Engine, create_engine, event
+
+# Key of the read-only engine in app.extensions
+READ_ENGINE = "read_engine"
+
+_reading: ContextVar[bool] = ContextVar("reading", default=False)
+
+
+class RoutingSession(Session):
+    # db.session of the Flask app. Between begin_reads() and end_reads()
+    # statements go to the app's read-only pool, everything else (and every
+    # flush) to the write engine. Apps without a read pool always use the
+    # write engine.
+    def get_bind(
+        self,
+        mapper: Any | None = None,
+        clause: Any | None = None,
+        bind: Any | None = None,
+        **kwargs: Any,
+    ) -> Any:
+        if bind is None and _reading.get() and not self._flushing:
+            engine = current_app.extensions.get(READ_ENGINE)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def begin_reads() -> Token[bool]:
+    return _reading.set(True)
+
+
+def end_reads(token: Token[bool]) -> None:
+    _reading.reset(token)
+
+
+def read_only_url(url: URL) -> URL | None:
+    # None for databases that can not be opened a second time read-only
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return url.set(
+        database=f"file:{Path(url.database).resolve()}",
+        query={"mode": "ro", "uri": "true"},
+    )
+
+
+def create_read_engine(write_engine: Engine, pool_size: int) -> Engine | None:
+    # mode=ro connections can never take the write lock. In WAL mode each
+    # read transaction sees one committed snapshot and never waits for the
+    # writer, so reads scale with the pool while writes stay serialized on
+    # the write engine.
+    read_url = read_only_url(write_engine.url)
+    if read_url is None:
+        return None
+    engine = create_engine(read_url, pool_size=pool_size)
+
+    @event.listens_for(engine, "do_connect", once=True)
+    def prepare_database(*_args: Any) -> None:
+        # A read-only connection can not create the file or switch it to
+        # WAL, the write engine does both when it connects
+        write_engine.connect().close()
+
+    return engine
@@ -0,0 +1,123 @@
+import asyncio
+import contextlib
+import logging
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+from app.aggregates import read_balance_update
+from app.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+Update = dict[str, Any]
+
+
+def read_update(session: Session) -> Update:
+    total, latest = read_balance_update(session)
+    last = None
+    if latest is not None:
+        donation_id, name, value, date = latest
+        last = {
+            "id": donation_id,
+            "name": name,
+            "value": value,
+            "date": date.isoformat() if date is not None else None,
+        }
+    return {"Total": total, "last": last}
+
+
+class BalanceBroadcaster:
+    # One per worker. A single task watches the database change counter
+    # (PRAGMA data_version, which moves on commits from any process) and,
+    # when it moved, loads the balance once and hands it to every
+    # subscriber. Cost follows the number of commits, not the number of
+    # viewers. Writes made by this worker call wake() so they are pushed
+    # without waiting for the next poll.
+    def __init__(
+        self,
+        data_version: Callable[[], int],
+        load: Callable[[], Awaitable[Update]],
+        interval: float = 0.25,
+    ) -> None:
+        self.interval = interval
+        self.updates = 0
+        self.latest: Update | None = None
+        self._data_version = data_version
+        self._load = load
+        self._version: int | None = None
+        self._subscribers: set[asyncio.Queue[Update | None]] = set()
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def close(self) -> None:
+        for queue in self._subscribers:
+            _put_latest(queue, None)
+        if self._task is not None:
+            _ = self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self) -> AsyncIterator[asyncio.Queue[Update | None]]:
+        # Each subscriber only keeps the newest update, a slow viewer skips
+        # the ones it missed instead of piling them up. None ends the stream.
+        queue: asyncio.Queue[Update | None] = asyncio.Queue(maxsize=1)
+        if self.latest is None:
+            self.latest = await self._load()
+        queue.put_nowait(self.latest)
+        self._subscribers.add(queue)
+        registry.set("beerstat_stream_subscribers", len(self._subscribers))
+        self.start()
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+            registry.set("beerstat_stream_subscribers", len(self._subscribers))
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                _ = await asyncio.wait_for(self._wake.wait(), self.interval)
+                woken = True
+            except TimeoutError:
+                woken = False
+            self._wake.clear()
+            try:
+                await self._poll(woken)
+            except Exception:
+                logger.exception("cant load the balance update")
+
+    async def _poll(self, woken: bool) -> None:
+        version = self._data_version()
+        changed = woken or version != self._version
+        self._version = version
+        if not self._subscribers:
+            # Nobody listens, the next subscriber loads a fresh value
+            self.latest = None
+            return
+        if not changed:
+            return
+        update = await self._load()
+        if update == self.latest:
+            return
+        self.latest = update
+        self.updates += 1
+        registry.inc("beerstat_stream_updates_total")
+        for queue in self._subscribers:
+            _put_latest(queue, update)
+
+
+def _put_latest(queue: asyncio.Queue[Update | None], update: Update | None) -> None:
+    if queue.full():
+        _ = queue.get_nowait()
+    queue.put_nowait(update)
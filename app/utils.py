@@ -1,25 +1,153 @@
+from app.aggregates import apply_donations, read_balance
+from app.idempotency import IDEMPOTENCY_KEY_LENGTH, recent_keys
+from app.metrics import registry
 from app.models import BeerDonation
+from app.money import to_minor
 from datetime import datetime
-from sqlalchemy import func
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
 import sqlalchemy.orm as sa_orm
 from sqlalchemy.orm import Session
 
 
-def insert_donate(data: dict[str, object], session: sa_orm.scoped_session[Session]):
+class InvalidDonation(ValueError):
+    pass
+
+
+def parse_date(value: str) -> datetime:
+    # Stored dates are naive local time, like datetime.now(). A date with an
+    # offset is converted so it compares with them as the same instant.
+    date = datetime.fromisoformat(value)
+    if date.tzinfo is not None:
+        date = date.astimezone().replace(tzinfo=None)
+    return date
+
+
+def parse_donate(data: object) -> dict[str, object]:
+    if not isinstance(data, dict) or not data:
+        raise InvalidDonation("donation must be a non-empty object")
     # Extract values with proper type conversion
     name = str(data.get("name", ""))
     date_str = str(data.get("date", ""))
-    value = float(str(data.get("value", 0.0)))
+    try:
+        date = parse_date(date_str)
+        value_minor = to_minor(data.get("value", 0))
+    except ValueError as e:
+        raise InvalidDonation(str(e)) from e
+
+    key = data.get("idempotency_key")
+    if key is not None and (
+        not isinstance(key, str) or not 0 < len(key) <= IDEMPOTENCY_KEY_LENGTH
+    ):
+        raise InvalidDonation(
+            f"idempotency_key must be 1 to {IDEMPOTENCY_KEY_LENGTH} characters"
+        )
+
+    return {
+        "name": name,
+        "date": date,
+        "value_minor": value_minor,
+        "idempotency_key": key,
+    }
+
+
+def _key(row: dict[str, object]) -> str | None:
+    key = row.get("idempotency_key")
+    return key if isinstance(key, str) else None
+
 
-    donation = BeerDonation(
-        name=name,
-        date=datetime.fromisoformat(date_str),
-        value=value,
+def _known_keys(
+    rows: list[dict[str, object]], session: sa_orm.scoped_session[Session]
+) -> dict[str, int]:
+    keys = {key for key in map(_key, rows) if key is not None}
+    known: dict[str, int] = {}
+    for key in keys:
+        donation_id = recent_keys.get(key)
+        if donation_id is not None:
+            known[key] = donation_id
+    if known:
+        registry.inc("beerstat_duplicates_total", len(known), source="cache")
+
+    missing = keys - known.keys()
+    if missing:
+        stored = session.execute(
+            select(BeerDonation.idempotency_key, BeerDonation.id).where(
+                BeerDonation.idempotency_key.in_(missing)
+            )
+        ).all()
+        if stored:
+            registry.inc("beerstat_duplicates_total", len(stored), source="database")
+        known.update({str(key): donation_id for key, donation_id in stored})
+    return known
+
+
+def add_donates(
+    rows: list[dict[str, object]],
+    session: sa_orm.scoped_session[Session],
+    update_aggregates: bool = True,
+) -> list[int]:
+    if not rows:
+        return []
+    # A row whose idempotency key is already stored, or was seen earlier in
+    # the batch, is not inserted again and gets the existing id
+    known = _known_keys(rows, session)
+    ids = [0] * len(rows)
+    fresh: list[dict[str, object]] = []
+    pending: list[tuple[int, int]] = []
+    positions: dict[str, int] = {}
+    for index, row in enumerate(rows):
+        key = _key(row)
+        if key is not None and key in known:
+            ids[index] = known[key]
+            continue
+        position = positions.get(key) if key is not None else None
+        if position is None:
+            position = len(fresh)
+            fresh.append(row)
+            if key is not None:
+                positions[key] = position
+        pending.append((index, position))
+    if not fresh:
+        return ids
+
+    # One multi-row INSERT, the caller decides when to commit
+    inserted = session.scalars(
+        insert(BeerDonation).returning(BeerDonation.id, sort_by_parameter_order=True),
+        fresh,
+    ).all()
+    if update_aggregates:
+        apply_donations(session, fresh, inserted)  # pyright: ignore[reportArgumentType]
+    for index, position in pending:
+        ids[index] = inserted[position]
+    return ids
+
+
+def insert_donates(
+    rows: list[dict[str, object]], session: sa_orm.scoped_session[Session]
+) -> list[int]:
+    try:
+        ids = add_donates(rows, session)
+        with registry.timer("beerstat_db_commit_duration_seconds"):
+            session.commit()
+    except IntegrityError:
+        # Another process stored one of the keys after we looked, the second
+        # attempt finds it and skips that row
+        session.rollback()
+        ids = add_donates(rows, session)
+        with registry.timer("beerstat_db_commit_duration_seconds"):
+            session.commit()
+    recent_keys.add(
+        {key: donation_id for key, donation_id in zip(map(_key, rows), ids) if key}
     )
-    session.add(donation)
-    session.commit()
+    return ids
+
+
+def insert_donate(
+    data: dict[str, object], session: sa_orm.scoped_session[Session]
+) -> int:
+    return insert_donates([parse_donate(data)], session)[0]
 
 
 def get_sum(session: Session) -> float | None:
-    total_value = session.query(func.sum(BeerDonation.value)).scalar()  # pyright: ignore[reportUnknownArgumentType,reportUnknownArgumentType]
-    return float(total_value) if total_value is not None else None
+    balance = read_balance(session)
+    return balance[0] if balance is not None else None
@@ -0,0 +1,355 @@
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any
+from dotenv import load_dotenv
+
+from flask import Flask, g, request, abort, jsonify, Response
+from flask_admin import Admin
+from flask_migrate import Migrate
+from sqlalchemy import make_url
+from sqlalchemy.exc import OperationalError
+
+from app.admin import MyModelView
+from app.aggregates import BUCKETS, InexactWindow, read_leaderboard, read_rollups
+from app.cache import AggregateCache, sqlite_data_version
+from app.cli import donations_cli
+from app.export import iter_donations, to_csv, to_ndjson
+from app.extensions import db
+from app.idempotency import recent_keys
+from app.metrics import registry
+from app.models import BeerDonation
+from app.profiling import SQLProfiler
+from app.sqlite import DEFAULT_DATABASE_URI, configure_sqlite, is_locked
+from app.storage import READ_ENGINE, begin_reads, create_read_engine, end_reads
+from app.utils import (
+    InvalidDonation,
+    insert_donates,
+    parse_date,
+    parse_donate,
+    get_sum,
+)
+from app.writer import GroupCommitWriter
+
+LEADERBOARD_MAX_LIMIT = 100
+# Served from the read-only pool when the app has one
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+EXPORT_FORMATS = {
+    "csv": (to_csv, "text/csv"),
+    "ndjson": (to_ndjson, "application/x-ndjson"),
+}
+
+logger = logging.getLogger(__name__)
+
+admin_ext = Admin(template_mode="bootstrap3")
+admin_ext.add_view(MyModelView(BeerDonation, db.session))
+migrate_ext = Migrate()
+_ = load_dotenv()
+
+
+def create_app(testing: bool = False) -> Flask:
+    new_app: Flask = Flask(__name__)
+    if testing:
+        new_app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    else:
+        new_app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv(
+            "SQLALCHEMY_DATABASE_URI", DEFAULT_DATABASE_URI
+        )
+    new_app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "TypeMeIn")
+    new_app.config["SQLITE_JOURNAL_MODE"] = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    new_app.config["SQLITE_SYNCHRONOUS"] = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    new_app.config["SQLITE_BUSY_TIMEOUT"] = int(
+        os.getenv("SQLITE_BUSY_TIMEOUT", "5000")
+    )
+    # Writers queue for one of these connections instead of for the lock
+    new_app.config["SQLITE_WRITE_POOL_SIZE"] = int(
+        os.getenv("SQLITE_WRITE_POOL_SIZE", "2")
+    )
+    new_app.config["SQLITE_READ_POOL_SIZE"] = int(
+        os.getenv("SQLITE_READ_POOL_SIZE", "8")
+    )
+    if make_url(new_app.config["SQLALCHEMY_DATABASE_URI"]).database not in (
+        None,
+        "",
+        ":memory:",
+    ):
+        new_app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+            "pool_size": new_app.config["SQLITE_WRITE_POOL_SIZE"],
+            "max_overflow": 0,
+        }
+    # "direct" commits in the request, "group" hands rows to GroupCommitWriter
+    new_app.config["INGEST_MODE"] = os.getenv("INGEST_MODE", "direct")
+    new_app.config["AGGREGATE_CACHE_TTL"] = float(
+        os.getenv("AGGREGATE_CACHE_TTL", "60")
+    )
+    new_app.config["AGGREGATE_CACHE_SIZE"] = int(
+        os.getenv("AGGREGATE_CACHE_SIZE", "256")
+    )
+    new_app.config["IDEMPOTENCY_CACHE_SIZE"] = int(
+        os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000")
+    )
+    # Share of requests whose SQL is timed, 0 leaves the engine untouched
+    new_app.config["SQL_PROFILE_SAMPLE"] = float(os.getenv("SQL_PROFILE_SAMPLE", "0"))
+    new_app.config["SQL_SLOW_QUERY_MS"] = float(os.getenv("SQL_SLOW_QUERY_MS", "100"))
+    # Shared by all gunicorn workers and the consumer, unset keeps metrics
+    # per process
+    new_app.config["METRICS_DIR"] = os.getenv("METRICS_DIR")
+    db.init_app(new_app)
+    migrate_ext.init_app(new_app, db)
+    admin_ext.init_app(new_app)
+    new_app.cli.add_command(donations_cli)
+    registry.configure(new_app.config["METRICS_DIR"])
+    recent_keys.maxsize = new_app.config["IDEMPOTENCY_CACHE_SIZE"]
+
+    with new_app.app_context():
+        configure_sqlite(
+            db.engine,
+            journal_mode=new_app.config["SQLITE_JOURNAL_MODE"],
+            busy_timeout=new_app.config["SQLITE_BUSY_TIMEOUT"],
+            synchronous=new_app.config["SQLITE_SYNCHRONOUS"],
+        )
+        database = db.engine.url.database
+        read_engine = create_read_engine(
+            db.engine, new_app.config["SQLITE_READ_POOL_SIZE"]
+        )
+        if read_engine is not None:
+            configure_sqlite(
+                read_engine,
+                journal_mode=new_app.config["SQLITE_JOURNAL_MODE"],
+                busy_timeout=new_app.config["SQLITE_BUSY_TIMEOUT"],
+                synchronous=new_app.config["SQLITE_SYNCHRONOUS"],
+                read_only=True,
+            )
+            new_app.extensions[READ_ENGINE] = read_engine
+        profiler = None
+        if new_app.config["SQL_PROFILE_SAMPLE"] > 0:
+            profiler = SQLProfiler(
+                sample_rate=new_app.config["SQL_PROFILE_SAMPLE"],
+                slow_query_ms=new_app.config["SQL_SLOW_QUERY_MS"],
+            )
+            profiler.install(db.engine)
+            if read_engine is not None:
+                profiler.install(read_engine)
+    cache = AggregateCache(
+        ttl=new_app.config["AGGREGATE_CACHE_TTL"],
+        maxsize=new_app.config["AGGREGATE_CACHE_SIZE"],
+        data_version=sqlite_data_version(database),
+    )
+    new_app.extensions["aggregate_cache"] = cache
+
+    writer = None
+    if new_app.config["INGEST_MODE"] == "group":
+        writer = GroupCommitWriter(new_app)
+        new_app.extensions["group_commit_writer"] = writer
+
+    def ingest(rows: list[dict[str, object]]) -> list[int]:
+        if writer is not None:
+            ids = writer.submit(rows)
+        else:
+            ids = insert_donates(rows, db.session)  # pyright: ignore[reportArgumentType]
+        cache.invalidate()
+        return ids
+
+    @new_app.before_request
+    def start_timer() -> None:
+        g.request_started = time.perf_counter()
+        if read_engine is not None and request.method in READ_METHODS:
+            g.reads = begin_reads()
+        if profiler is not None and profiler.sample():
+            g.sql_profile = profiler.start()
+
+    @new_app.after_request
+    def record_request(response: Response) -> Response:
+        route = _route()
+        if "request_started" in g:
+            registry.observe(
+                "beerstat_http_request_duration_seconds",
+                time.perf_counter() - g.request_started,
+                route=route,
+                method=request.method,
+            )
+        registry.inc(
+            "beerstat_http_requests_total",
+            route=route,
+            method=request.method,
+            status=str(response.status_code),
+        )
+        if profiler is not None and "sql_profile" in g:
+            stats = profiler.stop(g.pop("sql_profile"), route)
+            if stats is not None:
+                response.headers.add("Server-Timing", stats.server_timing())
+        return response
+
+    @new_app.teardown_request
+    def end_request(_error: BaseException | None) -> None:
+        # after_request is skipped when a view raised
+        if profiler is not None and "sql_profile" in g:
+            _ = profiler.stop(g.pop("sql_profile"), _route())
+        if "reads" in g:
+            end_reads(g.pop("reads"))
+
+    @new_app.route("/donate", methods=["POST"])
+    def payment_page() -> Response:
+        data: dict[str, Any] = request.json or {}
+        if not data:
+            return abort(400)
+        try:
+            _ = ingest([parse_donate(data)])
+        except InvalidDonation:
+            registry.inc("beerstat_errors_total", route=_route(), kind="invalid")
+            return abort(400)
+        except Exception as e:
+            return _write_failed(e)
+        return jsonify({"message": "Success"})
+
+    @new_app.route("/donate/batch", methods=["POST"])
+    def batch_payment_page() -> Response:
+        items = _read_batch()
+        if items is None:
+            return abort(400)
+
+        results: list[dict[str, Any]] = []
+        rows: list[dict[str, object]] = []
+        for index, item in enumerate(items):
+            try:
+                rows.append(parse_donate(item))
+                results.append({"index": index, "status": "ok"})
+            except InvalidDonation as e:
+                results.append({"index": index, "status": "error", "error": str(e)})
+
+        try:
+            ids = ingest(rows)
+        except Exception as e:
+            return _write_failed(e)
+
+        accepted = (result for result in results if result["status"] == "ok")
+        for result, donation_id in zip(accepted, ids):
+            result["id"] = donation_id
+        return jsonify({"message": "Success", "results": results})
+
+    @new_app.route("/balance")
+    def get_balance() -> Response:
+        # Cast db.session to Session type to satisfy type checker
+        total = cache.get(
+            "balance",
+            lambda: get_sum(db.session),  # pyright: ignore[reportArgumentType]
+        )
+
+        return jsonify({"Total": total})
+
+    @new_app.route("/stats")
+    def get_stats() -> Response:
+        bucket = request.args.get("bucket", "day")
+        if bucket not in BUCKETS:
+            return abort(400)
+        try:
+            date_from = _parse_date_arg("from")
+            date_to = _parse_date_arg("to")
+        except ValueError:
+            return abort(400)
+
+        def load() -> list[dict[str, Any]]:
+            rows = read_rollups(db.session, bucket, date_from, date_to)  # pyright: ignore[reportArgumentType]
+            return [
+                {"start": start.isoformat(), "total": total, "count": count}
+                for start, total, count in rows
+            ]
+
+        items = cache.get(f"stats:{bucket}:{date_from}:{date_to}", load)
+        return jsonify({"bucket": bucket, "items": items})
+
+    @new_app.route("/leaderboard")
+    def get_leaderboard() -> Response:
+        try:
+            limit = int(request.args.get("limit", "10"))
+            since = _parse_date_arg("since")
+        except ValueError:
+            return abort(400)
+        if not 0 < limit <= LEADERBOARD_MAX_LIMIT:
+            return abort(400)
+
+        def load() -> list[dict[str, Any]]:
+            rows = read_leaderboard(db.session, limit, since)  # pyright: ignore[reportArgumentType]
+            return [
+                {"name": name, "total": total, "count": count}
+                for name, total, count in rows
+            ]
+
+        try:
+            items = cache.get(f"leaderboard:{limit}:{since}", load)
+        except InexactWindow:
+            return abort(400)
+        return jsonify({"items": items})
+
+    @new_app.route("/export.<fmt>")
+    def export_donations(fmt: str) -> Response:
+        if fmt not in EXPORT_FORMATS:
+            return abort(404)
+        try:
+            since_id = int(request.args.get("since_id", "0"))
+            date_from = _parse_date_arg("from")
+            date_to = _parse_date_arg("to")
+        except ValueError:
+            return abort(400)
+
+        engine = read_engine if read_engine is not None else db.engine
+        rows = iter_donations(engine, since_id, date_from, date_to)
+        encode, mimetype = EXPORT_FORMATS[fmt]
+        return Response(
+            encode(rows),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename=donations.{fmt}"},
+        )
+
+    @new_app.route("/cache/stats")
+    def cache_stats() -> Response:
+        return jsonify(cache.stats())
+
+    @new_app.route("/metrics")
+    def metrics() -> Response:
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+    return new_app
+
+
+def _route() -> str:
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def _write_failed(error: Exception) -> Response:
+    if isinstance(error, OperationalError) and is_locked(error):
+        registry.inc("beerstat_errors_total", route=_route(), kind="busy")
+        return _database_busy()
+    kind = "database" if isinstance(error, OperationalError) else "unexpected"
+    registry.inc("beerstat_errors_total", route=_route(), kind=kind)
+    logger.exception("cant store donations")
+    return abort(500)
+
+
+def _database_busy() -> Response:
+    # The busy timeout ran out while another writer held the lock, safe to retry
+    response = jsonify({"message": "Database is busy"})
+    response.status_code = 503
+    response.headers["Retry-After"] = "1"
+    return response
+
+
+def _parse_date_arg(name: str) -> datetime | None:
+    value = request.args.get(name)
+    return parse_date(value) if value else None
+
+
+def _read_batch() -> list[Any] | None:
+    if request.mimetype == "application/x-ndjson":
+        try:
+            return [
+                json.loads(line)
+                for line in request.get_data(as_text=True).splitlines()
+                if line.strip()
+            ]
+        except ValueError:
+            return None
+    data = request.get_json(silent=True)
+    return data if isinstance(data, list) else None
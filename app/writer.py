@@ -0,0 +1,101 @@
+import queue
+import threading
+from concurrent.futures import Future
+from typing import NamedTuple
+
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+
+from app.extensions import db
+from app.sqlite import is_locked
+from app.utils import insert_donates
+
+
+class _Pending(NamedTuple):
+    rows: list[dict[str, object]]
+    done: Future[list[int]]
+
+
+class GroupCommitWriter:
+    # Single writer thread per process: every request hands its rows over and
+    # waits, everything queued meanwhile is committed in one transaction.
+    # Only requests of the same process are grouped, so run it with threaded
+    # workers (gunicorn --threads N).
+    def __init__(self, app: Flask, max_batch: int = 1000) -> None:
+        self.app = app
+        self.max_batch = max_batch
+        self.commits = 0
+        self._queue: queue.SimpleQueue[_Pending | None] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def submit(
+        self, rows: list[dict[str, object]], timeout: float | None = None
+    ) -> list[int]:
+        if not rows:
+            return []
+        pending = _Pending(rows, Future())
+        self._ensure_started()
+        self._queue.put(pending)
+        return pending.done.result(timeout)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _ensure_started(self) -> None:
+        # Started lazily so the thread is created inside the serving process
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="group-commit-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            group = [first]
+            size = len(first.rows)
+            while size < self.max_batch:
+                try:
+                    pending = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if pending is None:
+                    self._commit(group)
+                    return
+                group.append(pending)
+                size += len(pending.rows)
+            self._commit(group)
+
+    def _commit(self, group: list[_Pending]) -> None:
+        rows = [row for pending in group for row in pending.rows]
+        with self.app.app_context():
+            try:
+                ids = insert_donates(rows, db.session)  # pyright: ignore[reportArgumentType]
+            except Exception as e:
+                db.session.rollback()
+                if len(group) > 1 and not (
+                    isinstance(e, OperationalError) and is_locked(e)
+                ):
+                    # One bad request must not fail the others, each is
+                    # committed on its own. A lock timeout would only repeat.
+                    for pending in group:
+                        self._commit([pending])
+                    return
+                for pending in group:
+                    pending.done.set_exception(e)
+                return
+
+        self.commits += 1
+        offset = 0
+        for pending in group:
+            pending.done.set_result(ids[offset : offset + len(pending.rows)])
+            offset += len(pending.rows)
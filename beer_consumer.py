@@ -1,68 +1,228 @@
 import asyncio
+import contextlib
 import datetime
 import logging
-
-import aiohttp
-from aiohttp.client_exceptions import ClientConnectorError
+import signal
+import sys
+import time
 
 from requeue.requeue import Queue
 from requeue.rredis import RedisConnection
 from requeue.models import QueueMessage, QueueEvent
 
 from app import settings
+from app.metrics import registry
+from consumer.payload import donation_payload, from_queue_event_to_bs, idempotency_key
+from consumer.retry import Backoff, CircuitBreaker, RetryingSink
+from consumer.sinks import BatchingSink, Delivery, HttpSink, Sink
+from consumer.spool import Spool
+from consumer.supervisor import Supervisor
 
 logger = logging.getLogger(__name__)
 
 
 class BeerConsumer:
-    def __init__(self, donate_url: str) -> None:
+    def __init__(
+        self,
+        donate_url: str | None = None,
+        max_in_flight: int = 1,
+        batch_size: int = 1,
+        batch_interval_ms: int = 50,
+        batch_url: str | None = None,
+        sink: Sink | None = None,
+    ) -> None:
+        if sink is None:
+            if donate_url is None:
+                raise ValueError("either donate_url or sink is required")
+            sink = HttpSink(
+                donate_url, batch_url=batch_url, max_connections=max_in_flight
+            )
+        if batch_size > 1:
+            sink = BatchingSink(sink, batch_size, batch_interval_ms)
         self.donate_url = donate_url
+        self.max_in_flight = max_in_flight
+        self.sink = sink
+        self.stopping = False
+        self.active = 0
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def __aenter__(self) -> "BeerConsumer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        await self.sink.start()
+
+    async def close(self) -> None:
+        await self.sink.close()
+
+    async def drain(self, timeout: float | None = None) -> bool:
+        # Stops taking messages and waits for the ones being delivered
+        self.stopping = True
+        try:
+            _ = await asyncio.wait_for(self._idle.wait(), timeout)
+        except TimeoutError:
+            logger.warning("%s messages still in flight", self.active)
+            return False
+        return True
 
     async def on_message(self, message: QueueMessage) -> QueueMessage:
+        if self.stopping:
+            # Fetched while shutting down: held until the deliveries in flight
+            # are done so the fetch loop does not spin, then left unfinished
+            # for redelivery
+            registry.inc("beerstat_consumer_messages_total", result="deferred")
+            _ = await self._idle.wait()
+            return message
+
+        started = time.perf_counter()
+        self.active += 1
+        self._idle.clear()
+        try:
+            async with self._in_flight:
+                registry.add("beerstat_consumer_in_flight", 1)
+                try:
+                    return await self._process(message)
+                finally:
+                    registry.add("beerstat_consumer_in_flight", -1)
+                    registry.observe(
+                        "beerstat_consumer_message_duration_seconds",
+                        time.perf_counter() - started,
+                    )
+        finally:
+            self.active -= 1
+            if not self.active:
+                self._idle.set()
+
+    async def _process(self, message: QueueMessage) -> QueueMessage:
         logger.debug("%s process %s", __name__, message.data)
         if message.data.event_type != "DONATION" or not message.data.amount:
             message.finish()
+            registry.inc("beerstat_consumer_messages_total", result="skipped")
             return message
 
+        key = idempotency_key(message)
         if message.data.currency != "RUB":
             message.data.recal_amount(currencies=settings.currencies)
 
-        stat_data = self._from_queue_event_to_bs(message.data)
-
-        payload = {
-            "date": datetime.datetime.now().isoformat(),
-            "value": stat_data.get("value", 0),
-            "name": stat_data.get("name", ""),
-        }
-        headers = {
-            "Content-Type": "application/json",
-        }
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(
-                    self.donate_url, json=payload, headers=headers
-                ) as response:
-                    await response.json()
-                    message.finish()
-                    return message
-            except ClientConnectorError:
-                logger.warning("cant connect to bs service")
+        payload = donation_payload(message.data, datetime.datetime.now(), key)
+        [delivery] = await self.sink.send([payload])
+        if delivery.accepted:
+            message.finish()
+        elif delivery is Delivery.REJECTED:
+            # Sending it again will not help, redelivery would only loop
+            logger.warning("donation refused, dropping the message: %s", payload)
+            message.finish()
+        registry.inc("beerstat_consumer_messages_total", result=delivery.value)
         return message
 
     def _from_queue_event_to_bs(self, event: QueueEvent) -> dict[str, int | str | None]:
-        message: dict[str, int | str | None] = {
-            "value": int(event.amount) if event.amount else 0,
-            "name": event.user_name,
-        }
-        return message
+        return from_queue_event_to_bs(event)
+
+
+def build_sink(worker: int | None = None) -> Sink:
+    spool = None
+    if settings.BEER_SPOOL_PATH:
+        # Every worker process appends to a spool file of its own
+        path = settings.BEER_SPOOL_PATH
+        if worker is not None:
+            path = f"{path}.{worker}"
+        spool = Spool(path, max_depth=settings.BEER_SPOOL_MAX)
+    return RetryingSink(
+        _build_target(),
+        backoff=Backoff(
+            base=settings.BEER_RETRY_BASE_MS / 1000,
+            cap=settings.BEER_RETRY_MAX_MS / 1000,
+        ),
+        breaker=CircuitBreaker(
+            threshold=settings.BEER_BREAKER_THRESHOLD,
+            reset_timeout=settings.BEER_BREAKER_RESET_MS / 1000,
+        ),
+        attempts=settings.BEER_RETRY_ATTEMPTS,
+        spool=spool,
+        drain_batch=settings.BEER_SPOOL_BATCH,
+    )
+
+
+def _build_target() -> Sink:
+    if settings.BEER_SINK == "http":
+        return HttpSink(
+            settings.BEER_URL,
+            batch_url=settings.BEER_BATCH_URL,
+            max_connections=settings.BEER_CONCURRENCY,
+        )
+    if settings.BEER_SINK == "db":
+        # Imported here so the HTTP consumer never loads SQLAlchemy
+        from consumer.db_sink import DbSink
+
+        return DbSink(
+            settings.BEER_DATABASE_URI,
+            journal_mode=settings.SQLITE_JOURNAL_MODE,
+            synchronous=settings.SQLITE_SYNCHRONOUS,
+            busy_timeout=settings.SQLITE_BUSY_TIMEOUT,
+        )
+    raise ValueError(f"unknown BEER_SINK {settings.BEER_SINK!r}")
 
 
-async def main() -> None:
-    beer_consumer: BeerConsumer = BeerConsumer(donate_url=settings.BEER_URL)
-    async with RedisConnection(settings.redis_url) as redis_connection:
+async def main(worker: int | None = None) -> None:
+    registry.configure(settings.METRICS_DIR)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    try:
+        await _consume(stop, worker)
+    finally:
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            _ = loop.remove_signal_handler(signum)
+
+
+async def _consume(stop: asyncio.Event, worker: int | None) -> None:
+    beer_consumer: BeerConsumer = BeerConsumer(
+        max_in_flight=settings.BEER_CONCURRENCY,
+        batch_size=settings.BEER_BATCH_SIZE,
+        batch_interval_ms=settings.BEER_BATCH_INTERVAL_MS,
+        sink=build_sink(worker),
+    )
+    async with beer_consumer, RedisConnection(settings.redis_url) as redis_connection:
         queue: Queue = Queue(name=settings.BEER_STAT, connection=redis_connection)
-        await queue.consumer(on_message=beer_consumer.on_message)
+        # One fetch loop per in-flight slot so several donations are posted at once
+        fetching = asyncio.gather(
+            *(
+                queue.consumer(on_message=beer_consumer.on_message)
+                for _ in range(settings.BEER_CONCURRENCY)
+            )
+        )
+        stopped = asyncio.create_task(stop.wait())
+        _ = await asyncio.wait([fetching, stopped], return_when=asyncio.FIRST_COMPLETED)
+        if stop.is_set():
+            logger.info("stopping, %s messages in flight", beer_consumer.active)
+
+        # Let in-flight messages finish before the fetch loops go away, then
+        # leaving the context flushes the sinks and closes the connections
+        _ = await beer_consumer.drain(settings.BEER_SHUTDOWN_TIMEOUT_MS / 1000)
+        _ = fetching.cancel()
+        _ = stopped.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            _ = await fetching
+
+
+def run_worker(index: int) -> None:
+    asyncio.run(main(worker=index))
 
 
 if __name__ == "__main__":
+    if settings.BEER_WORKERS > 1:
+        supervisor = Supervisor(
+            run_worker,
+            settings.BEER_WORKERS,
+            # Workers get their own timeout first, plus time to close up
+            shutdown_timeout=settings.BEER_SHUTDOWN_TIMEOUT_MS / 1000 + 5,
+        )
+        sys.exit(supervisor.run())
     asyncio.run(main())
@@ -0,0 +1,65 @@
+"""Import cost of the two entry points, each measured in a fresh interpreter.
+
+uv run python benchmarks/import_time.py [--repeat 10]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parents[1]
+
+ENTRY_POINTS = {
+    # What `python beer_consumer.py` imports before it connects to Redis
+    "consumer": "import beer_consumer",
+    # What gunicorn does for `app:app`
+    "web": "import app; app.app",
+}
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "modules": len(sys.modules),
+    "flask": "flask" in sys.modules,
+    "sqlalchemy": "sqlalchemy" in sys.modules,
+}}))
+"""
+
+
+def measure(statement: str) -> dict[str, Any]:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(statement=statement)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    _ = parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    for name, statement in ENTRY_POINTS.items():
+        runs = [measure(statement) for _ in range(args.repeat)]
+        seconds = [run["seconds"] for run in runs]
+        last = runs[-1]
+        print(
+            f"{name:10} median {statistics.median(seconds) * 1000:7.1f} ms  "
+            f"min {min(seconds) * 1000:7.1f} ms  modules {last['modules']}  "
+            f"flask {last['flask']}  sqlalchemy {last['sqlalchemy']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""Load test of the consumer -> /donate -> SQLite pipeline on one machine.
+
+    uv run python -m benchmarks.load [--rate 200] [--duration 30] [--server sync]
+    uv run python -m benchmarks.load --save events.ndjson
+    uv run python -m benchmarks.load --replay events.ndjson --speed 10
+
+Queue events are generated at a target rate (or replayed from a recording,
+optionally faster than recorded) into an in-process stand-in for the Redis
+queue and consumed by the real BeerConsumer, which posts to a web app started
+locally on a fresh SQLite file. The report covers end-to-end latency from
+enqueue to finish, throughput, error rates and how long a writer had to wait
+for the SQLite write lock.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+
+from requeue.models import QueueEvent, QueueMessage, QueueMessageStatus
+
+from app.aio import create_aio_app
+from app.extensions import db
+from app.metrics import registry
+from beer_consumer import BeerConsumer
+from benchmarks.run import (
+    Results,
+    make_app,
+    record,
+    serve_aio,
+    serve_gunicorn,
+    serve_sync,
+)
+from consumer.retry import RetryingSink
+from consumer.sinks import HttpSink
+
+logger = logging.getLogger(__name__)
+
+# Share of each event type and currency in generated streams
+EVENT_TYPES = {"DONATION": 0.9, "FOLLOW": 0.07, "SUBSCRIBE": 0.03}
+CURRENCIES = {"RUB": 0.7, "USD": 0.15, "EUR": 0.1, "POINTS": 0.05}
+SERVERS = ("sync", "aio", "gunicorn", "gunicorn-aio")
+
+# (seconds since the start of the stream, QueueEvent fields)
+Schedule = list[tuple[float, dict[str, Any]]]
+
+
+def generate(rate: float, duration: float, seed: int) -> Schedule:
+    # Poisson arrivals, so events bunch up the way they do on stream
+    rng = random.Random(seed)
+    schedule: Schedule = []
+    at = rng.expovariate(rate)
+    while at < duration:
+        schedule.append(
+            (
+                round(at, 6),
+                {
+                    "event_type": _pick(rng, EVENT_TYPES),
+                    "user_name": f"Viewer {rng.randrange(1000)}",
+                    "amount": round(rng.lognormvariate(4.5, 1.2), 2),
+                    "currency": _pick(rng, CURRENCIES),
+                    "message": "",
+                },
+            )
+        )
+        at += rng.expovariate(rate)
+    return schedule
+
+
+def _pick(rng: random.Random, weights: dict[str, float]) -> str:
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def save(schedule: Schedule, path: Path) -> None:
+    with path.open("w") as recording:
+        for at, event in schedule:
+            _ = recording.write(json.dumps({"at": at, "event": event}) + "\n")
+
+
+def load(path: Path) -> Schedule:
+    schedule: Schedule = []
+    with path.open() as recording:
+        for line in recording:
+            if line.strip():
+                item = json.loads(line)
+                schedule.append((float(item["at"]), item["event"]))
+    return sorted(schedule, key=lambda item: item[0])
+
+
+class LocalQueue:
+    # In-process stand-in for the Redis queue with the consumer() shape of
+    # requeue's Queue. A message that comes back unfinished goes to the tail
+    # again, like a redelivery, up to max_retries times.
+    def __init__(self, max_retries: int = 5) -> None:
+        self.max_retries = max_retries
+        self.latencies: list[float] = []
+        self.redelivered = 0
+        self.dropped = 0
+        self._queue: asyncio.Queue[tuple[float, QueueMessage]] = asyncio.Queue()
+
+    def push(self, event: QueueEvent, enqueued_at: float) -> None:
+        self._queue.put_nowait((enqueued_at, QueueMessage(event="load", data=event)))
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def join(self) -> None:
+        await self._queue.join()
+
+    async def consumer(
+        self, on_message: Callable[[QueueMessage], Awaitable[QueueMessage]]
+    ) -> None:
+        while True:
+            enqueued_at, message = await self._queue.get()
+            try:
+                _ = await on_message(message)
+            except Exception:
+                logger.exception("on_message failed")
+            if message.status == QueueMessageStatus.FINISHED:
+                self.latencies.append(time.perf_counter() - enqueued_at)
+            elif message.retry < self.max_retries:
+                message.retry += 1
+                self.redelivered += 1
+                self._queue.put_nowait((enqueued_at, message))
+            else:
+                self.dropped += 1
+            self._queue.task_done()
+
+
+class LockProbe:
+    # Takes the SQLite write lock (BEGIN IMMEDIATE) every `interval` seconds
+    # from a connection of its own and records how long that took, which is
+    # how long any writer waits behind the others at that moment
+    def __init__(self, database: Path, interval: float = 0.05) -> None:
+        self.database = database
+        self.interval = interval
+        self.waits: list[float] = []
+        self.timeouts = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lock-probe")
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        connection = sqlite3.connect(self.database, timeout=30, isolation_level=None)
+        try:
+            while not self._stop.wait(self.interval):
+                start = time.perf_counter()
+                try:
+                    _ = connection.execute("BEGIN IMMEDIATE")
+                except sqlite3.OperationalError:
+                    self.timeouts += 1
+                    continue
+                self.waits.append(time.perf_counter() - start)
+                _ = connection.execute("ROLLBACK")
+        finally:
+            connection.close()
+
+
+def start_server(
+    kind: str, database: Path, workers: int
+) -> tuple[str, Callable[[], None]]:
+    app = make_app(database)
+    if kind == "sync":
+        return serve_sync(app)
+    with app.app_context():
+        db.engine.dispose()
+    if kind == "aio":
+        return serve_aio(create_aio_app(database_uri=f"sqlite:///{database}"))
+    if kind in ("gunicorn", "gunicorn-aio"):
+        # The metrics directory comes from main through the environment
+        return serve_gunicorn(database, workers, aio=kind == "gunicorn-aio")
+    raise ValueError(f"unknown server {kind!r}")
+
+
+async def _produce(queue: LocalQueue, schedule: Schedule, speed: float) -> None:
+    start = time.perf_counter()
+    for at, event in schedule:
+        due = start + at / speed
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # Latency counts from when the event was due, a producer that falls
+        # behind shows up in the numbers too
+        queue.push(QueueEvent(**event), due)
+
+
+async def run_load(
+    url: str,
+    schedule: Schedule,
+    speed: float,
+    concurrency: int,
+    batch_size: int,
+    batch_interval_ms: int,
+    drain_timeout: float,
+) -> tuple[LocalQueue, float]:
+    queue = LocalQueue()
+    # The sink stack build_sink() sets up for BEER_SINK=http
+    sink = RetryingSink(
+        HttpSink(
+            f"{url}/donate",
+            batch_url=f"{url}/donate/batch",
+            max_connections=concurrency,
+        )
+    )
+    consumer = BeerConsumer(
+        max_in_flight=concurrency,
+        batch_size=batch_size,
+        batch_interval_ms=batch_interval_ms,
+        sink=sink,
+    )
+    async with consumer:
+        loops = [
+            asyncio.create_task(queue.consumer(consumer.on_message))
+            for _ in range(concurrency)
+        ]
+        start = time.perf_counter()
+        await _produce(queue, schedule, speed)
+        try:
+            await asyncio.wait_for(queue.join(), drain_timeout)
+        except TimeoutError:
+            logger.warning("%s messages still queued", queue.pending())
+        elapsed = time.perf_counter() - start
+        for task in loops:
+            _ = task.cancel()
+        _ = await asyncio.gather(*loops, return_exceptions=True)
+    return queue, elapsed
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def report(
+    results: Results,
+    schedule: Schedule,
+    queue: LocalQueue,
+    elapsed: float,
+    probe: LockProbe,
+) -> None:
+    events = len(schedule)
+    finished = len(queue.latencies)
+    record(results, "load.events", events, "count")
+    record(results, "load.throughput", finished / elapsed, "ops/s")
+    for q in (0.5, 0.95, 0.99):
+        record(
+            results,
+            f"load.latency.p{int(q * 100)}_ms",
+            _percentile(queue.latencies, q) * 1000,
+            "ms",
+        )
+    record(results, "load.latency.max_ms", max(queue.latencies, default=0) * 1000, "ms")
+
+    lost = events - finished
+    record(results, "load.redelivered", queue.redelivered, "count")
+    record(results, "load.unfinished", lost, "count")
+    record(results, "load.error_rate", 100 * lost / events if events else 0, "%")
+
+    requests = registry.value("beerstat_http_requests_total", route="/donate")
+    requests += registry.value("beerstat_http_requests_total", route="/donate/batch")
+    ok = registry.value("beerstat_http_requests_total", route="/donate", status="200")
+    ok += registry.value(
+        "beerstat_http_requests_total", route="/donate/batch", status="200"
+    )
+    record(results, "http.requests", requests, "count")
+    record(
+        results,
+        "http.error_rate",
+        100 * (requests - ok) / requests if requests else 0,
+        "%",
+    )
+    record(
+        results,
+        "consumer.retries",
+        registry.value("beerstat_consumer_retries_total"),
+        "count",
+    )
+    record(
+        results,
+        "consumer.failures",
+        registry.value("beerstat_consumer_failures_total"),
+        "count",
+    )
+
+    record(
+        results,
+        "sqlite.busy_errors",
+        registry.value("beerstat_errors_total", kind="busy"),
+        "count",
+    )
+    record(
+        results, "sqlite.lock_wait.p50_ms", _percentile(probe.waits, 0.5) * 1000, "ms"
+    )
+    record(
+        results, "sqlite.lock_wait.p95_ms", _percentile(probe.waits, 0.95) * 1000, "ms"
+    )
+    record(results, "sqlite.lock_wait.max_ms", max(probe.waits, default=0) * 1000, "ms")
+    record(results, "sqlite.lock_timeouts", probe.timeouts, "count")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    _ = parser.add_argument("--rate", type=float, default=100, help="Events/s.")
+    _ = parser.add_argument("--duration", type=float, default=10, help="Seconds.")
+    _ = parser.add_argument("--seed", type=int, default=1)
+    _ = parser.add_argument("--replay", type=Path, help="Recorded NDJSON stream.")
+    _ = parser.add_argument("--speed", type=float, default=1.0, help="Replay speed.")
+    _ = parser.add_argument("--save", type=Path, help="Record the stream here.")
+    _ = parser.add_argument("--server", choices=SERVERS, default="sync")
+    _ = parser.add_argument("--workers", type=int, default=3, help="gunicorn only.")
+    _ = parser.add_argument("--concurrency", type=int, default=4)
+    _ = parser.add_argument("--batch-size", type=int, default=1)
+    _ = parser.add_argument("--batch-interval-ms", type=int, default=50)
+    _ = parser.add_argument("--drain-timeout", type=float, default=60)
+    _ = parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.replay is not None:
+        schedule = load(args.replay)
+    else:
+        schedule = generate(args.rate, args.duration, args.seed)
+    if args.save is not None:
+        save(schedule, args.save)
+        print(f"{len(schedule)} events written to {args.save}")
+        return
+
+    results: Results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        database = Path(workdir) / "load.db"
+        # Every process of the run, gunicorn workers included, reports here
+        os.environ["METRICS_DIR"] = str(Path(workdir) / "metrics")
+        registry.configure(os.environ["METRICS_DIR"])
+        url, stop = start_server(args.server, database, args.workers)
+        probe = LockProbe(database)
+        probe.start()
+        try:
+            queue, elapsed = asyncio.run(
+                run_load(
+                    url,
+                    schedule,
+                    args.speed,
+                    args.concurrency,
+                    args.batch_size,
+                    args.batch_interval_ms,
+                    args.drain_timeout,
+                )
+            )
+        finally:
+            probe.stop()
+            stop()
+        registry.flush()
+        report(results, schedule, queue, elapsed, probe)
+        registry.configure(None)
+
+    if args.output is not None:
+        _ = args.output.write_text(json.dumps({"results": results}, indent=2) + "\n")
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,451 @@
+"""Benchmarks for the ingest and aggregate hot paths on file-backed SQLite.
+
+    uv run python -m benchmarks.run [--quick] [--output FILE] [--baseline FILE]
+
+Results are written as JSON. With a baseline every metric is compared against
+it and the run fails when one got worse by more than --tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import aiohttp
+from aiohttp import web
+from flask import Flask
+from requeue.models import QueueEvent, QueueMessage, QueueMessageStatus
+from sqlalchemy import text
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app import create_app
+from app.aio import create_aio_app
+from app.aggregates import rebuild_aggregates
+from app.extensions import db
+from app.utils import get_sum, insert_donate
+from beer_consumer import BeerConsumer
+from benchmarks.import_time import ENTRY_POINTS, measure
+
+ROOT = Path(__file__).resolve().parents[1]
+DATA_DIR = ROOT / "benchmarks" / "data"
+SIZES = (10_000, 1_000_000, 10_000_000)
+QUICK_SIZES = (10_000,)
+# Flags of services/bs.gunlinux.ru.service
+GUNICORN_WORKERS = 3
+GUNICORN_THREADS = 8
+
+# name -> {"value": ..., "unit": ..., "better": "higher" | "lower"}
+Results = dict[str, dict[str, Any]]
+
+
+def record(results: Results, name: str, value: float, unit: str) -> None:
+    better = "higher" if unit.endswith("/s") else "lower"
+    results[name] = {"value": round(value, 3), "unit": unit, "better": better}
+    print(f"{name:40} {value:12.3f} {unit}")
+
+
+def _latencies(results: Results, name: str, samples: list[float]) -> None:
+    samples = sorted(samples)
+    record(results, f"{name}.ops_per_s", len(samples) / sum(samples), "ops/s")
+    record(results, f"{name}.p50_ms", statistics.median(samples) * 1000, "ms")
+    record(results, f"{name}.p95_ms", samples[int(len(samples) * 0.95)] * 1000, "ms")
+
+
+def _timed(call: Callable[[], object], count: int) -> list[float]:
+    samples: list[float] = []
+    for _ in range(count):
+        start = time.perf_counter()
+        _ = call()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def make_app(path: Path) -> Flask:
+    # create_app reads the URI from the environment, restored right after so
+    # it never outlives the temporary directory it points into
+    with patch.dict(os.environ, {"SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}"}):
+        app = create_app()
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def _donation(i: int = 0) -> dict[str, object]:
+    return {"date": datetime.now().isoformat(), "value": 1 + i % 500, "name": "Bench"}
+
+
+def seed(rows: int) -> Path:
+    # Seeded files are kept in benchmarks/data and reused by later runs
+    path = DATA_DIR / f"donations-{rows}.db"
+    if path.exists():
+        return path
+    DATA_DIR.mkdir(exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.unlink(missing_ok=True)
+    app = make_app(tmp)
+    print(f"seeding {rows} donations into {path}")
+    with app.app_context():
+        _ = db.session.execute(
+            text(
+                "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n "
+                "WHERE i < :rows) "
+                "INSERT INTO donations (name, date, value_minor) "
+                "SELECT 'Donor ' || (i % 1000), "
+                "strftime('%Y-%m-%d %H:%M:%S', '2020-01-01', '+' || i || ' minutes') "
+                "|| '.000000', "
+                "(i % 500 + 1) * 100 FROM n"
+            ),
+            {"rows": rows},
+        )
+        db.session.commit()
+        rebuild_aggregates(db.session)  # pyright: ignore[reportArgumentType]
+        db.session.remove()
+        db.engine.dispose()
+    _ = tmp.rename(path)
+    return path
+
+
+def bench_insert_donate(results: Results, workdir: Path, count: int) -> None:
+    app = make_app(workdir / "insert.db")
+    with app.app_context():
+        samples = [0.0] * count
+        for i in range(count):
+            start = time.perf_counter()
+            _ = insert_donate(_donation(i), db.session)  # pyright: ignore[reportArgumentType]
+            samples[i] = time.perf_counter() - start
+        db.session.remove()
+        db.engine.dispose()
+    _latencies(results, "insert_donate", samples)
+
+
+def bench_get_sum(results: Results, sizes: tuple[int, ...], count: int) -> None:
+    for rows in sizes:
+        app = make_app(seed(rows))
+        with app.app_context():
+            samples = _timed(lambda: get_sum(db.session), count)  # pyright: ignore[reportArgumentType]
+            db.session.remove()
+            db.engine.dispose()
+        _latencies(results, f"get_sum.{rows}", samples)
+
+
+def bench_http(results: Results, workdir: Path, count: int) -> None:
+    app = make_app(workdir / "http.db")
+    client = app.test_client()
+    donations = iter(range(count))
+    _latencies(
+        results,
+        "http.donate",
+        _timed(lambda: client.post("/donate", json=_donation(next(donations))), count),
+    )
+    _latencies(results, "http.balance", _timed(lambda: client.get("/balance"), count))
+    with app.app_context():
+        db.engine.dispose()
+
+
+async def _consume(count: int, concurrency: int) -> tuple[float, list[float]]:
+    async def donate(request: web.Request) -> web.Response:
+        _ = await request.json()
+        return web.json_response({"message": "Success"})
+
+    stub = web.Application()
+    _ = stub.router.add_post("/donate", donate)
+    runner = web.AppRunner(stub, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+
+    samples: list[float] = []
+
+    async def handle(consumer: BeerConsumer, message: QueueMessage) -> None:
+        start = time.perf_counter()
+        _ = await consumer.on_message(message)
+        assert message.status == QueueMessageStatus.FINISHED
+        samples.append(time.perf_counter() - start)
+
+    try:
+        async with BeerConsumer(
+            donate_url=f"http://{host}:{port}/donate", max_in_flight=concurrency
+        ) as consumer:
+            messages = [
+                QueueMessage(
+                    event="bench",
+                    data=QueueEvent(
+                        event_type="DONATION",
+                        user_name="Bench",
+                        amount=float(1 + i % 500),
+                        currency="RUB",
+                    ),
+                )
+                for i in range(count)
+            ]
+            start = time.perf_counter()
+            _ = await asyncio.gather(*(handle(consumer, m) for m in messages))
+            elapsed = time.perf_counter() - start
+    finally:
+        await runner.cleanup()
+    return elapsed, samples
+
+
+def bench_consumer(results: Results, count: int, concurrency: int) -> None:
+    # Messages overlap, so throughput comes from the wall clock
+    elapsed, samples = asyncio.run(_consume(count, concurrency))
+    record(results, "consumer.on_message.ops_per_s", count / elapsed, "ops/s")
+    record(
+        results, "consumer.on_message.p50_ms", statistics.median(samples) * 1000, "ms"
+    )
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+
+def serve_sync(app: Flask) -> tuple[str, Callable[[], None]]:
+    # One request at a time, like a gunicorn sync worker
+    server = make_server("127.0.0.1", 0, app, request_handler=_QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def stop() -> None:
+        server.shutdown()
+        thread.join()
+
+    return f"http://127.0.0.1:{server.server_port}", stop
+
+
+def serve_gunicorn(
+    database: Path,
+    workers: int,
+    threads: int = 1,
+    aio: bool = False,
+    env: dict[str, str] | None = None,
+) -> tuple[str, Callable[[], None]]:
+    # Real worker processes like production, with the database given through
+    # the environment the way the systemd unit does
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    command = [sys.executable, "-m", "gunicorn", "--workers", str(workers)]
+    command += ["--threads", str(threads), "--bind", f"127.0.0.1:{port}"]
+    command += ["--log-level", "warning"]
+    if aio:
+        command += ["--worker-class", "aiohttp.GunicornWebWorker"]
+        command += ["app.aio:create_aio_app()"]
+    else:
+        command += ["app:app"]
+    server = subprocess.Popen(
+        command,
+        cwd=ROOT,
+        env={
+            **os.environ,
+            **(env or {}),
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{database}",
+        },
+    )
+
+    def stop() -> None:
+        server.terminate()
+        _ = server.wait(30)
+
+    deadline = time.monotonic() + 30
+    while True:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {server.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                stop()
+                raise
+            time.sleep(0.1)
+    return f"http://127.0.0.1:{port}", stop
+
+
+def serve_aio(app: web.Application) -> tuple[str, Callable[[], None]]:
+    # Own loop in its own thread so the load generator does not share it
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app, access_log=None)
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", 0).start())
+    host, port = runner.addresses[0][:2]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    def stop() -> None:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        _ = loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    return f"http://{host}:{port}", stop
+
+
+async def _load(
+    url: str, count: int, concurrency: int
+) -> dict[str, tuple[float, list[float]]]:
+    timings: dict[str, tuple[float, list[float]]] = {}
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        for name, method, path in (
+            ("donate", "POST", "/donate"),
+            ("balance", "GET", "/balance"),
+        ):
+            samples: list[float] = []
+            numbers = iter(range(count))
+
+            async def worker() -> None:
+                for i in numbers:
+                    body = _donation(i) if method == "POST" else None
+                    start = time.perf_counter()
+                    async with session.request(method, url + path, json=body) as r:
+                        _ = await r.read()
+                        assert r.status == 200, r.status
+                    samples.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            _ = await asyncio.gather(*(worker() for _ in range(concurrency)))
+            timings[name] = (time.perf_counter() - start, samples)
+    return timings
+
+
+def bench_servers(
+    results: Results, workdir: Path, count: int, concurrency: int
+) -> None:
+    # The Flask app deployed like the systemd unit (gunicorn, threaded
+    # workers, group commits) against the aiohttp app in one process, both
+    # over real sockets with `concurrency` clients at once
+    for database in ("gunicorn.db", "aio.db"):
+        with make_app(workdir / database).app_context():
+            db.engine.dispose()
+    aio_app = create_aio_app(database_uri=f"sqlite:///{workdir / 'aio.db'}")
+    for name, start in (
+        (
+            "server.gunicorn",
+            lambda: serve_gunicorn(
+                workdir / "gunicorn.db",
+                GUNICORN_WORKERS,
+                GUNICORN_THREADS,
+                env={"INGEST_MODE": "group"},
+            ),
+        ),
+        ("server.aio", lambda: serve_aio(aio_app)),
+    ):
+        url, stop = start()
+        try:
+            timings = asyncio.run(_load(url, count, concurrency))
+        finally:
+            stop()
+        for path, (elapsed, samples) in timings.items():
+            samples.sort()
+            record(results, f"{name}.{path}.ops_per_s", count / elapsed, "ops/s")
+            record(
+                results,
+                f"{name}.{path}.p95_ms",
+                samples[int(len(samples) * 0.95)] * 1000,
+                "ms",
+            )
+
+
+def bench_imports(results: Results, repeat: int) -> None:
+    for name, statement in ENTRY_POINTS.items():
+        seconds = [measure(statement)["seconds"] for _ in range(repeat)]
+        record(results, f"import.{name}_ms", statistics.median(seconds) * 1000, "ms")
+
+
+def compare(results: Results, baseline: Results, tolerance: float) -> list[str]:
+    regressions: list[str] = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or not base["value"]:
+            continue
+        ratio = result["value"] / base["value"]
+        worse = (
+            ratio < 1 - tolerance
+            if result["better"] == "higher"
+            else ratio > 1 + tolerance
+        )
+        flag = "REGRESSION" if worse else ""
+        print(
+            f"{name:40} {base['value']:12.3f} -> {result['value']:12.3f} {ratio:6.2f}x {flag}"
+        )
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def _git_revision() -> str:
+    result = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout.strip()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    _ = parser.add_argument("--quick", action="store_true", help="Small sizes only.")
+    _ = parser.add_argument(
+        "--output", type=Path, default=ROOT / "benchmarks" / "results.json"
+    )
+    _ = parser.add_argument("--baseline", type=Path)
+    _ = parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    # Read before anything runs, a full run takes long to end in a missing file
+    baseline = None
+    if args.baseline is not None:
+        if not args.baseline.is_file():
+            parser.error(
+                f"baseline {args.baseline} does not exist, "
+                "record one with `make bench-baseline`"
+            )
+        baseline = json.loads(args.baseline.read_text())
+
+    count = 200 if args.quick else 2000
+    results: Results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        bench_insert_donate(results, Path(workdir), count)
+        bench_get_sum(results, QUICK_SIZES if args.quick else SIZES, count)
+        bench_http(results, Path(workdir), count)
+        bench_servers(results, Path(workdir), count, concurrency=16)
+    bench_consumer(results, count, concurrency=4)
+    bench_imports(results, repeat=3 if args.quick else 10)
+
+    report = {
+        "meta": {
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    _ = args.output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"results written to {args.output}")
+
+    if baseline is not None:
+        if baseline["meta"].get("quick") != args.quick:
+            print("baseline was recorded with a different --quick setting")
+        if compare(results, baseline["results"], args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
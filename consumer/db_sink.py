@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.metrics import registry
+from app.sqlite import configure_sqlite, resolve_database_url
+from app.utils import InvalidDonation, insert_donates, parse_donate
+from consumer.sinks import Delivery, Payload, Sink
+
+logger = logging.getLogger(__name__)
+
+
+class DbSink(Sink):
+    # Writes straight into the web app's database, for a consumer running on
+    # the same host. Payloads are validated like /donate and committed with
+    # the same insert path, so the running totals stay in step.
+    def __init__(
+        self,
+        database_uri: str,
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+        busy_timeout: int = 5000,
+    ) -> None:
+        self.engine = create_engine(resolve_database_url(database_uri))
+        configure_sqlite(
+            self.engine,
+            journal_mode=journal_mode,
+            busy_timeout=busy_timeout,
+            synchronous=synchronous,
+        )
+        self._sessions = sessionmaker(self.engine)
+        # SQLite takes one writer at a time, a single thread keeps it that way
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-sink")
+
+    async def close(self) -> None:
+        self._executor.shutdown()
+        self.engine.dispose()
+
+    async def send(self, payloads: list[Payload]) -> list[Delivery]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._write, payloads)
+
+    def _write(self, payloads: list[Payload]) -> list[Delivery]:
+        rows: list[dict[str, object]] = []
+        results: list[Delivery] = []
+        for payload in payloads:
+            try:
+                rows.append(parse_donate(payload))
+                results.append(Delivery.STORED)
+            except InvalidDonation as e:
+                logger.warning("invalid donation %s: %s", payload, e)
+                registry.inc(
+                    "beerstat_consumer_failures_total", sink="db", reason="invalid"
+                )
+                results.append(Delivery.REJECTED)
+        if not rows:
+            return results
+
+        with self._sessions() as session:
+            try:
+                _ = insert_donates(rows, session)  # pyright: ignore[reportArgumentType]
+            except Exception:
+                session.rollback()
+                logger.exception("cant store donations")
+                registry.inc(
+                    "beerstat_consumer_failures_total",
+                    len(rows),
+                    sink="db",
+                    reason="database",
+                )
+                return [
+                    Delivery.REJECTED
+                    if result is Delivery.REJECTED
+                    else Delivery.UNAVAILABLE
+                    for result in results
+                ]
+        return results
@@ -0,0 +1,41 @@
+import hashlib
+import uuid
+from datetime import datetime
+
+from requeue.models import QueueEvent, QueueMessage
+
+
+def from_queue_event_to_bs(event: QueueEvent) -> dict[str, int | str | None]:
+    return {
+        "value": int(event.amount) if event.amount else 0,
+        "name": event.user_name,
+    }
+
+
+def idempotency_key(message: QueueMessage) -> str:
+    # Only an id assigned once per enqueue tells a redelivery apart from a
+    # second donation with the same contents: the queue's message id, or an
+    # id the producer put into the event. Without one a random key is minted,
+    # so inline retries and spool replays of this payload are still stored
+    # once, while a redelivery by the queue counts as a new donation.
+    for source in (message, message.data):
+        for name in ("id", "event_id"):
+            value = getattr(source, name, None)
+            if value is not None:
+                return hashlib.sha256(str(value).encode()).hexdigest()
+    return uuid.uuid4().hex
+
+
+def donation_payload(
+    event: QueueEvent, date: datetime, key: str | None = None
+) -> dict[str, object]:
+    # Same shape as a /donate request body
+    stat_data = from_queue_event_to_bs(event)
+    payload: dict[str, object] = {
+        "date": date.isoformat(),
+        "value": stat_data.get("value", 0),
+        "name": stat_data.get("name", ""),
+    }
+    if key is not None:
+        payload["idempotency_key"] = key
+    return payload
@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import random
+import time
+from collections.abc import Callable
+
+from app.metrics import registry
+from consumer.sinks import Delivery, Payload, Sink
+from consumer.spool import Spool
+
+logger = logging.getLogger(__name__)
+
+
+class Backoff:
+    # Exponential backoff with full jitter, so consumers that failed together
+    # do not come back together
+    def __init__(
+        self, base: float = 0.1, cap: float = 10.0, factor: float = 2.0
+    ) -> None:
+        self.base = base
+        self.cap = cap
+        self.factor = factor
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.cap, self.base * self.factor**attempt))
+
+
+class CircuitBreaker:
+    # Opens after `threshold` failures in a row and keeps the sink paused for
+    # `reset_timeout` seconds. Then one trial call goes through (half-open):
+    # a success closes the breaker, a failure opens it again.
+    def __init__(
+        self,
+        threshold: int = 5,
+        reset_timeout: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._clock = clock
+        self._opened_at: float | None = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._trial or self.remaining() == 0:
+            return "half-open"
+        return "open"
+
+    def remaining(self) -> float:
+        if self._opened_at is None:
+            return 0
+        return max(0.0, self._opened_at + self.reset_timeout - self._clock())
+
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+        if self._trial or self.remaining() > 0:
+            return False
+        self._trial = True
+        return True
+
+    async def wait(self) -> None:
+        while not self.allow():
+            await asyncio.sleep(max(self.remaining(), 0.05))
+
+    def record_success(self) -> None:
+        if self._opened_at is not None:
+            logger.info("sink is back, closing the circuit breaker")
+            registry.set("beerstat_consumer_breaker_open", 0)
+        self.failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial or self.failures >= self.threshold:
+            if self._opened_at is None:
+                logger.warning("sink is down, pausing for %ss", self.reset_timeout)
+                registry.set("beerstat_consumer_breaker_open", 1)
+            self._opened_at = self._clock()
+            self._trial = False
+
+
+class RetryingSink(Sink):
+    # Retries payloads the wrapped sink could not take, with backoff, behind
+    # a circuit breaker. While the breaker is open callers wait, which pauses
+    # consumption instead of bouncing messages back to Redis.
+    #
+    # With a spool, failed payloads are written to disk instead of retried
+    # inline and count as accepted. A background task drains the spool in
+    # order and in batches once the sink is back. While anything is spooled,
+    # new payloads are spooled too so they stay in order. When the spool is
+    # full the inline retries take over again.
+    def __init__(
+        self,
+        sink: Sink,
+        backoff: Backoff | None = None,
+        breaker: CircuitBreaker | None = None,
+        attempts: int = 5,
+        spool: Spool | None = None,
+        drain_batch: int = 100,
+    ) -> None:
+        self.sink = sink
+        self.backoff = backoff or Backoff()
+        self.breaker = breaker or CircuitBreaker()
+        self.attempts = attempts
+        self.spool = spool
+        self.drain_batch = drain_batch
+        self.drain_rate = 0.0
+        self._spooled = asyncio.Event()
+        self._drainer: asyncio.Task[None] | None = None
+
+    async def start(self) -> None:
+        await self.sink.start()
+        if self.spool is not None and self._drainer is None:
+            if self.spool.depth:
+                logger.info("%s payloads left in the spool", self.spool.depth)
+                self._spooled.set()
+            self._update_spool_stats()
+            self._drainer = asyncio.create_task(self._drain())
+
+    async def close(self) -> None:
+        if self._drainer is not None:
+            _ = self._drainer.cancel()
+            try:
+                await self._drainer
+            except asyncio.CancelledError:
+                pass
+            self._drainer = None
+        await self.sink.close()
+
+    def stats(self) -> dict[str, object]:
+        stats: dict[str, object] = {"breaker": self.breaker.state}
+        if self.spool is not None:
+            stats.update(
+                spool_depth=self.spool.depth,
+                spooled=self.spool.appended,
+                drained=self.spool.drained,
+                drain_rate=self.drain_rate,
+            )
+        return stats
+
+    async def send(self, payloads: list[Payload]) -> list[Delivery]:
+        spooling = self.spool is not None and (
+            self.spool.depth > 0 or self.breaker.state != "closed"
+        )
+        if spooling and self._should_spool(len(payloads)):
+            return await self._park(payloads)
+
+        results = [Delivery.UNAVAILABLE] * len(payloads)
+        pending = list(range(len(payloads)))
+        for attempt in range(self.attempts):
+            if attempt:
+                registry.inc("beerstat_consumer_retries_total", len(pending))
+                await asyncio.sleep(self.backoff.delay(attempt - 1))
+            await self.breaker.wait()
+            sent = await self.sink.send([payloads[i] for i in pending])
+            for i, result in zip(pending, sent):
+                results[i] = result
+            pending = [i for i in pending if results[i] is Delivery.UNAVAILABLE]
+            if not pending:
+                self.breaker.record_success()
+                break
+            self.breaker.record_failure()
+            if self._should_spool(len(pending)):
+                parked = await self._park([payloads[i] for i in pending])
+                for i, result in zip(pending, parked):
+                    results[i] = result
+                break
+        return results
+
+    def _should_spool(self, count: int) -> bool:
+        return self.spool is not None and self.spool.has_room(count)
+
+    async def _park(self, payloads: list[Payload]) -> list[Delivery]:
+        assert self.spool is not None
+        await asyncio.to_thread(self.spool.append, payloads)
+        self._spooled.set()
+        self._update_spool_stats()
+        return [Delivery.SPOOLED] * len(payloads)
+
+    async def _drain(self) -> None:
+        assert self.spool is not None
+        attempt = 0
+        while True:
+            _ = await self._spooled.wait()
+            batch = await asyncio.to_thread(self.spool.peek, self.drain_batch)
+            if not batch:
+                self._spooled.clear()
+                if self.spool.depth:
+                    self._spooled.set()
+                continue
+
+            await self.breaker.wait()
+            started = time.perf_counter()
+            results = await self.sink.send([payload for payload, _ in batch])
+            # Acknowledge the delivered prefix, keep the rest for the next try
+            done = 0
+            for result in results:
+                if result is Delivery.UNAVAILABLE:
+                    break
+                if result is Delivery.REJECTED:
+                    logger.warning("spooled donation refused: %s", batch[done][0])
+                done += 1
+            if done:
+                await asyncio.to_thread(self.spool.ack, done, batch[done - 1][1])
+                self.drain_rate = done / (time.perf_counter() - started)
+                registry.inc("beerstat_consumer_spool_drained_total", done)
+                self._update_spool_stats()
+
+            if done < len(batch):
+                self.breaker.record_failure()
+                await asyncio.sleep(self.backoff.delay(attempt))
+                attempt += 1
+            else:
+                self.breaker.record_success()
+                attempt = 0
+
+    def _update_spool_stats(self) -> None:
+        if self.spool is not None:
+            registry.set("beerstat_consumer_spool_depth", self.spool.depth)
+            registry.set("beerstat_consumer_spool_drain_rate", self.drain_rate)
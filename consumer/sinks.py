@@ -0,0 +1,195 @@
+import asyncio
+import enum
+import logging
+from abc import ABC, abstractmethod
+
+import aiohttp
+
+from app.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_TIMEOUT = 30
+HEADERS = {
+    "Content-Type": "application/json",
+}
+
+Payload = dict[str, object]
+
+
+class Delivery(enum.Enum):
+    STORED = "stored"
+    # The payload itself was refused, sending it again will not help
+    REJECTED = "rejected"
+    # The sink is down or busy, worth another try later
+    UNAVAILABLE = "unavailable"
+    # Parked in the local spool, it is delivered once the sink is back
+    SPOOLED = "spooled"
+
+    @property
+    def accepted(self) -> bool:
+        return self in (Delivery.STORED, Delivery.SPOOLED)
+
+
+class Sink(ABC):
+    # Delivers donation payloads and reports one Delivery per payload, it
+    # never raises for a failed delivery. The consumer finishes a queue
+    # message once it is accepted, drops it when it was rejected and leaves
+    # it for redelivery when the sink was unavailable.
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @abstractmethod
+    async def send(self, payloads: list[Payload]) -> list[Delivery]: ...
+
+    async def __aenter__(self) -> "Sink":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+
+class HttpSink(Sink):
+    def __init__(
+        self,
+        donate_url: str,
+        batch_url: str | None = None,
+        max_connections: int = 1,
+    ) -> None:
+        self.donate_url = donate_url
+        self.batch_url = batch_url
+        self.max_connections = max_connections
+        self._session: aiohttp.ClientSession | None = None
+        self._batch_supported = batch_url is not None
+
+    async def start(self) -> None:
+        _ = self._get_session()
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            # Keep-alive pool sized to the in-flight limit, shared by all messages
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections, keepalive_timeout=KEEPALIVE_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def send(self, payloads: list[Payload]) -> list[Delivery]:
+        if len(payloads) == 1:
+            return [await self._post_one(payloads[0])]
+        return await self._post_batch(payloads)
+
+    async def _post_one(self, payload: Payload) -> Delivery:
+        try:
+            async with self._get_session().post(
+                self.donate_url, json=payload, headers=HEADERS
+            ) as response:
+                if not response.ok:
+                    # e.g. 503 while the database is locked, leave it for redelivery
+                    logger.warning("bs service answered %s", response.status)
+                    _failed("status")
+                    return _from_status(response.status)
+                await response.json()
+                return Delivery.STORED
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            logger.warning("cant connect to bs service")
+            _failed("connect")
+        return Delivery.UNAVAILABLE
+
+    async def _post_batch(self, payloads: list[Payload]) -> list[Delivery]:
+        if self.batch_url is not None and self._batch_supported:
+            try:
+                async with self._get_session().post(
+                    self.batch_url, json=payloads, headers=HEADERS
+                ) as response:
+                    if response.status in (404, 405):
+                        logger.info(
+                            "batch endpoint is not available, posting one by one"
+                        )
+                        self._batch_supported = False
+                    elif response.status != 200:
+                        _failed("status", len(payloads))
+                        return [_from_status(response.status)] * len(payloads)
+                    else:
+                        data = await response.json()
+                        return [
+                            Delivery.STORED
+                            if item["status"] == "ok"
+                            else Delivery.REJECTED
+                            for item in data["results"]
+                        ]
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                logger.warning("cant connect to bs service")
+                _failed("connect", len(payloads))
+                return [Delivery.UNAVAILABLE] * len(payloads)
+
+        return list(await asyncio.gather(*map(self._post_one, payloads)))
+
+
+def _from_status(status: int) -> Delivery:
+    # 4xx means the request was refused, apart from timeouts and rate limits
+    if 400 <= status < 500 and status not in (408, 429):
+        return Delivery.REJECTED
+    return Delivery.UNAVAILABLE
+
+
+def _failed(reason: str, count: int = 1) -> None:
+    registry.inc("beerstat_consumer_failures_total", count, sink="http", reason=reason)
+
+
+class BatchingSink(Sink):
+    # Buffers payloads until batch_size are waiting or batch_interval_ms has
+    # passed, then hands them to the wrapped sink in one call.
+    def __init__(self, sink: Sink, batch_size: int, batch_interval_ms: int) -> None:
+        self.sink = sink
+        self.batch_size = batch_size
+        self.batch_interval_ms = batch_interval_ms
+        self._pending: list[tuple[Payload, asyncio.Future[Delivery]]] = []
+        self._flush_timer: asyncio.Task[None] | None = None
+
+    async def start(self) -> None:
+        await self.sink.start()
+
+    async def close(self) -> None:
+        await self.flush()
+        await self.sink.close()
+
+    async def send(self, payloads: list[Payload]) -> list[Delivery]:
+        loop = asyncio.get_running_loop()
+        futures: list[asyncio.Future[Delivery]] = []
+        for payload in payloads:
+            delivered: asyncio.Future[Delivery] = loop.create_future()
+            self._pending.append((payload, delivered))
+            futures.append(delivered)
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.create_task(self._flush_later())
+        return list(await asyncio.gather(*futures))
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.batch_interval_ms / 1000)
+        self._flush_timer = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        if self._flush_timer is not None:
+            _ = self._flush_timer.cancel()
+            self._flush_timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        results = await self.sink.send([payload for payload, _ in batch])
+        for (_, delivered), result in zip(batch, results):
+            if not delivered.done():
+                delivered.set_result(result)
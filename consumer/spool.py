@@ -0,0 +1,94 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+from consumer.sinks import Payload
+
+# Payload lines are far shorter, a torn last line always fits
+TAIL_SIZE = 64 * 1024
+
+
+class Spool:
+    # Append-only NDJSON file of payloads waiting for the sink. Drained
+    # payloads are not rewritten, the consumed prefix is tracked as a byte
+    # offset in <path>.offset, and the file is truncated once everything has
+    # been drained. A crash between delivering a batch and saving the offset
+    # replays that batch, the idempotency key every consumer payload carries
+    # keeps the replay from being stored twice.
+    def __init__(self, path: str | Path, max_depth: int = 100_000) -> None:
+        self.path = Path(path)
+        self.offset_path = self.path.with_name(self.path.name + ".offset")
+        self.max_depth = max_depth
+        self.appended = 0
+        self.drained = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.touch()
+        self._offset = self._read_offset()
+        self._repair()
+        self.depth = self._count()
+
+    def has_room(self, count: int) -> bool:
+        return self.depth + count <= self.max_depth
+
+    def append(self, payloads: list[Payload]) -> None:
+        data = b"".join(json.dumps(payload).encode() + b"\n" for payload in payloads)
+        with self._lock, self.path.open("ab") as spool:
+            _ = spool.write(data)
+            spool.flush()
+            os.fsync(spool.fileno())
+            self.depth += len(payloads)
+            self.appended += len(payloads)
+
+    def peek(self, limit: int) -> list[tuple[Payload, int]]:
+        # Oldest payloads first, each with the offset just after it
+        batch: list[tuple[Payload, int]] = []
+        with self._lock, self.path.open("rb") as spool:
+            _ = spool.seek(self._offset)
+            offset = self._offset
+            for line in spool:
+                offset += len(line)
+                batch.append((json.loads(line), offset))
+                if len(batch) >= limit:
+                    break
+        return batch
+
+    def ack(self, count: int, offset: int) -> None:
+        with self._lock:
+            self.depth -= count
+            self.drained += count
+            if self.depth == 0:
+                # Everything is delivered, start the file over
+                _ = os.truncate(self.path, 0)
+                offset = 0
+            self._offset = offset
+            tmp = self.offset_path.with_suffix(".tmp")
+            _ = tmp.write_text(str(offset))
+            os.replace(tmp, self.offset_path)
+
+    def _read_offset(self) -> int:
+        try:
+            return int(self.offset_path.read_text())
+        except (OSError, ValueError):
+            return 0
+
+    def _repair(self) -> None:
+        # Drop a line that was cut short by a crash in the middle of append
+        size = self.path.stat().st_size
+        if size == 0:
+            self._offset = 0
+            return
+        with self.path.open("rb") as spool:
+            start = max(0, size - TAIL_SIZE)
+            _ = spool.seek(start)
+            tail = spool.read()
+        end = start + tail.rfind(b"\n") + 1 if b"\n" in tail else 0
+        if end != size:
+            _ = os.truncate(self.path, end)
+        self._offset = min(self._offset, end)
+
+    def _count(self) -> int:
+        with self.path.open("rb") as spool:
+            _ = spool.seek(self._offset)
+            return sum(1 for _ in spool)
@@ -0,0 +1,133 @@
+import logging
+import multiprocessing
+import signal
+import time
+from collections.abc import Callable
+from multiprocessing.connection import wait
+from multiprocessing.process import BaseProcess
+from types import FrameType
+
+from consumer.retry import Backoff
+
+logger = logging.getLogger(__name__)
+
+
+class Supervisor:
+    # Keeps `workers` child processes running target(index) and starts a new
+    # one whenever a child exits. Workers that die again soon after a start
+    # are restarted with backoff. SIGTERM or SIGINT is passed on to the
+    # children so they finish what they are doing; a child still running
+    # `shutdown_timeout` seconds later is killed.
+    def __init__(
+        self,
+        target: Callable[[int], None],
+        workers: int,
+        shutdown_timeout: float = 30.0,
+        backoff: Backoff | None = None,
+        stable_after: float = 10.0,
+    ) -> None:
+        self.target = target
+        self.workers = workers
+        self.shutdown_timeout = shutdown_timeout
+        self.backoff = backoff or Backoff(base=1.0, cap=30.0)
+        self.stable_after = stable_after
+        self.restarts = 0
+        self._processes: dict[int, BaseProcess] = {}
+        self._started_at: dict[int, float] = {}
+        self._crashes: dict[int, int] = {}
+        self._restart_at: dict[int, float] = {}
+        self._stopping = False
+
+    def run(self) -> int:
+        previous = {
+            signum: signal.signal(signum, self._on_signal)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            for index in range(self.workers):
+                self._start(index)
+            while not self._stopping:
+                self._reap()
+                self._wait()
+            return self._shutdown()
+        finally:
+            for signum, handler in previous.items():
+                _ = signal.signal(signum, handler)
+
+    def stop(self) -> None:
+        self._stopping = True
+
+    def _on_signal(self, signum: int, _frame: FrameType | None) -> None:
+        logger.info("got %s, stopping workers", signal.Signals(signum).name)
+        self.stop()
+
+    def _start(self, index: int) -> None:
+        process = multiprocessing.Process(
+            target=self._run_child, args=(index,), name=f"beer-consumer-{index}"
+        )
+        process.start()
+        self._processes[index] = process
+        self._started_at[index] = time.monotonic()
+
+    def _run_child(self, index: int) -> None:
+        # The child sets up its own shutdown handling
+        _ = signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        _ = signal.signal(signal.SIGINT, signal.SIG_DFL)
+        self.target(index)
+
+    def _reap(self) -> None:
+        now = time.monotonic()
+        for index, process in list(self._processes.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            del self._processes[index]
+            if self._stopping:
+                continue
+            if now - self._started_at[index] >= self.stable_after:
+                self._crashes[index] = 0
+            crashes = self._crashes.get(index, 0)
+            self._crashes[index] = crashes + 1
+            delay = self.backoff.delay(crashes)
+            logger.warning(
+                "worker %s exited with %s, restarting in %.1fs",
+                index,
+                process.exitcode,
+                delay,
+            )
+            self._restart_at[index] = now + delay
+
+        for index, due in list(self._restart_at.items()):
+            if due <= now and not self._stopping:
+                del self._restart_at[index]
+                self._start(index)
+                self.restarts += 1
+
+    def _wait(self) -> None:
+        # Until a child exits or a restart is due, signals are noticed within
+        # a second at most
+        timeout = 1.0
+        if self._restart_at:
+            timeout = min(
+                timeout, *(due - time.monotonic() for due in self._restart_at.values())
+            )
+        _ = wait(
+            [process.sentinel for process in self._processes.values()],
+            max(timeout, 0),
+        )
+
+    def _shutdown(self) -> int:
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.shutdown_timeout
+        exit_code = 0
+        for index, process in self._processes.items():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.error("worker %s did not stop in time, killing it", index)
+                process.kill()
+                process.join()
+                exit_code = 1
+        self._processes.clear()
+        return exit_code
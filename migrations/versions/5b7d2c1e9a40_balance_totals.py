@@ -0,0 +1,37 @@
+"""balance totals
+
+Revision ID: 5b7d2c1e9a40
+Revises: 371950a44837
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "5b7d2c1e9a40"
+down_revision = "371950a44837"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "balance_totals",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("total", sa.Float(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("last_id", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.execute(
+        "INSERT INTO balance_totals (id, total, count, last_id) "
+        "SELECT 1, COALESCE(SUM(value), 0), COUNT(id), COALESCE(MAX(id), 0) "
+        "FROM donations"
+    )
+
+
+def downgrade():
+    op.drop_table("balance_totals")
@@ -0,0 +1,47 @@
+"""donation rollups and date index
+
+Revision ID: a3e91f6c2d17
+Revises: 5b7d2c1e9a40
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a3e91f6c2d17"
+down_revision = "5b7d2c1e9a40"
+branch_labels = None
+depends_on = None
+
+BUCKET_FORMATS = {
+    "hour": "%Y-%m-%d %H:00:00.000000",
+    "day": "%Y-%m-%d 00:00:00.000000",
+    "month": "%Y-%m-01 00:00:00.000000",
+}
+
+
+def upgrade():
+    op.create_index("ix_donations_date", "donations", ["date"], unique=False)
+    op.create_table(
+        "donation_rollups",
+        sa.Column("bucket", sa.String(length=5), nullable=False),
+        sa.Column("start", sa.DateTime(), nullable=False),
+        sa.Column("total", sa.Float(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("bucket", "start"),
+    )
+    for bucket, sql_format in BUCKET_FORMATS.items():
+        op.execute(
+            "INSERT INTO donation_rollups (bucket, start, total, count) "
+            f"SELECT '{bucket}', strftime('{sql_format}', date), SUM(value), COUNT(id) "
+            "FROM donations WHERE date IS NOT NULL "
+            f"GROUP BY strftime('{sql_format}', date)"
+        )
+
+
+def downgrade():
+    op.drop_table("donation_rollups")
+    op.drop_index("ix_donations_date", table_name="donations")
@@ -0,0 +1,32 @@
+"""donation idempotency key
+
+Revision ID: a9c5e2f70b14
+Revises: f27a6d3e8b91
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a9c5e2f70b14"
+down_revision = "f27a6d3e8b91"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "donations", sa.Column("idempotency_key", sa.String(length=64), nullable=True)
+    )
+    op.create_index(
+        "ix_donations_idempotency_key", "donations", ["idempotency_key"], unique=True
+    )
+
+
+def downgrade():
+    op.drop_index("ix_donations_idempotency_key", table_name="donations")
+    with op.batch_alter_table("donations") as batch_op:
+        batch_op.drop_column("idempotency_key")
@@ -0,0 +1,41 @@
+"""donation archive
+
+Revision ID: b6d18f3a0c52
+Revises: a9c5e2f70b14
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b6d18f3a0c52"
+down_revision = "a9c5e2f70b14"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "donation_archive",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("start", sa.DateTime(), nullable=False),
+        sa.Column("name", sa.String(length=30), nullable=True),
+        sa.Column("total_minor", sa.Integer(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("last_id", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_donation_archive_start_name",
+        "donation_archive",
+        ["start", "name"],
+        unique=True,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_donation_archive_start_name", table_name="donation_archive")
+    op.drop_table("donation_archive")
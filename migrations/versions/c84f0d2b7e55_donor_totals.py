@@ -0,0 +1,39 @@
+"""donor totals
+
+Revision ID: c84f0d2b7e55
+Revises: a3e91f6c2d17
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c84f0d2b7e55"
+down_revision = "a3e91f6c2d17"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "donor_totals",
+        sa.Column("name", sa.String(length=30), nullable=False),
+        sa.Column("total", sa.Float(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("last_date", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    op.create_index("ix_donor_totals_total", "donor_totals", ["total"], unique=False)
+    op.execute(
+        "INSERT INTO donor_totals (name, total, count, last_date) "
+        "SELECT name, SUM(value), COUNT(id), MAX(date) "
+        "FROM donations WHERE name IS NOT NULL GROUP BY name"
+    )
+
+
+def downgrade():
+    op.drop_index("ix_donor_totals_total", table_name="donor_totals")
+    op.drop_table("donor_totals")
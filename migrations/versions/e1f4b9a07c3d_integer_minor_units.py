@@ -0,0 +1,88 @@
+"""integer minor units and covering indexes
+
+Revision ID: e1f4b9a07c3d
+Revises: c84f0d2b7e55
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e1f4b9a07c3d"
+down_revision = "c84f0d2b7e55"
+branch_labels = None
+depends_on = None
+
+AGGREGATE_TABLES = ("balance_totals", "donation_rollups", "donor_totals")
+
+
+def _rebuild_aggregates(value_column):
+    # Sums are recomputed from the donations so no rounding is carried over
+    op.execute(
+        "INSERT INTO balance_totals (id, {total}, count, last_id) "
+        "SELECT 1, COALESCE(SUM({value}), 0), COUNT(id), COALESCE(MAX(id), 0) "
+        "FROM donations".format(**value_column)
+    )
+    for bucket, sql_format in {
+        "hour": "%Y-%m-%d %H:00:00.000000",
+        "day": "%Y-%m-%d 00:00:00.000000",
+        "month": "%Y-%m-01 00:00:00.000000",
+    }.items():
+        op.execute(
+            "INSERT INTO donation_rollups (bucket, start, {total}, count) "
+            f"SELECT '{bucket}', strftime('{sql_format}', date), SUM({{value}}), "
+            "COUNT(id) FROM donations WHERE date IS NOT NULL "
+            f"GROUP BY strftime('{sql_format}', date)".format(**value_column)
+        )
+    op.execute(
+        "INSERT INTO donor_totals (name, {total}, count, last_date) "
+        "SELECT name, SUM({value}), COUNT(id), MAX(date) "
+        "FROM donations WHERE name IS NOT NULL GROUP BY name".format(**value_column)
+    )
+
+
+def _switch_total_column(old, new, type_):
+    for table in AGGREGATE_TABLES:
+        op.execute(f"DELETE FROM {table}")
+        if table == "donor_totals":
+            op.drop_index("ix_donor_totals_total", table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column(new, type_, nullable=False))
+            batch_op.drop_column(old)
+        if table == "donor_totals":
+            op.create_index("ix_donor_totals_total", table, [new], unique=False)
+
+
+def upgrade():
+    op.drop_index("ix_donations_date", table_name="donations")
+    with op.batch_alter_table("donations") as batch_op:
+        batch_op.add_column(sa.Column("value_minor", sa.Integer(), nullable=True))
+    op.execute("UPDATE donations SET value_minor = CAST(ROUND(value * 100) AS INTEGER)")
+    with op.batch_alter_table("donations") as batch_op:
+        batch_op.drop_column("value")
+    op.create_index(
+        "ix_donations_date_value", "donations", ["date", "value_minor"], unique=False
+    )
+    op.create_index(
+        "ix_donations_name_value", "donations", ["name", "value_minor"], unique=False
+    )
+
+    _switch_total_column("total", "total_minor", sa.Integer())
+    _rebuild_aggregates({"total": "total_minor", "value": "value_minor"})
+
+
+def downgrade():
+    op.drop_index("ix_donations_name_value", table_name="donations")
+    op.drop_index("ix_donations_date_value", table_name="donations")
+    with op.batch_alter_table("donations") as batch_op:
+        batch_op.add_column(sa.Column("value", sa.Float(), nullable=True))
+    op.execute("UPDATE donations SET value = value_minor / 100.0")
+    with op.batch_alter_table("donations") as batch_op:
+        batch_op.drop_column("value_minor")
+    op.create_index("ix_donations_date", "donations", ["date"], unique=False)
+
+    _switch_total_column("total_minor", "total", sa.Float())
+    _rebuild_aggregates({"total": "total", "value": "value"})
@@ -0,0 +1,30 @@
+"""import progress
+
+Revision ID: f27a6d3e8b91
+Revises: e1f4b9a07c3d
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f27a6d3e8b91"
+down_revision = "e1f4b9a07c3d"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "import_progress",
+        sa.Column("source", sa.String(length=255), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("source"),
+    )
+
+
+def downgrade():
+    op.drop_table("import_progress")
@@ -0,0 +1,31 @@
+from collections.abc import Generator
+from typing import Any
+import os
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+from app import create_app
+from app.extensions import db
+
+
+@pytest.fixture()
+def test_app() -> Generator[Flask, Any, Any]:
+    os.environ["FLASK_ENV"] = "testing"
+    app = create_app(testing=True)
+    app.config.update(
+        {"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"}
+    )
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture()
+def test_client(test_app: Flask) -> Generator[FlaskClient, Any, Any]:
+    with test_app.test_client() as client:
+        yield client
@@ -0,0 +1,78 @@
+import re
+import pytest
+from flask.testing import FlaskClient
+from sqlalchemy import event
+
+from app.extensions import db
+
+
+@pytest.fixture()
+def test_client(test_client: FlaskClient) -> FlaskClient:
+    response = test_client.post(
+        "/donate/batch",
+        json=[
+            {"date": f"2024-01-0{i}T10:00:00", "value": i, "name": f"Donor {i}"}
+            for i in range(1, 6)
+        ],
+    )
+    assert response.status_code == 200
+    return test_client
+
+
+def _names(html: str) -> list[str]:
+    return re.findall(r"Donor \d", html)
+
+
+def _next_url(html: str) -> str | None:
+    links = re.findall(r'href="([^"]*after_id=[^"]*)"', html)
+    return links[-1].replace("&amp;", "&") if links else None
+
+
+def test_admin_list_pages_by_keyset(test_client: FlaskClient) -> None:
+    """Test the admin list walks pages with an id cursor, newest first"""
+    response = test_client.get("/admin/beerdonation/?page_size=2")
+    html = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert _names(html) == ["Donor 5", "Donor 4"]
+    assert "~5 donations in total" in html
+
+    next_url = _next_url(html)
+    assert next_url is not None and "after_id=4" in next_url
+    html = test_client.get(next_url).get_data(as_text=True)
+    assert _names(html) == ["Donor 3", "Donor 2"]
+
+    next_url = _next_url(html)
+    assert next_url is not None
+    html = test_client.get(next_url).get_data(as_text=True)
+    assert _names(html) == ["Donor 1"]
+    assert _next_url(html) is None
+
+
+def test_admin_list_date_keyset(test_client: FlaskClient) -> None:
+    """Test ascending date sort seeks on (date, id)"""
+    html = test_client.get(
+        "/admin/beerdonation/?page_size=2&sort=1&after_id=2"
+        "&after_date=2024-01-02T10:00:00"
+    ).get_data(as_text=True)
+
+    assert _names(html) == ["Donor 3", "Donor 4"]
+
+
+def test_admin_list_runs_no_count(test_client: FlaskClient) -> None:
+    """Test list pages never run COUNT(*) on donations"""
+    statements: list[str] = []
+
+    with test_client.application.app_context():
+        engine = db.engine
+
+    def record(conn, cursor, statement, parameters, context, executemany) -> None:  # pyright: ignore[reportMissingParameterType,reportUnknownParameterType]
+        statements.append(statement.lower())
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        assert test_client.get("/admin/beerdonation/").status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert statements
+    assert not any("count(" in statement for statement in statements)
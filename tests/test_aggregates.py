@@ -0,0 +1,124 @@
+from typing import Any
+from datetime import datetime
+from pathlib import Path
+from flask import Flask
+from sqlalchemy import create_engine, event, select, text, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.aggregates import check_aggregates, rebuild_aggregates
+from app.extensions import db
+from app.models import BalanceTotal, BeerDonation, DonationRollup
+from app.utils import insert_donates, parse_donate
+
+
+def _donate(app: Flask, value: float) -> None:
+    response = app.test_client().post(
+        "/donate",
+        json={"date": datetime.now().isoformat(), "value": value, "name": "Donor"},
+    )
+    assert response.status_code == 200
+
+
+def test_running_total_is_maintained(test_app: Flask) -> None:
+    """Test each insert updates the balance row in the same transaction"""
+    _donate(test_app, 10.0)
+    _donate(test_app, 2.5)
+
+    with test_app.app_context():
+        balance = db.session.execute(
+            select(BalanceTotal.total_minor, BalanceTotal.count, BalanceTotal.last_id)
+        ).one()
+        assert tuple(balance) == (1250, 2, 2)
+        assert check_aggregates(db.session) == []  # pyright: ignore[reportArgumentType]
+
+
+def test_check_and_rebuild_commands(test_app: Flask) -> None:
+    """Test the consistency check detects drift and rebuild repairs it"""
+    _donate(test_app, 10.0)
+    with test_app.app_context():
+        _ = db.session.execute(update(BalanceTotal).values(total_minor=999))
+        db.session.commit()
+
+    runner = test_app.test_cli_runner()
+    result = runner.invoke(args=["donations", "check-aggregates"])
+    assert result.exit_code == 1
+    assert "balance total" in result.output
+
+    result = runner.invoke(args=["donations", "rebuild-aggregates"])
+    assert result.exit_code == 0
+
+    result = runner.invoke(args=["donations", "check-aggregates"])
+    assert result.exit_code == 0
+    assert test_app.test_client().get("/balance").get_json() == {"Total": 10.0}
+
+
+def test_rollup_drift_is_detected(test_app: Flask) -> None:
+    """Test the consistency check covers the time-series rollups"""
+    _donate(test_app, 3.0)
+    with test_app.app_context():
+        _ = db.session.execute(
+            update(DonationRollup).where(DonationRollup.bucket == "day").values(count=5)
+        )
+        db.session.commit()
+        assert len(check_aggregates(db.session)) == 1  # pyright: ignore[reportArgumentType]
+
+    result = test_app.test_cli_runner().invoke(args=["donations", "rebuild-aggregates"])
+    assert result.exit_code == 0
+    with test_app.app_context():
+        assert check_aggregates(db.session) == []  # pyright: ignore[reportArgumentType]
+
+
+def test_amounts_are_exact_minor_units(test_app: Flask) -> None:
+    """Test amounts are summed as integer kopecks without float drift"""
+    for value in (0.1, 0.2, 0.005):
+        _donate(test_app, value)
+
+    assert test_app.test_client().get("/balance").get_json() == {"Total": 0.31}
+    with test_app.app_context():
+        values = db.session.scalars(select(BeerDonation.value_minor)).all()
+        assert list(values) == [10, 20, 1]
+
+
+def test_range_sum_uses_covering_index(test_app: Flask) -> None:
+    """Test date range sums are answered from the (date, value) index alone"""
+    with test_app.app_context():
+        plan = db.session.execute(
+            text(
+                "EXPLAIN QUERY PLAN SELECT SUM(value_minor) FROM donations "
+                "WHERE date >= '2024-01-01'"
+            )
+        ).all()
+    assert "COVERING INDEX ix_donations_date_value" in plan[0][-1]
+
+
+def test_rebuild_races_with_inserts(tmp_path: Path) -> None:
+    """Test a donation committed while the rebuild starts is never lost"""
+    uri = f"sqlite:///{tmp_path / 'beer.db'}"
+    engine = create_engine(uri)
+    other = create_engine(uri, connect_args={"timeout": 0})
+    db.metadata.create_all(engine)
+    row = parse_donate({"date": datetime.now().isoformat(), "value": 5, "name": "D"})
+    with Session(engine) as session:
+        _ = insert_donates([row], session)  # pyright: ignore[reportArgumentType]
+
+    raced: list[bool] = []
+
+    def insert_concurrently(*_args: Any) -> None:
+        # Another process commits right after the rebuild's first statement,
+        # or finds the write lock taken and fails
+        if raced:
+            return
+        raced.append(True)
+        try:
+            with Session(other) as session:
+                _ = insert_donates([dict(row)], session)  # pyright: ignore[reportArgumentType]
+        except OperationalError:
+            pass
+
+    event.listen(engine, "after_cursor_execute", insert_concurrently)
+    with Session(engine) as session:
+        rebuild_aggregates(session)
+        assert check_aggregates(session) == []
+    engine.dispose()
+    other.dispose()
@@ -0,0 +1,154 @@
+import asyncio
+import json
+from collections.abc import AsyncGenerator
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from sqlalchemy.exc import OperationalError
+
+from app import aio
+from app.aio import ENGINE, WRITER, async_database_url, create_aio_app
+from app.extensions import db
+from app.idempotency import recent_keys
+from app.sqlite import INSTANCE_PATH
+
+
+@pytest.fixture()
+async def client(
+    tmp_path: Path,
+) -> AsyncGenerator[TestClient[web.Request, web.Application]]:
+    recent_keys.clear()
+    app = create_aio_app(database_uri=f"sqlite:///{tmp_path / 'aio.db'}")
+    async with app[ENGINE].begin() as connection:
+        await connection.run_sync(db.metadata.create_all)
+    async with TestClient(TestServer(app)) as client:
+        yield client
+
+
+def _donation(value: float, **extra: object) -> dict[str, object]:
+    return {"date": datetime.now().isoformat(), "value": value, "name": "Donor"} | extra
+
+
+def test_async_database_url() -> None:
+    """Test relative SQLite paths resolve into the instance folder"""
+    url = async_database_url("sqlite:///mydatabase.db")
+    assert url.drivername == "sqlite+aiosqlite"
+    assert url.database == str(INSTANCE_PATH / "mydatabase.db")
+    assert async_database_url("sqlite:////tmp/x.db").database == "/tmp/x.db"
+
+
+async def test_donate_and_balance(
+    client: TestClient[web.Request, web.Application],
+) -> None:
+    """Test donations posted to the async app show up in the balance"""
+    response = await client.post("/donate", json=_donation(10.5))
+    assert response.status == 200
+    assert await response.json() == {"message": "Success"}
+
+    response = await client.get("/balance")
+    assert await response.json() == {"Total": 10.5}
+
+
+async def test_donate_rejects_invalid(
+    client: TestClient[web.Request, web.Application],
+) -> None:
+    """Test the async app validates like the Flask app"""
+    assert (await client.post("/donate", json={})).status == 400
+    assert (await client.post("/donate", json={"value": "abc"})).status == 400
+    assert (await client.post("/donate", data="x")).status == 415
+
+    response = await client.get("/balance")
+    assert await response.json() == {"Total": None}
+
+
+async def test_batch_and_idempotency(
+    client: TestClient[web.Request, web.Application],
+) -> None:
+    """Test batches report per item results and skip known keys"""
+    lines = [
+        _donation(5, idempotency_key="a"),
+        {"value": 1},
+        _donation(7, idempotency_key="b"),
+    ]
+    body = "\n".join(json.dumps(line) for line in lines)
+    response = await client.post(
+        "/donate/batch", data=body, headers={"Content-Type": "application/x-ndjson"}
+    )
+    result = await response.json()
+    assert [item["status"] for item in result["results"]] == ["ok", "error", "ok"]
+
+    response = await client.post("/donate/batch", json=[lines[0]])
+    again = await response.json()
+    assert again["results"][0]["id"] == result["results"][0]["id"]
+
+    response = await client.get("/balance")
+    assert await response.json() == {"Total": 12.0}
+
+
+async def test_locked_database_returns_503(
+    client: TestClient[web.Request, web.Application],
+) -> None:
+    """Test a busy database asks the client to retry"""
+    import sqlite3
+
+    locked = OperationalError(
+        "INSERT", {}, sqlite3.OperationalError("database is locked")
+    )
+    with patch.object(aio, "insert_donates", side_effect=locked):
+        response = await client.post("/donate", json=_donation(1))
+
+    assert response.status == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+async def test_concurrent_donations_share_commits(
+    client: TestClient[web.Request, web.Application],
+) -> None:
+    """Test donations arriving together are committed in one transaction"""
+    writer = client.app[WRITER]
+    responses = await asyncio.gather(
+        *(client.post("/donate", json=_donation(1)) for _ in range(20))
+    )
+
+    assert [response.status for response in responses] == [200] * 20
+    assert writer.commits < 20
+    response = await client.get("/balance")
+    assert await response.json() == {"Total": 20.0}
+
+
+class _StuckSession:
+    # Stands in for an AsyncSession whose commit never comes back
+    async def __aenter__(self) -> "_StuckSession":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        return None
+
+    async def run_sync(self, *_args: object) -> list[int]:
+        _ = await asyncio.Event().wait()
+        return []
+
+
+async def test_cancelled_commit_fails_its_group(
+    client: TestClient[web.Request, web.Application],
+) -> None:
+    """Test cancelling the committing request does not strand the others"""
+    writer = client.app[WRITER]
+
+    with patch.object(writer, "sessions", _StuckSession):
+        async with writer._lock:
+            first = asyncio.create_task(writer.submit([_donation(1)]))
+            second = asyncio.create_task(writer.submit([_donation(2)]))
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+        _ = first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(second, 1)
+
+    assert writer.commits == 0
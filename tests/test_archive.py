@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+from typing import Any
+
+from flask import Flask
+from flask.testing import FlaskClient
+from sqlalchemy import func, select
+
+from app.aggregates import check_aggregates, rebuild_aggregates
+from app.archive import archive_cutoff, archive_donations
+from app.extensions import db
+from app.models import BeerDonation, DonationArchive
+
+OLD = datetime(2024, 3, 1, 10, 15)
+
+
+def _donate(client: FlaskClient, date: datetime, value: float, name: str) -> None:
+    response = client.post(
+        "/donate", json={"date": date.isoformat(), "value": value, "name": name}
+    )
+    assert response.status_code == 200
+
+
+def _seed(client: FlaskClient) -> None:
+    _donate(client, OLD, 10.0, "Alice")
+    _donate(client, OLD + timedelta(minutes=20), 2.5, "Alice")
+    _donate(client, OLD + timedelta(hours=1), 4.0, "Bob")
+    _donate(client, OLD + timedelta(days=40), 1.0, "Bob")
+    _donate(client, datetime.now(), 7.0, "Carol")
+
+
+def _reports(client: FlaskClient) -> list[Any]:
+    # Dropped so every answer is read from the database again
+    client.application.extensions["aggregate_cache"].invalidate()
+    return [
+        client.get("/balance").get_json(),
+        client.get("/stats?bucket=hour").get_json(),
+        client.get("/stats?bucket=day").get_json(),
+        client.get("/stats?bucket=month").get_json(),
+        client.get("/leaderboard").get_json(),
+        client.get(
+            f"/leaderboard?since={OLD.replace(minute=0).isoformat()}"
+        ).get_json(),
+    ]
+
+
+def test_archive_keeps_reports_exact(test_app: Flask) -> None:
+    """Test archived donations still count in every total and report"""
+    client = test_app.test_client()
+    _seed(client)
+    before = _reports(client)
+
+    with test_app.app_context():
+        stats = archive_donations(
+            db.session,  # pyright: ignore[reportArgumentType]
+            OLD + timedelta(days=30),
+            batch_size=2,
+        )
+        assert (stats.archived, stats.batches) == (3, 2)
+        assert db.session.scalar(select(func.count(BeerDonation.id))) == 2
+        archived = db.session.execute(
+            select(
+                DonationArchive.name, DonationArchive.total_minor, DonationArchive.count
+            ).order_by(DonationArchive.start)
+        ).all()
+        assert [tuple(row) for row in archived] == [("Alice", 1250, 2), ("Bob", 400, 1)]
+        assert check_aggregates(db.session) == []  # pyright: ignore[reportArgumentType]
+
+    assert _reports(client) == before
+
+    with test_app.app_context():
+        rebuild_aggregates(db.session)  # pyright: ignore[reportArgumentType]
+        assert check_aggregates(db.session) == []  # pyright: ignore[reportArgumentType]
+    assert _reports(client) == before
+
+
+def test_archive_merges_into_existing_hours(test_app: Flask) -> None:
+    """Test a donation backdated into an archived hour is added to its row"""
+    client = test_app.test_client()
+    _donate(client, OLD, 10.0, "Alice")
+    with test_app.app_context():
+        _ = archive_donations(db.session, OLD + timedelta(days=1))  # pyright: ignore[reportArgumentType]
+    _donate(client, OLD + timedelta(minutes=5), 1.0, "Alice")
+
+    with test_app.app_context():
+        assert check_aggregates(db.session) == []  # pyright: ignore[reportArgumentType]
+        _ = archive_donations(db.session, OLD + timedelta(days=1))  # pyright: ignore[reportArgumentType]
+        row = db.session.execute(
+            select(DonationArchive.total_minor, DonationArchive.count)
+        ).one()
+        assert tuple(row) == (1100, 2)
+        assert check_aggregates(db.session) == []  # pyright: ignore[reportArgumentType]
+    assert client.get("/balance").get_json() == {"Total": 11.0}
+
+
+def test_leaderboard_window_inside_archived_hour(test_app: Flask) -> None:
+    """Test a window starting inside an archived hour is refused"""
+    client = test_app.test_client()
+    _seed(client)
+    with test_app.app_context():
+        _ = archive_donations(db.session, OLD + timedelta(days=30))  # pyright: ignore[reportArgumentType]
+
+    inside = OLD.replace(minute=30).isoformat()
+    assert client.get(f"/leaderboard?since={inside}").status_code == 400
+    on_the_hour = OLD.replace(minute=0).isoformat()
+    assert client.get(f"/leaderboard?since={on_the_hour}").status_code == 200
+    live = (OLD + timedelta(days=40, minutes=-30)).isoformat()
+    assert client.get(f"/leaderboard?since={live}").get_json()["items"] == [
+        {"name": "Carol", "total": 7.0, "count": 1},
+        {"name": "Bob", "total": 1.0, "count": 1},
+    ]
+
+
+def test_archive_command(test_app: Flask) -> None:
+    """Test the CLI archives donations older than the retention window"""
+    client = test_app.test_client()
+    _seed(client)
+
+    result = test_app.test_cli_runner().invoke(
+        args=["donations", "archive", "--older-than", "30", "--pause-ms", "0"]
+    )
+    assert result.exit_code == 0
+    assert "done: 4 donations" in result.output
+    with test_app.app_context():
+        names = db.session.scalars(select(BeerDonation.name)).all()
+        assert list(names) == ["Carol"]
+
+
+def test_archive_cutoff_is_midnight() -> None:
+    """Test whole days move to the archive"""
+    now = datetime(2026, 10, 18, 15, 30)
+    assert archive_cutoff(30, now) == datetime(2026, 9, 18)
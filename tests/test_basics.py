@@ -1,32 +1,9 @@
-from collections.abc import Generator
-from typing import Any
-import pytest
-import os
 from datetime import datetime
 from flask.testing import FlaskClient
 
-from app import create_app
-from app.extensions import db
 from app.models import BeerDonation
 
 
-@pytest.fixture()
-def test_client() -> Generator[FlaskClient, Any, Any]:
-    os.environ["FLASK_ENV"] = "testing"
-    app = create_app(testing=True)
-    app.config.update(
-        {"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"}
-    )
-    with app.test_client() as client:
-        with app.app_context():
-            print(type(db.session))
-            db.create_all()
-        yield client
-        with app.app_context():
-            db.session.remove()
-            db.drop_all()
-
-
 def test_donate_endpoint_success(test_client: FlaskClient) -> None:
     """Test successful donation creation"""
     donation_data = {
@@ -0,0 +1,121 @@
+import json
+from datetime import datetime, timezone
+from flask.testing import FlaskClient
+
+from app.utils import parse_donate
+
+
+def test_batch_json_array(test_client: FlaskClient) -> None:
+    """Test batch insert from a JSON array"""
+    donations = [
+        {"date": datetime.now().isoformat(), "value": 10.0, "name": "Donor 1"},
+        {"date": datetime.now().isoformat(), "value": 20.5, "name": "Donor 2"},
+    ]
+
+    response = test_client.post("/donate/batch", json=donations)
+
+    assert response.status_code == 200
+    result = response.get_json()
+    assert [item["status"] for item in result["results"]] == ["ok", "ok"]
+    assert result["results"][0]["id"] < result["results"][1]["id"]
+
+    response = test_client.get("/balance")
+    assert response.get_json() == {"Total": 30.5}
+
+
+def test_batch_ndjson(test_client: FlaskClient) -> None:
+    """Test batch insert from newline delimited JSON"""
+    lines = [
+        {"date": datetime.now().isoformat(), "value": 5.0, "name": "Donor 1"},
+        {"date": datetime.now().isoformat(), "value": 7.0, "name": "Donor 2"},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines) + "\n"
+
+    response = test_client.post(
+        "/donate/batch", data=body, content_type="application/x-ndjson"
+    )
+
+    assert response.status_code == 200
+    response = test_client.get("/balance")
+    assert response.get_json() == {"Total": 12.0}
+
+
+def test_batch_partial_invalid(test_client: FlaskClient) -> None:
+    """Test invalid items are reported and valid ones are still stored"""
+    donations = [
+        {"date": "not a date", "value": 10.0, "name": "Broken"},
+        {"date": datetime.now().isoformat(), "value": 3.0, "name": "Donor"},
+        {},
+    ]
+
+    response = test_client.post("/donate/batch", json=donations)
+
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [item["status"] for item in results] == ["error", "ok", "error"]
+    assert "id" in results[1]
+
+    response = test_client.get("/balance")
+    assert response.get_json() == {"Total": 3.0}
+
+
+def test_batch_not_a_list(test_client: FlaskClient) -> None:
+    """Test batch endpoint rejects a single object"""
+    response = test_client.post("/donate/batch", json={"value": 1})
+
+    assert response.status_code == 400
+
+
+def test_donate_invalid_date(test_client: FlaskClient) -> None:
+    """Test single donation with an invalid date"""
+    response = test_client.post(
+        "/donate", json={"date": "yesterday", "value": 1, "name": "Donor"}
+    )
+
+    assert response.status_code == 400
+
+
+def test_donate_out_of_range(test_client: FlaskClient) -> None:
+    """Test amounts that do not fit a 64 bit integer are rejected"""
+    now = datetime.now().isoformat()
+    for value in ("1e400", "1e17", "-1e17", "NaN"):
+        response = test_client.post(
+            "/donate", json={"date": now, "value": value, "name": "Donor"}
+        )
+        assert response.status_code == 400
+    # A bare 1e400 in JSON is parsed as infinity
+    response = test_client.post(
+        "/donate",
+        data=f'{{"date": "{now}", "value": 1e400, "name": "Donor"}}',
+        content_type="application/json",
+    )
+    assert response.status_code == 400
+
+    donations = [
+        {"date": now, "value": "1e400", "name": "Donor"},
+        {"date": now, "value": 3.0, "name": "Donor"},
+    ]
+    response = test_client.post("/donate/batch", json=donations)
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [item["status"] for item in results] == ["error", "ok"]
+    assert test_client.get("/balance").get_json() == {"Total": 3.0}
+
+
+def test_batch_mixes_aware_and_naive_dates(test_client: FlaskClient) -> None:
+    """Test dates with an offset are stored as local time"""
+    aware = datetime.now(timezone.utc)
+    donations = [
+        {"date": datetime.now().isoformat(), "value": 1.0, "name": "Donor"},
+        {"date": aware.isoformat(), "value": 2.0, "name": "Donor"},
+    ]
+
+    response = test_client.post("/donate/batch", json=donations)
+
+    assert response.status_code == 200
+    assert [item["status"] for item in response.get_json()["results"]] == [
+        "ok",
+        "ok",
+    ]
+    assert parse_donate(donations[1])["date"] == aware.astimezone().replace(tzinfo=None)
+    assert test_client.get("/balance").get_json() == {"Total": 3.0}
@@ -1,8 +1,17 @@
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+from pathlib import Path
+
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 from aiohttp.client_exceptions import ClientConnectorError
 
+import beer_consumer as beer_consumer_module
 from beer_consumer import BeerConsumer
+from consumer.sinks import Delivery, HttpSink, Sink
 from requeue.models import QueueMessage, QueueEvent, QueueMessageStatus
 
 
@@ -123,6 +132,35 @@ class TestBeerConsumer:
         result = await beer_consumer.on_message(sample_queue_message)
         assert result is not None
 
+    @pytest.mark.asyncio
+    @patch("aiohttp.ClientSession.post")
+    async def test_on_message_service_busy(
+        self, mock_post, beer_consumer, sample_queue_message
+    ):
+        """Test a non-2xx answer leaves the message for redelivery."""
+        mock_response = AsyncMock()
+        mock_response.ok = False
+        mock_response.status = 503
+        mock_post.return_value.__aenter__.return_value = mock_response
+
+        result = await beer_consumer.on_message(sample_queue_message)
+        assert result.status != QueueMessageStatus.FINISHED
+
+    @pytest.mark.asyncio
+    @patch("aiohttp.ClientSession.post")
+    async def test_on_message_rejected(
+        self, mock_post, beer_consumer, sample_queue_message
+    ):
+        """Test a refused donation is dropped instead of redelivered forever."""
+        mock_response = AsyncMock()
+        mock_response.ok = False
+        mock_response.status = 400
+        mock_post.return_value.__aenter__.return_value = mock_response
+
+        result = await beer_consumer.on_message(sample_queue_message)
+        assert result.status == QueueMessageStatus.FINISHED
+        assert mock_post.call_count == 1
+
     def test_from_queue_event_to_bs(self, beer_consumer, sample_queue_event):
         """Test _from_queue_event_to_bs method."""
         result = beer_consumer._from_queue_event_to_bs(sample_queue_event)
@@ -141,3 +179,281 @@ class TestBeerConsumer:
         assert isinstance(result, dict)
         assert result["value"] == 0
         assert result["name"] == "Test User"
+
+    @pytest.mark.asyncio
+    @patch("aiohttp.ClientSession.post")
+    async def test_session_is_reused(self, mock_post, sample_queue_event):
+        """Test that one pooled session serves every message."""
+        mock_response = AsyncMock()
+        mock_response.json = AsyncMock(return_value={"message": "Success"})
+        mock_post.return_value.__aenter__.return_value = mock_response
+
+        sink = HttpSink("http://test-server/donate")
+        async with BeerConsumer(sink=sink) as consumer:
+            session = sink._get_session()
+            for _ in range(3):
+                message = QueueMessage(event="test_event", data=sample_queue_event)
+                result = await consumer.on_message(message)
+                assert result.status == QueueMessageStatus.FINISHED
+            assert sink._get_session() is session
+
+        assert session.closed
+        assert mock_post.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_in_flight_limit(self):
+        """Test that concurrent messages respect max_in_flight."""
+        consumer = BeerConsumer(donate_url="http://test-server/donate", max_in_flight=2)
+        running = 0
+        peak = 0
+
+        async def slow_process(message):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            message.finish()
+            return message
+
+        consumer._process = slow_process
+        messages = [
+            QueueMessage(
+                event="test_event",
+                data=QueueEvent(
+                    event_type="DONATION", user_name="User", amount=1.0, currency="RUB"
+                ),
+            )
+            for _ in range(6)
+        ]
+        results = await asyncio.gather(*(consumer.on_message(m) for m in messages))
+
+        assert peak == 2
+        assert all(r.status == QueueMessageStatus.FINISHED for r in results)
+
+    @pytest.mark.asyncio
+    async def test_drain_finishes_in_flight(self):
+        """Test draining waits for deliveries and defers new messages."""
+        consumer = BeerConsumer(donate_url="http://test-server/donate")
+        release = asyncio.Event()
+
+        async def slow_process(message):
+            await release.wait()
+            message.finish()
+            return message
+
+        consumer._process = slow_process
+        in_flight = asyncio.create_task(consumer.on_message(_donation_message()))
+        await asyncio.sleep(0)
+        drained = asyncio.create_task(consumer.drain(timeout=5))
+        await asyncio.sleep(0)
+        assert not drained.done()
+
+        late = asyncio.create_task(consumer.on_message(_donation_message()))
+        await asyncio.sleep(0)
+        assert not late.done()
+        release.set()
+
+        assert await drained
+        assert (await in_flight).status == QueueMessageStatus.FINISHED
+        assert (await late).status != QueueMessageStatus.FINISHED
+
+    @pytest.mark.asyncio
+    async def test_drain_timeout(self):
+        """Test draining gives up on a delivery that never ends."""
+        consumer = BeerConsumer(donate_url="http://test-server/donate")
+
+        async def stuck_process(message: QueueMessage) -> QueueMessage:
+            await asyncio.Event().wait()
+            return message
+
+        consumer._process = stuck_process
+        in_flight = asyncio.create_task(consumer.on_message(_donation_message()))
+        await asyncio.sleep(0)
+
+        assert not await consumer.drain(timeout=0.01)
+        _ = in_flight.cancel()
+
+
+def _donation_message(amount: float = 10.0) -> QueueMessage:
+    event = QueueEvent(
+        event_type="DONATION", user_name="Test User", amount=amount, currency="RUB"
+    )
+    return QueueMessage(event="test_event", data=event)
+
+
+class TestBeerConsumerBatching:
+    """Test cases for the micro-batching mode."""
+
+    @pytest.mark.asyncio
+    @patch("aiohttp.ClientSession.post")
+    async def test_flush_by_size(self, mock_post):
+        """Test a full batch goes out as one POST to the batch endpoint."""
+        mock_response = AsyncMock()
+        mock_response.status = 200
+        mock_response.json = AsyncMock(
+            return_value={"results": [{"status": "ok"}, {"status": "ok"}]}
+        )
+        mock_post.return_value.__aenter__.return_value = mock_response
+        consumer = BeerConsumer(
+            donate_url="http://test-server/donate",
+            max_in_flight=2,
+            batch_size=2,
+            batch_interval_ms=10_000,
+            batch_url="http://test-server/donate/batch",
+        )
+
+        results = await asyncio.gather(
+            consumer.on_message(_donation_message(1)),
+            consumer.on_message(_donation_message(2)),
+        )
+
+        assert mock_post.call_count == 1
+        assert mock_post.call_args[0][0] == "http://test-server/donate/batch"
+        assert [p["value"] for p in mock_post.call_args[1]["json"]] == [1, 2]
+        assert all(r.status == QueueMessageStatus.FINISHED for r in results)
+        await consumer.close()
+
+    @pytest.mark.asyncio
+    @patch("aiohttp.ClientSession.post")
+    async def test_flush_by_time(self, mock_post):
+        """Test a partial batch is flushed once the interval passes."""
+        mock_response = AsyncMock()
+        mock_response.status = 200
+        mock_response.json = AsyncMock(return_value={"results": [{"status": "ok"}]})
+        mock_post.return_value.__aenter__.return_value = mock_response
+        consumer = BeerConsumer(
+            donate_url="http://test-server/donate",
+            max_in_flight=5,
+            batch_size=5,
+            batch_interval_ms=10,
+            batch_url="http://test-server/donate/batch",
+        )
+
+        result = await consumer.on_message(_donation_message())
+
+        assert result.status == QueueMessageStatus.FINISHED
+        assert mock_post.call_count == 1
+        await consumer.close()
+
+    @pytest.mark.asyncio
+    @patch("aiohttp.ClientSession.post")
+    async def test_fallback_to_single_posts(self, mock_post):
+        """Test per-item posts when the batch endpoint does not exist."""
+        missing = AsyncMock()
+        missing.status = 404
+        ok = AsyncMock()
+        ok.status = 200
+        ok.json = AsyncMock(return_value={"message": "Success"})
+        mock_post.return_value.__aenter__.side_effect = [missing, ok, ok]
+        consumer = BeerConsumer(
+            donate_url="http://test-server/donate",
+            max_in_flight=2,
+            batch_size=2,
+            batch_url="http://test-server/donate/batch",
+        )
+
+        results = await asyncio.gather(
+            consumer.on_message(_donation_message(1)),
+            consumer.on_message(_donation_message(2)),
+        )
+
+        urls = [call[0][0] for call in mock_post.call_args_list]
+        assert urls == [
+            "http://test-server/donate/batch",
+            "http://test-server/donate",
+            "http://test-server/donate",
+        ]
+        assert all(r.status == QueueMessageStatus.FINISHED for r in results)
+        await consumer.close()
+
+    @pytest.mark.asyncio
+    @patch("aiohttp.ClientSession.post")
+    async def test_batch_connection_error(self, mock_post):
+        """Test nothing is finished when the batch cannot be delivered."""
+        mock_post.side_effect = ClientConnectorError(MagicMock(), MagicMock())
+        consumer = BeerConsumer(
+            donate_url="http://test-server/donate",
+            max_in_flight=2,
+            batch_size=2,
+            batch_url="http://test-server/donate/batch",
+        )
+
+        results = await asyncio.gather(
+            consumer.on_message(_donation_message(1)),
+            consumer.on_message(_donation_message(2)),
+        )
+
+        assert all(r.status != QueueMessageStatus.FINISHED for r in results)
+        await consumer.close()
+
+
+class _SlowSink(Sink):
+    def __init__(self):
+        self.stored = 0
+        self.closed = False
+
+    async def send(self, payloads):
+        await asyncio.sleep(0.05)
+        self.stored += len(payloads)
+        return [Delivery.STORED] * len(payloads)
+
+    async def close(self):
+        self.closed = True
+
+
+class _FakeQueue:
+    fetched: list[QueueMessage] = []
+
+    def __init__(self, name, connection):
+        pass
+
+    async def consumer(self, on_message):
+        while True:
+            # Stands in for the Redis fetch
+            await asyncio.sleep(0.001)
+            message = _donation_message()
+            _FakeQueue.fetched.append(message)
+            await on_message(message)
+
+
+@pytest.mark.asyncio
+async def test_main_drains_on_sigterm():
+    """Test SIGTERM lets in-flight donations finish before the sink closes."""
+    sink = _SlowSink()
+    _FakeQueue.fetched = []
+    with (
+        patch.object(beer_consumer_module, "Queue", _FakeQueue),
+        patch.object(beer_consumer_module, "build_sink", return_value=sink),
+    ):
+        main = asyncio.create_task(beer_consumer_module.main())
+        await asyncio.sleep(0.12)
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.wait_for(main, 5)
+
+    finished = [
+        message
+        for message in _FakeQueue.fetched
+        if message.status == QueueMessageStatus.FINISHED
+    ]
+    assert sink.closed
+    assert len(finished) == sink.stored > 0
+    # At most one message per fetch loop was cut short and is redelivered
+    assert len(_FakeQueue.fetched) - len(finished) <= 4
+
+
+def test_import_skips_web_stack():
+    """Test the consumer starts without importing Flask or SQLAlchemy."""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, beer_consumer; "
+            "print('flask' in sys.modules, 'sqlalchemy' in sys.modules)",
+        ],
+        cwd=Path(__file__).resolve().parents[1],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.split() == ["False", "False"]
@@ -0,0 +1,68 @@
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from flask.testing import FlaskClient
+
+from app.cache import AggregateCache, sqlite_data_version
+
+
+def test_balance_is_served_from_cache(test_client: FlaskClient) -> None:
+    """Test repeated polls hit the cache until a donation is written"""
+    assert test_client.get("/balance").get_json() == {"Total": None}
+    assert test_client.get("/balance").get_json() == {"Total": None}
+    stats = test_client.get("/cache/stats").get_json()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+    response = test_client.post(
+        "/donate",
+        json={"date": datetime.now().isoformat(), "value": 4.0, "name": "Donor"},
+    )
+    assert response.status_code == 200
+
+    assert test_client.get("/balance").get_json() == {"Total": 4.0}
+    stats = test_client.get("/cache/stats").get_json()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_cache_expires_after_ttl() -> None:
+    """Test entries are reloaded once the TTL has passed"""
+    cache = AggregateCache(ttl=0, data_version=lambda: 0)
+
+    assert cache.get("key", lambda: 1) == 1
+    assert cache.get("key", lambda: 2) == 2
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_cache_is_bounded() -> None:
+    """Test the least recently used entry is evicted and changes drop all"""
+    version = [0]
+    cache = AggregateCache(ttl=60, data_version=lambda: version[0], maxsize=2)
+    for key in ("a", "b", "a", "c"):
+        _ = cache.get(key, lambda: key)
+
+    assert cache.stats()["entries"] == 2
+    assert cache.get("a", lambda: "reloaded") == "a"
+    assert cache.get("b", lambda: "reloaded") == "reloaded"
+
+    version[0] += 1
+    assert cache.get("c", lambda: "new") == "new"
+    assert cache.stats()["entries"] == 1
+
+
+def test_data_version_sees_other_connections(tmp_path: Path) -> None:
+    """Test a commit from another process-like connection changes the version"""
+    database = str(tmp_path / "cache.db")
+    writer = sqlite3.connect(database)
+    _ = writer.execute("CREATE TABLE t (x INTEGER)")
+    writer.commit()
+
+    data_version = sqlite_data_version(database)
+    cache = AggregateCache(ttl=60, data_version=data_version)
+    assert cache.get("key", lambda: "old") == "old"
+    assert cache.get("key", lambda: "new") == "old"
+
+    _ = writer.execute("INSERT INTO t VALUES (1)")
+    writer.commit()
+
+    assert cache.get("key", lambda: "new") == "new"
+    writer.close()
@@ -0,0 +1,66 @@
+import csv
+import io
+import json
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+from app.export import iter_donations
+from app.extensions import db
+
+
+@pytest.fixture()
+def test_app(test_app: Flask) -> Flask:
+    response = test_app.test_client().post(
+        "/donate/batch",
+        json=[
+            {
+                "date": f"2024-01-{day:02d}T10:00:00",
+                "value": day,
+                "name": f"Donor {day}",
+            }
+            for day in range(1, 6)
+        ],
+    )
+    assert response.status_code == 200
+    return test_app
+
+
+def test_export_csv(test_client: FlaskClient) -> None:
+    """Test CSV export streams every donation with a header"""
+    response = test_client.get("/export.csv")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row["id"] for row in rows] == ["1", "2", "3", "4", "5"]
+    assert rows[0] == {
+        "id": "1",
+        "name": "Donor 1",
+        "date": "2024-01-01T10:00:00",
+        "value": "1.0",
+    }
+
+
+def test_export_ndjson_incremental(test_client: FlaskClient) -> None:
+    """Test NDJSON export resumes after since_id and honours date filters"""
+    response = test_client.get("/export.ndjson?since_id=2&to=2024-01-05")
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line["id"] for line in lines] == [3, 4]
+    assert lines[0]["value"] == 3.0
+
+
+def test_export_walks_in_chunks(test_app: Flask) -> None:
+    """Test keyset pagination returns every row with small chunks"""
+    with test_app.app_context():
+        ids = [row.id for row in iter_donations(db.engine, chunk_size=2)]
+
+    assert ids == [1, 2, 3, 4, 5]
+
+
+def test_export_invalid_arguments(test_client: FlaskClient) -> None:
+    """Test unknown formats and malformed filters"""
+    assert test_client.get("/export.xml").status_code == 404
+    assert test_client.get("/export.csv?since_id=abc").status_code == 400
@@ -0,0 +1,123 @@
+import pytest
+from datetime import datetime
+from flask import Flask
+from flask.testing import FlaskClient
+from sqlalchemy import func, select
+
+from app.extensions import db
+from app.idempotency import IDEMPOTENCY_KEY_LENGTH, RecentKeys, recent_keys
+from app.metrics import registry
+from app.models import BeerDonation
+from consumer.payload import idempotency_key
+from requeue.models import QueueEvent, QueueMessage
+
+
+@pytest.fixture()
+def test_app(test_app: Flask) -> Flask:
+    recent_keys.clear()
+    registry.reset()
+    return test_app
+
+
+def _donation(key: str | None, value: float = 5) -> dict[str, object]:
+    return {
+        "date": datetime.now().isoformat(),
+        "value": value,
+        "name": "Donor",
+        "idempotency_key": key,
+    }
+
+
+def _count(app: Flask) -> int:
+    with app.app_context():
+        return db.session.scalar(select(func.count(BeerDonation.id))) or 0
+
+
+def test_redelivery_is_stored_once(test_app: Flask, test_client: FlaskClient) -> None:
+    """Test the same key posted twice is counted once"""
+    for _ in range(2):
+        response = test_client.post("/donate", json=_donation("message-1"))
+        assert response.status_code == 200
+
+    assert _count(test_app) == 1
+    assert test_client.get("/balance").get_json() == {"Total": 5.0}
+    text = registry.render()
+    assert 'beerstat_duplicates_total{source="cache"} 1' in text
+
+
+def test_duplicate_found_in_database(test_app: Flask, test_client: FlaskClient) -> None:
+    """Test a key missing from the cache is still caught by the unique index"""
+    first = test_client.post("/donate/batch", json=[_donation("message-1")])
+    recent_keys.clear()
+
+    response = test_client.post(
+        "/donate/batch",
+        json=[_donation("message-2"), _donation("message-1"), _donation("message-2")],
+    )
+
+    first_id = first.get_json()["results"][0]["id"]
+    ids = [item["id"] for item in response.get_json()["results"]]
+    assert ids[1] == first_id
+    assert ids[0] == ids[2] != first_id
+    assert _count(test_app) == 2
+    assert 'beerstat_duplicates_total{source="database"} 1' in registry.render()
+
+
+def test_donations_without_key(test_app: Flask, test_client: FlaskClient) -> None:
+    """Test clients that send no key keep the old behaviour"""
+    for _ in range(2):
+        assert test_client.post("/donate", json=_donation(None)).status_code == 200
+    assert _count(test_app) == 2
+
+
+def test_invalid_key(test_client: FlaskClient) -> None:
+    """Test malformed keys are rejected"""
+    assert test_client.post("/donate", json=_donation("x" * 65)).status_code == 400
+    response = test_client.post(
+        "/donate", json={**_donation(None), "idempotency_key": 1}
+    )
+    assert response.status_code == 400
+
+
+def test_recent_keys_are_bounded() -> None:
+    """Test the cache evicts the least recently used key"""
+    keys = RecentKeys(maxsize=2)
+    keys.add({"a": 1, "b": 2})
+    assert keys.get("a") == 1
+    keys.add({"c": 3})
+
+    assert len(keys) == 2
+    assert keys.get("b") is None
+    assert keys.get("a") == 1
+
+
+def test_key_is_stable_across_redelivery() -> None:
+    """Test the consumer derives the same key for a redelivered message"""
+    event = QueueEvent(
+        event_type="DONATION", user_name="User", amount=10.0, currency="USD"
+    )
+    message = QueueMessage(event="test_event", data=event)
+    setattr(message, "id", "1700000000000-0")
+    key = idempotency_key(message)
+    message.retry += 1
+
+    assert key is not None
+    assert idempotency_key(message) == key
+    other = QueueMessage(event="test_event", data=event)
+    setattr(other, "id", "1700000000000-1")
+    assert idempotency_key(other) != key
+
+
+def test_key_without_an_id() -> None:
+    """Test events without an enqueue id get a key of their own"""
+    event = QueueEvent(
+        event_type="DONATION", user_name="User", amount=10.0, currency="RUB"
+    )
+    first = idempotency_key(QueueMessage(event="test_event", data=event))
+    second = idempotency_key(QueueMessage(event="test_event", data=event))
+    assert first != second
+    assert 0 < len(first) <= IDEMPOTENCY_KEY_LENGTH
+    setattr(event, "event_id", "abc")
+    assert idempotency_key(QueueMessage(event="test_event", data=event)) == (
+        idempotency_key(QueueMessage(event="test_event", data=event))
+    )
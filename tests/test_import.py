@@ -0,0 +1,69 @@
+import json
+from pathlib import Path
+from flask import Flask
+
+from app.aggregates import check_aggregates
+from app.extensions import db
+from app.utils import get_sum
+
+
+def _balance(app: Flask) -> float | None:
+    with app.app_context():
+        assert check_aggregates(db.session) == []  # pyright: ignore[reportArgumentType]
+        return get_sum(db.session)  # pyright: ignore[reportArgumentType]
+
+
+def test_import_csv(test_app: Flask, tmp_path: Path) -> None:
+    """Test CSV history is imported in chunks and aggregates are rebuilt"""
+    source = tmp_path / "history.csv"
+    _ = source.write_text(
+        "date,value,name\n"
+        "2024-01-01T10:00:00,10,Donor 1\n"
+        "2024-01-02T10:00:00,20.5,Donor 2\n"
+        "not a date,1,Broken\n"
+        "2024-01-03T10:00:00,4,Donor 1\n"
+    )
+
+    result = test_app.test_cli_runner().invoke(
+        args=["donations", "import", str(source), "--chunk-size", "2"]
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "3 imported, 1 invalid" in result.output
+    assert "record 3: skipped" in result.output
+    assert _balance(test_app) == 34.5
+
+
+def test_import_ndjson_resumes(test_app: Flask, tmp_path: Path) -> None:
+    """Test a second run continues after the last committed record"""
+    source = tmp_path / "history.ndjson"
+    rows = [
+        {"date": f"2024-01-0{day}T10:00:00", "value": day, "name": "Donor"}
+        for day in range(1, 6)
+    ]
+    _ = source.write_text("".join(json.dumps(row) + "\n" for row in rows[:3]))
+    runner = test_app.test_cli_runner()
+
+    result = runner.invoke(args=["donations", "import", str(source)])
+    assert result.exit_code == 0, result.output
+    assert _balance(test_app) == 6.0
+
+    with source.open("a") as output:
+        _ = output.write("".join(json.dumps(row) + "\n" for row in rows[3:]))
+    result = runner.invoke(args=["donations", "import", str(source)])
+
+    assert result.exit_code == 0, result.output
+    assert "done: 2 imported" in result.output
+    assert _balance(test_app) == 15.0
+
+
+def test_import_unknown_format(test_app: Flask, tmp_path: Path) -> None:
+    """Test files without a known extension need --format"""
+    source = tmp_path / "history.txt"
+    _ = source.write_text("")
+
+    result = test_app.test_cli_runner().invoke(
+        args=["donations", "import", str(source)]
+    )
+
+    assert result.exit_code != 0
@@ -0,0 +1,48 @@
+import pytest
+from flask.testing import FlaskClient
+
+
+@pytest.fixture()
+def donations(test_client: FlaskClient) -> None:
+    response = test_client.post(
+        "/donate/batch",
+        json=[
+            {"date": "2024-01-01T10:00:00", "value": 50.0, "name": "Old Whale"},
+            {"date": "2024-03-01T10:00:00", "value": 10.0, "name": "Regular"},
+            {"date": "2024-03-02T10:00:00", "value": 15.0, "name": "Regular"},
+            {"date": "2024-03-03T10:00:00", "value": 20.0, "name": "Newcomer"},
+            {"date": "2024-03-04T10:00:00", "value": 1.0, "name": "Old Whale"},
+        ],
+    )
+    assert response.status_code == 200
+
+
+@pytest.mark.usefixtures("donations")
+def test_leaderboard_all_time(test_client: FlaskClient) -> None:
+    """Test top donors from the maintained per-donor totals"""
+    response = test_client.get("/leaderboard?limit=2")
+
+    assert response.status_code == 200
+    assert response.get_json()["items"] == [
+        {"name": "Old Whale", "total": 51.0, "count": 2},
+        {"name": "Regular", "total": 25.0, "count": 2},
+    ]
+
+
+@pytest.mark.usefixtures("donations")
+def test_leaderboard_since(test_client: FlaskClient) -> None:
+    """Test top donors within a time window"""
+    response = test_client.get("/leaderboard?since=2024-02-01")
+
+    assert [item["name"] for item in response.get_json()["items"]] == [
+        "Regular",
+        "Newcomer",
+        "Old Whale",
+    ]
+
+
+def test_leaderboard_invalid_limit(test_client: FlaskClient) -> None:
+    """Test limits outside the allowed range are rejected"""
+    assert test_client.get("/leaderboard?limit=0").status_code == 400
+    assert test_client.get("/leaderboard?limit=1000").status_code == 400
+    assert test_client.get("/leaderboard?limit=ten").status_code == 400
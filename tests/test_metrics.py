@@ -0,0 +1,133 @@
+from unittest.mock import patch
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+from app.metrics import Registry, registry
+from beer_consumer import BeerConsumer
+from consumer.sinks import Delivery, Sink
+from requeue.models import QueueEvent, QueueMessage
+
+
+@pytest.fixture()
+def test_app(test_app: Flask) -> Flask:
+    registry.reset()
+    return test_app
+
+
+def _donation() -> dict[str, object]:
+    return {"date": datetime.now().isoformat(), "value": 5, "name": "Donor"}
+
+
+def test_request_latency_and_commits(test_client: FlaskClient) -> None:
+    """Test /metrics reports per-route latency and commit durations"""
+    assert test_client.post("/donate", json=_donation()).status_code == 200
+    assert test_client.get("/balance").status_code == 200
+
+    text = test_client.get("/metrics").get_data(as_text=True)
+
+    assert "# TYPE beerstat_http_request_duration_seconds histogram" in text
+    assert (
+        'beerstat_http_request_duration_seconds_count{method="POST",route="/donate"} 1'
+        in text
+    )
+    assert (
+        'beerstat_http_requests_total{method="GET",route="/balance",status="200"} 1'
+        in text
+    )
+    assert 'route="/balance",le="+Inf"} 1' in text
+    assert "beerstat_db_commit_duration_seconds_count 1" in text
+
+
+def test_errors_are_counted(test_client: FlaskClient) -> None:
+    """Test invalid and failed writes show up as error counts"""
+    bad = {"date": "yesterday", "value": 5, "name": "Donor"}
+    assert test_client.post("/donate", json=bad).status_code == 400
+    with patch("app.web.insert_donates", side_effect=RuntimeError("boom")):
+        assert test_client.post("/donate", json=_donation()).status_code == 500
+
+    text = test_client.get("/metrics").get_data(as_text=True)
+
+    assert 'beerstat_errors_total{kind="invalid",route="/donate"} 1' in text
+    assert 'beerstat_errors_total{kind="unexpected",route="/donate"} 1' in text
+    assert (
+        'beerstat_http_requests_total{method="POST",route="/donate",status="500"} 1'
+        in text
+    )
+
+
+def test_processes_share_a_directory(tmp_path: Path) -> None:
+    """Test counters of every process are summed and stale gauges dropped"""
+    script = (
+        "from app.metrics import registry; "
+        f"registry.configure({str(tmp_path / 'consumer')!r}); "
+        "registry.inc('beerstat_consumer_messages_total', 2, result='delivered'); "
+        "registry.add('beerstat_consumer_in_flight', 3)"
+    )
+    _ = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=Path(__file__).resolve().parents[1],
+        check=True,
+    )
+    local = Registry()
+    local.configure(str(tmp_path))
+    local.inc("beerstat_consumer_messages_total", result="delivered")
+    local.add("beerstat_consumer_in_flight", 1)
+
+    text = local.render()
+
+    assert 'beerstat_consumer_messages_total{result="delivered"} 3' in text
+    assert "beerstat_consumer_in_flight 1" in text
+    assert local.value("beerstat_consumer_messages_total") == 3
+    assert local.value("beerstat_consumer_messages_total", result="skipped") == 0
+    assert local.value("beerstat_consumer_in_flight") == 1
+
+
+def test_reused_pid_keeps_counters(tmp_path: Path) -> None:
+    """Test a process reusing a pid does not overwrite the old file"""
+    dead = tmp_path / f"{os.getpid()}-0badc0de.json"
+    _ = dead.write_text(
+        json.dumps(
+            {
+                "counters": [["beerstat_consumer_messages_total", [], 5]],
+                "gauges": [["beerstat_consumer_in_flight", [], 7]],
+                "histograms": [],
+            }
+        )
+    )
+    os.utime(dead, (0, 0))
+    local = Registry()
+    local.configure(str(tmp_path))
+    local.inc("beerstat_consumer_messages_total")
+    local.add("beerstat_consumer_in_flight", 1)
+
+    assert local.value("beerstat_consumer_messages_total") == 6
+    assert local.value("beerstat_consumer_in_flight") == 1
+    assert len(list(tmp_path.glob(f"{os.getpid()}-*.json"))) == 2
+
+
+class _FailingSink(Sink):
+    async def send(self, payloads: list[dict[str, object]]) -> list[Delivery]:
+        return [Delivery.UNAVAILABLE] * len(payloads)
+
+
+async def test_consumer_metrics() -> None:
+    """Test the consumer reports latency, results and in-flight messages"""
+    registry.reset()
+    consumer = BeerConsumer(sink=_FailingSink())
+    event = QueueEvent(
+        event_type="DONATION", user_name="User", amount=1.0, currency="RUB"
+    )
+
+    _ = await consumer.on_message(QueueMessage(event="test_event", data=event))
+
+    text = registry.render()
+    assert 'beerstat_consumer_messages_total{result="unavailable"} 1' in text
+    assert "beerstat_consumer_message_duration_seconds_count 1" in text
+    assert "beerstat_consumer_in_flight 0" in text
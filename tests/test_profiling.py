@@ -0,0 +1,114 @@
+import logging
+from collections.abc import Generator
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+from app import create_app
+from app.extensions import db
+from app.metrics import registry
+from app.profiling import _before_cursor_execute
+from app.storage import READ_ENGINE
+
+
+def _app(monkeypatch: pytest.MonkeyPatch, **env: str) -> Generator[Flask, Any, Any]:
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    app = create_app(testing=True)
+    app.config.update({"TESTING": True})
+    registry.reset()
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture()
+def profiled_app(monkeypatch: pytest.MonkeyPatch) -> Generator[Flask, Any, Any]:
+    yield from _app(monkeypatch, SQL_PROFILE_SAMPLE="1", SQL_SLOW_QUERY_MS="1000")
+
+
+def _donation() -> dict[str, object]:
+    return {"date": datetime.now().isoformat(), "value": 5, "name": "Donor"}
+
+
+def test_off_by_default(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test profiling leaves the engine alone unless it is enabled"""
+    monkeypatch.delenv("SQL_PROFILE_SAMPLE", raising=False)
+    for app in _app(monkeypatch):
+        with app.app_context():
+            assert not event.contains(
+                db.engine, "before_cursor_execute", _before_cursor_execute
+            )
+        response = app.test_client().get("/balance")
+        assert "Server-Timing" not in response.headers
+
+
+def test_server_timing_and_query_count(profiled_app: Flask) -> None:
+    """Test profiled requests report their SQL time and query count"""
+    client = profiled_app.test_client()
+    assert client.post("/donate", json=_donation()).status_code == 200
+    response = client.get("/balance")
+
+    timing = response.headers["Server-Timing"]
+    assert timing.startswith("db;dur=")
+    assert 'desc="1 queries"' in timing
+    assert registry.value("beerstat_db_queries_total", route="/balance") == 1
+    assert registry.value("beerstat_db_queries_total", route="/donate") > 1
+    assert registry.value("beerstat_db_slow_queries_total") == 0
+
+
+def test_read_pool_is_profiled(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test requests served by the read-only pool are profiled too"""
+    uri = f"sqlite:///{tmp_path / 'beer.db'}"
+    monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", uri)
+    monkeypatch.setenv("SQL_PROFILE_SAMPLE", "1")
+    app = create_app()
+    registry.reset()
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    assert client.post("/donate", json=_donation()).status_code == 200
+
+    for url in ("/balance", "/leaderboard", "/admin/beerdonation/"):
+        timing = client.get(url).headers["Server-Timing"]
+        assert 'desc="0 queries"' not in timing
+    assert registry.value("beerstat_db_queries_total", route="/balance") == 1
+
+    with app.app_context():
+        db.engine.dispose()
+    app.extensions[READ_ENGINE].dispose()
+
+
+def test_sampling(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test requests that are not sampled are not measured"""
+    for app in _app(monkeypatch, SQL_PROFILE_SAMPLE="0.5"):
+        client = app.test_client()
+        monkeypatch.setattr("app.profiling.random.random", lambda: 0.9)
+        assert "Server-Timing" not in client.get("/balance").headers
+        assert registry.value("beerstat_db_queries_total") == 0
+        monkeypatch.setattr("app.profiling.random.random", lambda: 0.1)
+        response = client.post("/donate", json=_donation())
+        assert "Server-Timing" in response.headers
+        assert registry.value("beerstat_db_queries_total") > 0
+
+
+def test_slow_query_log(
+    monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    """Test slow statements are logged with their query plan"""
+    caplog.set_level(logging.WARNING, logger="app.profiling")
+    for app in _app(monkeypatch, SQL_PROFILE_SAMPLE="1", SQL_SLOW_QUERY_MS="0"):
+        assert app.test_client().get("/balance").status_code == 200
+
+    slow = [r.getMessage() for r in caplog.records if r.name == "app.profiling"]
+    assert slow
+    assert "balance_totals" in slow[0]
+    assert "SCAN" in slow[0] or "SEARCH" in slow[0]
+    assert registry.value("beerstat_db_slow_queries_total") >= 1
@@ -0,0 +1,158 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from beer_consumer import BeerConsumer
+from consumer.retry import Backoff, CircuitBreaker, RetryingSink
+from consumer.sinks import Delivery, Payload, Sink
+from consumer.spool import Spool
+from requeue.models import QueueEvent, QueueMessage, QueueMessageStatus
+
+
+class _FlakySink(Sink):
+    def __init__(self, failures: int = 0) -> None:
+        self.failures = failures
+        self.down = False
+        self.stored: list[object] = []
+        self.calls: list[int] = []
+
+    async def send(self, payloads: list[Payload]) -> list[Delivery]:
+        self.calls.append(len(payloads))
+        if self.down or self.failures:
+            self.failures = max(0, self.failures - 1)
+            return [Delivery.UNAVAILABLE] * len(payloads)
+        self.stored.extend(payload["value"] for payload in payloads)
+        return [Delivery.STORED] * len(payloads)
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _payloads(*values: int) -> list[Payload]:
+    return [{"value": value} for value in values]
+
+
+def test_backoff_is_bounded() -> None:
+    """Test jittered delays stay under the exponential bound and the cap"""
+    backoff = Backoff(base=0.1, cap=1.0)
+    for attempt in range(10):
+        assert 0 <= backoff.delay(attempt) <= min(1.0, 0.1 * 2**attempt)
+
+
+def test_circuit_breaker() -> None:
+    """Test the breaker opens, lets one trial through and closes again"""
+    clock = _Clock()
+    breaker = CircuitBreaker(threshold=2, reset_timeout=5, clock=clock)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    clock.now = 5
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock.now = 10
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+async def test_retries_until_stored() -> None:
+    """Test unavailable payloads are retried with backoff"""
+    inner = _FlakySink(failures=2)
+    sink = RetryingSink(inner, backoff=Backoff(base=0), attempts=5)
+
+    assert await sink.send(_payloads(1, 2)) == [Delivery.STORED] * 2
+    assert inner.calls == [2, 2, 2]
+
+
+async def test_gives_up_and_opens_breaker() -> None:
+    """Test the message is left for redelivery once attempts run out"""
+    inner = _FlakySink()
+    inner.down = True
+    breaker = CircuitBreaker(threshold=2, reset_timeout=60)
+    sink = RetryingSink(inner, backoff=Backoff(base=0), breaker=breaker, attempts=2)
+
+    assert await sink.send(_payloads(1)) == [Delivery.UNAVAILABLE]
+    assert breaker.state == "open"
+
+
+def test_spool_survives_restart(tmp_path: Path) -> None:
+    """Test the spool keeps order and the drained position across restarts"""
+    spool = Spool(tmp_path / "spool.ndjson")
+    spool.append(_payloads(1, 2, 3))
+    batch = spool.peek(2)
+    assert [payload for payload, _ in batch] == _payloads(1, 2)
+    spool.ack(2, batch[-1][1])
+
+    with spool.path.open("ab") as torn:
+        _ = torn.write(b'{"value": 4')
+    reopened = Spool(tmp_path / "spool.ndjson")
+
+    assert reopened.depth == 1
+    [(payload, offset)] = reopened.peek(10)
+    assert payload == {"value": 3}
+    reopened.ack(1, offset)
+    assert reopened.depth == 0
+    assert reopened.path.stat().st_size == 0
+
+
+async def test_spool_drains_in_order(tmp_path: Path) -> None:
+    """Test payloads are spooled while the sink is down and drained after"""
+    inner = _FlakySink()
+    inner.down = True
+    spool = Spool(tmp_path / "spool.ndjson")
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0.01)
+    sink = RetryingSink(
+        inner, backoff=Backoff(base=0.01), breaker=breaker, spool=spool, drain_batch=2
+    )
+    async with sink:
+        assert await sink.send(_payloads(1)) == [Delivery.SPOOLED]
+        assert await sink.send(_payloads(2, 3)) == [Delivery.SPOOLED] * 2
+        assert sink.stats()["spool_depth"] == 3
+
+        inner.down = False
+        for _ in range(100):
+            if not spool.depth:
+                break
+            await asyncio.sleep(0.01)
+
+    assert inner.stored == [1, 2, 3]
+    assert max(inner.calls) == 2
+    assert sink.stats()["drained"] == 3
+
+
+async def test_consumer_finishes_spooled_message(tmp_path: Path) -> None:
+    """Test a spooled donation no longer needs redelivery"""
+    inner = _FlakySink()
+    inner.down = True
+    sink = RetryingSink(inner, spool=Spool(tmp_path / "spool.ndjson"))
+    consumer = BeerConsumer(sink=sink)
+    event = QueueEvent(
+        event_type="DONATION", user_name="User", amount=1.0, currency="RUB"
+    )
+
+    result = await consumer.on_message(QueueMessage(event="test_event", data=event))
+
+    assert result.status == QueueMessageStatus.FINISHED
+
+
+@pytest.mark.parametrize("status", [400, 422])
+def test_refused_requests_are_not_retried(status: int) -> None:
+    """Test 4xx answers count as rejected, not as an outage"""
+    from consumer.sinks import _from_status
+
+    assert _from_status(status) is Delivery.REJECTED
+    assert _from_status(503) is Delivery.UNAVAILABLE
+    assert _from_status(429) is Delivery.UNAVAILABLE
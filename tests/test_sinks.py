@@ -0,0 +1,203 @@
+import asyncio
+from collections.abc import AsyncGenerator
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.aggregates import check_aggregates
+from app.extensions import db
+from app.idempotency import recent_keys
+from app.sqlite import DEFAULT_DATABASE_URI, INSTANCE_PATH
+from app.utils import get_sum
+from beer_consumer import BeerConsumer
+from consumer.db_sink import DbSink
+from consumer.retry import Backoff, RetryingSink
+from consumer.sinks import BatchingSink, Delivery, Payload, Sink
+from requeue.models import QueueEvent, QueueMessage, QueueMessageStatus
+
+
+@pytest.fixture()
+def database_uri(tmp_path: Path) -> str:
+    uri = f"sqlite:///{tmp_path / 'beer.db'}"
+    recent_keys.clear()
+    engine = create_engine(uri)
+    db.metadata.create_all(engine)
+    engine.dispose()
+    return uri
+
+
+@pytest.fixture()
+async def db_sink(database_uri: str) -> AsyncGenerator[DbSink, Any]:
+    async with DbSink(database_uri) as sink:
+        yield sink  # pyright: ignore[reportReturnType]
+
+
+def _payload(value: object, name: str = "Donor") -> dict[str, object]:
+    return {"date": datetime.now().isoformat(), "value": value, "name": name}
+
+
+def _balance(database_uri: str) -> float | None:
+    engine = create_engine(database_uri)
+    with Session(engine) as session:
+        assert check_aggregates(session) == []
+        total = get_sum(session)
+    engine.dispose()
+    return total
+
+
+async def test_db_sink_stores_donations(db_sink: DbSink, database_uri: str) -> None:
+    """Test the direct sink commits rows and running totals together"""
+    results = await db_sink.send([_payload(10), _payload(2.5, "Other")])
+
+    assert results == [Delivery.STORED, Delivery.STORED]
+    assert _balance(database_uri) == 12.5
+
+
+async def test_db_sink_uses_the_web_database() -> None:
+    """Test relative paths resolve into the instance folder like the web app"""
+    sink = DbSink(DEFAULT_DATABASE_URI)
+    assert sink.engine.url.database == str(INSTANCE_PATH / "mydatabase.db")
+    await sink.close()
+
+
+async def test_db_sink_rejects_invalid(db_sink: DbSink, database_uri: str) -> None:
+    """Test invalid payloads are refused like /donate/batch does"""
+    results = await db_sink.send([_payload(10), _payload("a lot")])
+
+    assert results == [Delivery.STORED, Delivery.REJECTED]
+    assert _balance(database_uri) == 10
+
+
+async def test_db_sink_failure(db_sink: DbSink) -> None:
+    """Test a failed commit reports every payload as not delivered"""
+    with db_sink.engine.begin() as connection:
+        _ = connection.execute(text("DROP TABLE balance_totals"))
+
+    results = await db_sink.send([_payload(10), _payload(5)])
+    assert results == [Delivery.UNAVAILABLE, Delivery.UNAVAILABLE]
+
+
+async def test_consumer_with_db_sink(db_sink: DbSink, database_uri: str) -> None:
+    """Test the consumer finishes messages stored by the direct sink"""
+    consumer = BeerConsumer(sink=db_sink, max_in_flight=2, batch_size=2)
+    messages = [
+        QueueMessage(
+            event="test_event",
+            data=QueueEvent(
+                event_type="DONATION", user_name="User", amount=amount, currency="RUB"
+            ),
+        )
+        for amount in (3.0, 4.0)
+    ]
+
+    results = await asyncio.gather(*map(consumer.on_message, messages))
+
+    assert all(r.status == QueueMessageStatus.FINISHED for r in results)
+    assert _balance(database_uri) == 7
+
+
+class _RecordingSink(Sink):
+    def __init__(self) -> None:
+        self.calls: list[list[dict[str, object]]] = []
+
+    async def send(self, payloads: list[dict[str, object]]) -> list[Delivery]:
+        self.calls.append(payloads)
+        return [
+            Delivery.STORED if payload["value"] else Delivery.REJECTED
+            for payload in payloads
+        ]
+
+
+async def test_batching_sink_groups_payloads() -> None:
+    """Test the batching wrapper hands full batches to the wrapped sink"""
+    inner = _RecordingSink()
+    sink = BatchingSink(inner, batch_size=3, batch_interval_ms=10_000)
+
+    results = await asyncio.gather(
+        sink.send([_payload(1)]), sink.send([_payload(0), _payload(2)])
+    )
+
+    assert results == [
+        [Delivery.STORED],
+        [Delivery.REJECTED, Delivery.STORED],
+    ]
+    assert len(inner.calls) == 1
+
+
+async def test_batching_sink_flushes_on_close() -> None:
+    """Test closing the wrapper delivers what is still buffered"""
+    inner = _RecordingSink()
+    sink = BatchingSink(inner, batch_size=10, batch_interval_ms=10_000)
+
+    pending = asyncio.create_task(sink.send([_payload(1)]))
+    await asyncio.sleep(0)
+    await sink.close()
+
+    assert await pending == [Delivery.STORED]
+    assert len(inner.calls) == 1
+
+
+async def test_db_sink_redelivery(db_sink: DbSink, database_uri: str) -> None:
+    """Test a redelivered message is finished again but stored once"""
+    consumer = BeerConsumer(sink=db_sink)
+    event = QueueEvent(
+        event_type="DONATION", user_name="User", amount=3.0, currency="RUB"
+    )
+    for _ in range(2):
+        message = QueueMessage(event="test_event", data=event)
+        setattr(message, "id", "1700000000000-0")
+        result = await consumer.on_message(message)
+        assert result.status == QueueMessageStatus.FINISHED
+
+    assert _balance(database_uri) == 3
+
+
+class _TimeoutAfterCommit(Sink):
+    # Stores the first send and reports it as failed, like a POST that timed
+    # out after the server committed
+    def __init__(self, sink: Sink) -> None:
+        self.sink = sink
+        self.sent: list[Payload] = []
+
+    async def send(self, payloads: list[Payload]) -> list[Delivery]:
+        self.sent.extend(payloads)
+        results = await self.sink.send(payloads)
+        if len(self.sent) == len(payloads):
+            return [Delivery.UNAVAILABLE] * len(payloads)
+        return results
+
+
+async def test_retry_after_commit_is_stored_once(
+    db_sink: DbSink, database_uri: str
+) -> None:
+    """Test a retried payload without a queue id is not counted twice"""
+    inner = _TimeoutAfterCommit(db_sink)
+    consumer = BeerConsumer(sink=RetryingSink(inner, backoff=Backoff(base=0)))
+    event = QueueEvent(
+        event_type="DONATION", user_name="User", amount=100.0, currency="RUB"
+    )
+
+    result = await consumer.on_message(QueueMessage(event="test_event", data=event))
+
+    assert result.status == QueueMessageStatus.FINISHED
+    assert len(inner.sent) == 2
+    assert inner.sent[0]["idempotency_key"] == inner.sent[1]["idempotency_key"]
+    assert _balance(database_uri) == 100
+
+
+async def test_db_sink_identical_donations(db_sink: DbSink, database_uri: str) -> None:
+    """Test two separate donations with the same contents are both stored"""
+    consumer = BeerConsumer(sink=db_sink)
+    for _ in range(2):
+        event = QueueEvent(
+            event_type="DONATION", user_name="User", amount=100.0, currency="RUB"
+        )
+        message = QueueMessage(event="test_event", data=event)
+        result = await consumer.on_message(message)
+        assert result.status == QueueMessageStatus.FINISHED
+
+    assert _balance(database_uri) == 200
@@ -0,0 +1,84 @@
+from collections.abc import Generator
+from typing import Any
+import pytest
+import time
+from urllib.parse import quote
+from flask.testing import FlaskClient
+
+
+@pytest.fixture()
+def donations(test_client: FlaskClient) -> None:
+    response = test_client.post(
+        "/donate/batch",
+        json=[
+            {"date": "2024-01-01T10:15:00", "value": 10.0, "name": "Donor 1"},
+            {"date": "2024-01-01T10:45:00", "value": 5.0, "name": "Donor 2"},
+            {"date": "2024-01-01T12:00:00", "value": 1.0, "name": "Donor 1"},
+            {"date": "2024-01-03T09:00:00", "value": 2.0, "name": "Donor 3"},
+            {"date": "2024-02-10T09:00:00", "value": 4.0, "name": "Donor 2"},
+        ],
+    )
+    assert response.status_code == 200
+
+
+@pytest.mark.usefixtures("donations")
+def test_stats_by_hour(test_client: FlaskClient) -> None:
+    """Test hourly buckets within a date range"""
+    response = test_client.get("/stats?bucket=hour&from=2024-01-01&to=2024-01-02")
+
+    assert response.status_code == 200
+    assert response.get_json()["items"] == [
+        {"start": "2024-01-01T10:00:00", "total": 15.0, "count": 2},
+        {"start": "2024-01-01T12:00:00", "total": 1.0, "count": 1},
+    ]
+
+
+@pytest.mark.usefixtures("donations")
+def test_stats_by_day_and_month(test_client: FlaskClient) -> None:
+    """Test daily and monthly buckets"""
+    days = test_client.get("/stats?bucket=day&from=2024-01-01T10:00:00").get_json()
+    assert [(item["start"], item["total"]) for item in days["items"]] == [
+        ("2024-01-01T00:00:00", 16.0),
+        ("2024-01-03T00:00:00", 2.0),
+        ("2024-02-10T00:00:00", 4.0),
+    ]
+
+    months = test_client.get("/stats?bucket=month").get_json()
+    assert [(item["total"], item["count"]) for item in months["items"]] == [
+        (18.0, 4),
+        (4.0, 1),
+    ]
+
+
+def test_stats_invalid_arguments(test_client: FlaskClient) -> None:
+    """Test unknown buckets and malformed dates are rejected"""
+    assert test_client.get("/stats?bucket=week").status_code == 400
+    assert test_client.get("/stats?from=yesterday").status_code == 400
+
+
+@pytest.fixture()
+def moscow_time(monkeypatch: pytest.MonkeyPatch) -> Generator[None, Any, Any]:
+    monkeypatch.setenv("TZ", "Europe/Moscow")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.usefixtures("moscow_time")
+def test_query_dates_with_offset(test_client: FlaskClient) -> None:
+    """Test filters with an offset match donations stored in local time"""
+    response = test_client.post(
+        "/donate",
+        json={"date": "2024-01-01T00:30:00+00:00", "value": 1.0, "name": "Donor"},
+    )
+    assert response.status_code == 200
+    after = quote("2024-01-01T01:00:00+00:00")
+    before = quote("2024-01-01T00:00:00+00:00")
+
+    assert test_client.get(f"/stats?bucket=hour&from={after}").get_json()["items"] == []
+    assert test_client.get(f"/leaderboard?since={after}").get_json()["items"] == []
+    assert test_client.get(f"/export.ndjson?from={after}").get_data() == b""
+
+    items = test_client.get(f"/stats?bucket=hour&from={before}").get_json()["items"]
+    assert items == [{"start": "2024-01-01T03:00:00", "total": 1.0, "count": 1}]
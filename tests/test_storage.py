@@ -0,0 +1,100 @@
+from collections.abc import Generator
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import pytest
+from flask import Flask
+from sqlalchemy import Engine, event, text
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from app.extensions import db
+from app.storage import READ_ENGINE
+
+
+@pytest.fixture()
+def file_app(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> Generator[Flask, Any, Any]:
+    monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'beer.db'}")
+    app = create_app()
+    app.config.update({"TESTING": True})
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    app.extensions[READ_ENGINE].dispose()
+
+
+def _checkouts(engine: Engine) -> list[int]:
+    counter = [0]
+
+    def checkout(*_args: Any) -> None:
+        counter[0] += 1
+
+    event.listen(engine, "checkout", checkout)
+    return counter
+
+
+def _donation() -> dict[str, object]:
+    return {"date": datetime.now().isoformat(), "value": 5, "name": "Donor"}
+
+
+def test_reads_and_writes_use_separate_pools(file_app: Flask) -> None:
+    """Test read-only requests are served by the read pool alone"""
+    client = file_app.test_client()
+    # The first read connection has the write engine prepare the file once
+    assert client.get("/balance").status_code == 200
+    with file_app.app_context():
+        writes = _checkouts(db.engine)
+        assert db.engine.pool.size() == 2  # pyright: ignore[reportAttributeAccessIssue]
+    reads = _checkouts(file_app.extensions[READ_ENGINE])
+
+    assert client.post("/donate", json=_donation()).status_code == 200
+    assert writes[0] >= 1
+    assert reads[0] == 0
+
+    writes[0] = 0
+    assert client.get("/balance").get_json() == {"Total": 5.0}
+    assert client.get("/leaderboard").status_code == 200
+    assert client.get("/admin/beerdonation/").status_code == 200
+    assert len(client.get("/export.csv").get_data(as_text=True).splitlines()) == 2
+    assert writes[0] == 0
+    assert reads[0] >= 3
+
+
+def test_read_pool_can_not_write(file_app: Flask) -> None:
+    """Test connections of the read pool are opened read-only"""
+    with file_app.extensions[READ_ENGINE].connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        with pytest.raises(OperationalError):
+            _ = connection.execute(text("DELETE FROM donations"))
+
+
+def test_memory_database_has_no_read_pool() -> None:
+    """Test an in-memory database keeps one engine for everything"""
+    app = create_app(testing=True)
+    assert READ_ENGINE not in app.extensions
+    with app.app_context():
+        db.create_all()
+    assert app.test_client().get("/balance").get_json() == {"Total": None}
+
+
+def test_database_is_opened_lazily(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test creating the app does not open the database"""
+    path = tmp_path / "missing" / "beer.db"
+    monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", f"sqlite:///{path}")
+    app = create_app()
+    assert not path.exists()
+
+    path.parent.mkdir()
+    assert app.test_client().get("/cache/stats").status_code == 200
+    with app.extensions[READ_ENGINE].connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+    assert path.exists()
+    app.extensions[READ_ENGINE].dispose()
@@ -0,0 +1,107 @@
+import asyncio
+import json
+from collections.abc import AsyncGenerator
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import pytest
+from aiohttp import ClientResponse, web
+from aiohttp.test_utils import TestClient, TestServer
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.aio import BROADCASTER, ENGINE, create_aio_app
+from app.extensions import db
+from app.idempotency import recent_keys
+from app.stream import BalanceBroadcaster
+from app.utils import insert_donate
+
+
+@pytest.fixture()
+async def client(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> AsyncGenerator[TestClient[web.Request, web.Application]]:
+    recent_keys.clear()
+    monkeypatch.setenv("BALANCE_STREAM_POLL_MS", "20")
+    app = create_aio_app(database_uri=f"sqlite:///{tmp_path / 'stream.db'}")
+    async with app[ENGINE].begin() as connection:
+        await connection.run_sync(db.metadata.create_all)
+    async with TestClient(TestServer(app)) as client:
+        yield client
+
+
+async def _next_event(response: ClientResponse) -> dict[str, Any]:
+    while True:
+        chunk = await asyncio.wait_for(response.content.readuntil(b"\n\n"), 5)
+        lines = chunk.decode().splitlines()
+        if lines[0] == "event: balance":
+            return json.loads(lines[1].removeprefix("data: "))
+
+
+def _donation(value: float, name: str = "Donor") -> dict[str, object]:
+    return {"date": datetime.now().isoformat(), "value": value, "name": name}
+
+
+async def test_stream_pushes_new_donations(
+    client: TestClient[web.Request, web.Application],
+) -> None:
+    """Test subscribers get the current balance and then every change"""
+    async with client.get("/balance/stream") as stream:
+        assert stream.headers["Content-Type"] == "text/event-stream"
+        assert await _next_event(stream) == {"Total": None, "last": None}
+
+        _ = await client.post("/donate", json=_donation(10.5, "Alice"))
+        update = await _next_event(stream)
+
+    assert update["Total"] == 10.5
+    assert update["last"]["name"] == "Alice"
+    assert update["last"]["value"] == 10.5
+
+
+async def test_stream_sees_other_processes(
+    client: TestClient[web.Request, web.Application], tmp_path: Path
+) -> None:
+    """Test commits from another connection reach the stream"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'stream.db'}")
+    async with client.get("/balance/stream") as stream:
+        _ = await _next_event(stream)
+        with Session(engine) as session:
+            _ = insert_donate(_donation(3), session)  # pyright: ignore[reportArgumentType]
+
+        assert (await _next_event(stream))["Total"] == 3.0
+    engine.dispose()
+
+
+async def test_subscribers_share_one_load(
+    client: TestClient[web.Request, web.Application],
+) -> None:
+    """Test one donation is loaded once however many viewers there are"""
+    broadcaster = client.app[BROADCASTER]
+    streams = [await client.get("/balance/stream") for _ in range(5)]
+    for stream in streams:
+        _ = await _next_event(stream)
+
+    _ = await client.post("/donate", json=_donation(2))
+    updates = [await _next_event(stream) for stream in streams]
+    for stream in streams:
+        stream.close()
+
+    assert {update["Total"] for update in updates} == {2.0}
+    assert broadcaster.updates == 1
+
+
+async def test_slow_subscriber_gets_latest() -> None:
+    """Test a subscriber that falls behind only sees the newest update"""
+    totals = iter(range(100))
+
+    async def load() -> dict[str, Any]:
+        return {"Total": next(totals)}
+
+    broadcaster = BalanceBroadcaster(lambda: 0, load, interval=60)
+    async with broadcaster.subscribe() as updates:
+        for _ in range(3):
+            broadcaster.wake()
+            await asyncio.sleep(0.01)
+        assert await updates.get() == {"Total": 3}
+    await broadcaster.close()
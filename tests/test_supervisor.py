@@ -0,0 +1,69 @@
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+from types import FrameType
+
+from consumer.retry import Backoff
+from consumer.supervisor import Supervisor
+
+
+def _sigterm_later(delay: float) -> None:
+    # SIGALRM instead of a timer thread, forking a threaded process is unsafe
+    def send_sigterm(_signum: int, _frame: FrameType | None) -> None:
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    _ = signal.signal(signal.SIGALRM, send_sigterm)
+    _ = signal.setitimer(signal.ITIMER_REAL, delay)
+
+
+def _crash(_index: int) -> None:
+    sys.exit(1)
+
+
+def _ignore_sigterm(_index: int) -> None:
+    _ = signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    time.sleep(60)
+
+
+def test_crashed_workers_are_restarted() -> None:
+    """Test a worker that exits is started again"""
+    supervisor = Supervisor(
+        _crash, workers=2, backoff=Backoff(base=0.01, cap=0.01), stable_after=0
+    )
+    _sigterm_later(1.0)
+
+    assert supervisor.run() == 0
+    assert supervisor.restarts >= 2
+
+
+def test_sigterm_reaches_every_worker(tmp_path: Path) -> None:
+    """Test SIGTERM is passed on and workers stop on their own"""
+
+    def worker(index: int) -> None:
+        def on_term(_signum: int, _frame: FrameType | None) -> None:
+            _ = (tmp_path / f"stopped-{index}").write_text(str(os.getpid()))
+            sys.exit(0)
+
+        _ = signal.signal(signal.SIGTERM, on_term)
+        time.sleep(60)
+
+    supervisor = Supervisor(worker, workers=3)
+    _sigterm_later(0.5)
+
+    assert supervisor.run() == 0
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "stopped-0",
+        "stopped-1",
+        "stopped-2",
+    ]
+    assert supervisor.restarts == 0
+
+
+def test_stuck_worker_is_killed() -> None:
+    """Test a worker that ignores SIGTERM is killed after the timeout"""
+    supervisor = Supervisor(_ignore_sigterm, workers=1, shutdown_timeout=0.2)
+    _sigterm_later(0.5)
+
+    assert supervisor.run() == 1
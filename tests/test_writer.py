@@ -0,0 +1,118 @@
+import sqlite3
+from collections.abc import Generator
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+import pytest
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from app.extensions import db
+from app.utils import get_sum, parse_donate
+from app.writer import GroupCommitWriter, _Pending
+
+
+@pytest.fixture()
+def file_app(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> Generator[Flask, Any, Any]:
+    monkeypatch.setenv("SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'beer.db'}")
+    monkeypatch.setenv("INGEST_MODE", "group")
+    app = create_app()
+    app.config.update({"TESTING": True})
+    with app.app_context():
+        db.create_all()
+    yield app
+    app.extensions["group_commit_writer"].close()
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _row(value: float) -> dict[str, object]:
+    return parse_donate(
+        {"date": datetime.now().isoformat(), "value": value, "name": "Donor"}
+    )
+
+
+def test_sqlite_is_configured_from_app_config(file_app: Flask) -> None:
+    """Test WAL and busy timeout are applied to every connection"""
+    with file_app.app_context():
+        assert db.session.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert db.session.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+
+
+def test_concurrent_submits_are_group_committed(file_app: Flask) -> None:
+    """Test rows from many callers end up in fewer commits"""
+    writer: GroupCommitWriter = file_app.extensions["group_commit_writer"]
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(lambda i: writer.submit([_row(1.0)]), range(64)))
+
+    ids = [ids[0] for ids in results]
+    assert len(set(ids)) == 64
+    assert writer.commits < 64
+    with file_app.app_context():
+        assert get_sum(db.session) == 64.0  # pyright: ignore[reportArgumentType]
+
+
+def test_donate_goes_through_writer(file_app: Flask) -> None:
+    """Test the HTTP endpoints use the group commit writer in group mode"""
+    client = file_app.test_client()
+    response = client.post(
+        "/donate",
+        json={"date": datetime.now().isoformat(), "value": 2.5, "name": "Donor"},
+    )
+
+    assert response.status_code == 200
+    assert file_app.extensions["group_commit_writer"].commits == 1
+    assert client.get("/balance").get_json() == {"Total": 2.5}
+
+
+def test_writer_reports_failures(file_app: Flask) -> None:
+    """Test a failed commit is raised in every waiting caller"""
+    writer: GroupCommitWriter = file_app.extensions["group_commit_writer"]
+    with file_app.app_context():
+        _ = db.session.execute(text("DROP TABLE donations"))
+        db.session.commit()
+
+    with pytest.raises(Exception):
+        _ = writer.submit([_row(1.0)])
+
+
+def test_failed_group_is_retried_per_request(file_app: Flask) -> None:
+    """Test one bad request in a group does not fail the others"""
+    writer: GroupCommitWriter = file_app.extensions["group_commit_writer"]
+    good = _Pending([_row(1.0), _row(2.0)], Future())
+    bad = _Pending([{**_row(4.0), "date": "not a date"}], Future())
+    other = _Pending([_row(8.0)], Future())
+
+    writer._commit([good, bad, other])
+
+    assert len(good.done.result(0)) == 2
+    assert len(other.done.result(0)) == 1
+    with pytest.raises(Exception):
+        _ = bad.done.result(0)
+    with file_app.app_context():
+        assert get_sum(db.session) == 11.0  # pyright: ignore[reportArgumentType]
+
+
+def test_locked_database_returns_503(file_app: Flask) -> None:
+    """Test lock timeouts are reported as retryable instead of a bare 500"""
+    writer: GroupCommitWriter = file_app.extensions["group_commit_writer"]
+    locked = OperationalError(
+        "INSERT", {}, sqlite3.OperationalError("database is locked")
+    )
+
+    with patch.object(writer, "submit", side_effect=locked):
+        response = file_app.test_client().post(
+            "/donate",
+            json={"date": datetime.now().isoformat(), "value": 1, "name": "Donor"},
+        )
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"